@@ -17,9 +17,9 @@ from simple_history.admin import SimpleHistoryAdmin  # likely a bug in import or
 from enterprise.admin.actions import export_as_csv_action, get_clear_catalog_id_action
 from enterprise.admin.forms import EnterpriseCustomerAdminForm, EnterpriseCustomerIdentityProviderAdminForm
 from enterprise.admin.utils import UrlNames
-from enterprise.admin.views import EnterpriseCustomerManageLearnersView, TemplatePreviewView
+from enterprise.admin.views import EnrollmentJobStatusView, EnterpriseCustomerManageLearnersView, TemplatePreviewView
 from django.core.urlresolvers import reverse
-from enterprise.lms_api import CourseApiClient, EnrollmentApiClient
+from enterprise.lms_api import EnrollmentApiClient, get_course_names
 from enterprise.models import (  # pylint:disable=no-name-in-module
     EnrollmentNotificationEmailTemplate, EnterpriseCustomer, EnterpriseCustomerUser,
     EnterpriseCustomerBrandingConfiguration, EnterpriseCustomerIdentityProvider,
@@ -215,7 +215,12 @@ class EnterpriseCustomerAdmin(DjangoObjectActions, SimpleHistoryAdmin):
                 r"^([^/]+)/manage_learners$",
                 self.admin_site.admin_view(EnterpriseCustomerManageLearnersView.as_view()),
                 name=UrlNames.MANAGE_LEARNERS
-            )
+            ),
+            url(
+                r"^([^/]+)/manage_learners/jobs/([^/]+)$",
+                self.admin_site.admin_view(EnrollmentJobStatusView.as_view()),
+                name=UrlNames.ENROLLMENT_JOB_STATUS
+            ),
         ]
         return customer_urls + super(EnterpriseCustomerAdmin, self).get_urls()
 
@@ -314,15 +319,18 @@ class EnterpriseCustomerUserAdmin(admin.ModelAdmin):
     def get_enrolled_course_string(self, enterprise_customer_user):
         """
         Get an HTML string representing the courses the user is enrolled in.
+
+        Course names are fetched concurrently within a time budget; courses whose names are not available in
+        time are shown by their course ID instead.
         """
         enrollment_client = EnrollmentApiClient()
         enrolled_courses = enrollment_client.get_enrolled_courses(self.username(enterprise_customer_user))
-        course_details = []
-        courses_client = CourseApiClient()
-        for course in enrolled_courses:
-            course_id = course['course_details']['course_id']
-            name = courses_client.get_course_details(course_id)['name']
-            course_details.append({'course_id': course_id, 'course_name': name})
+        course_ids = [course['course_details']['course_id'] for course in enrolled_courses]
+        course_names = get_course_names(course_ids)
+        course_details = [
+            {'course_id': course_id, 'course_name': course_names.get(course_id, course_id)}
+            for course_id in course_ids
+        ]
 
         template = '<a href="{url}">{course_name}</a>'
         joiner = '<br/>'
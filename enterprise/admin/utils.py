@@ -10,7 +10,6 @@ from django.core.exceptions import ValidationError
 from django.core.validators import validate_email
 from django.utils.translation import ugettext as _
 
-from enterprise.lms_api import parse_lms_api_datetime
 from enterprise.models import EnterpriseCustomerUser
 
 
@@ -30,6 +29,7 @@ class UrlNames(object):
     """
     URL_PREFIX = "enterprise_"
     MANAGE_LEARNERS = URL_PREFIX + "manage_learners"
+    ENROLLMENT_JOB_STATUS = URL_PREFIX + "enrollment_job_status"
     PREVIEW_EMAIL_TEMPLATE = URL_PREFIX + "preview_email_template"
 
 
@@ -105,6 +105,26 @@ def email_or_username__to__email(email_or_username):
         return email_or_username
 
 
+def validate_email_format(email, raw_email=None, message_template=None):
+    """
+    Validate that email is a valid email address.
+
+    Arguments:
+        email (str): user email to link
+        raw_email (str): raw value as it was passed by user - used in error message.
+        message_template (str): Validation error template string.
+
+    Raises:
+        ValidationError: if email is invalid.
+    """
+    raw_email = raw_email if raw_email is not None else email
+    message_template = message_template if message_template is not None else ValidationMessages.INVALID_EMAIL
+    try:
+        validate_email(email)
+    except ValidationError:
+        raise ValidationError(message_template.format(argument=raw_email))
+
+
 def validate_email_to_link(email, raw_email=None, message_template=None, ignore_existing=False):
     """
     Validate email to be linked to Enterprise Customer.
@@ -125,12 +145,7 @@ def validate_email_to_link(email, raw_email=None, message_template=None, ignore_
     Returns:
         bool: Whether or not there is an existing record with the same email address.
     """
-    raw_email = raw_email if raw_email is not None else email
-    message_template = message_template if message_template is not None else ValidationMessages.INVALID_EMAIL
-    try:
-        validate_email(email)
-    except ValidationError:
-        raise ValidationError(message_template.format(argument=raw_email))
+    validate_email_format(email, raw_email, message_template)
 
     existing_record = EnterpriseCustomerUser.objects.get_link_by_email(email)
     if existing_record and not ignore_existing:
@@ -140,46 +155,6 @@ def validate_email_to_link(email, raw_email=None, message_template=None, ignore_
     return existing_record or False
 
 
-def get_course_runs_from_program(program):
-    """
-    Return course runs from program data.
-
-    Arguments:
-        program(dict): Program data from Course Catalog API
-
-    Returns:
-        set: course runs in given program
-    """
-    course_runs = set()
-    for course in program.get("courses", []):
-        for run in course.get("course_runs", []):
-            if "key" in run and run["key"]:
-                course_runs.add(run["key"])
-
-    return course_runs
-
-
-def get_earliest_start_date_from_program(program):
-    """
-    Get the earliest date that one of the courses in the program was available.
-    For the sake of emails to new learners, we treat this as the program start date.
-
-    Arguemnts:
-        program (dict): Program data from Course Catalog API
-
-    returns:
-        datetime.datetime: The date and time at which the first course started
-    """
-    start_dates = []
-    for course in program.get('courses', []):
-        for run in course.get('course_runs', []):
-            if run.get('start'):
-                start_dates.append(parse_lms_api_datetime(run['start']))
-    if not start_dates:
-        return None
-    return min(start_dates)
-
-
 def split_usernames_and_emails(email_field):
     """
     Split the contents of the email field into a list.
@@ -7,13 +7,10 @@ import datetime
 import json
 import logging
 
-from edx_rest_api_client.exceptions import HttpClientError
-
 from django.conf import settings
 from django.contrib import admin, messages
 from django.contrib.auth import get_permission_codename
 from django.contrib.auth.models import User
-from django.core import mail
 from django.core.exceptions import ValidationError
 from django.db.models import Q
 from django.http import HttpResponse, HttpResponseRedirect
@@ -22,15 +19,24 @@ from django.utils.translation import ugettext as _
 from django.utils.translation import ungettext
 from django.views.generic import View
 
+from enterprise import enrollment
 from enterprise.admin.forms import ManageLearnersForm
-from enterprise.admin.utils import (ValidationMessages, email_or_username__to__email, get_course_runs_from_program,
-                                    get_earliest_start_date_from_program, parse_csv, split_usernames_and_emails,
-                                    validate_email_to_link)
+from enterprise.admin.utils import (UrlNames, ValidationMessages, email_or_username__to__email, parse_csv,
+                                    split_usernames_and_emails, validate_email_format, validate_email_to_link)
 from enterprise.course_catalog_api import CourseCatalogApiClient
-from enterprise.lms_api import EnrollmentApiClient, parse_lms_api_datetime
-from enterprise.models import (EnrollmentNotificationEmailTemplate, EnterpriseCourseEnrollment, EnterpriseCustomer,
-                               EnterpriseCustomerUser, PendingEnrollment, PendingEnterpriseCustomerUser)
-from enterprise.utils import get_reversed_url_by_site, send_email_notification_message
+from enterprise.django_compatibility import reverse
+from enterprise.lms_api import parse_lms_api_datetime
+from enterprise.models import (EnrollmentJob, EnrollmentNotificationEmailTemplate, EnterpriseCustomer,
+                               EnterpriseCustomerUser, PendingEnterpriseCustomerUser)
+from enterprise.tasks import start_enrollment_job
+from enterprise.utils import get_reversed_url_by_site
+
+# Number of learners from which enrollments are processed in the background
+DEFAULT_ENROLLMENT_JOB_THRESHOLD = 100
+# Number of learners enrolled by each background task
+DEFAULT_ENROLLMENT_JOB_CHUNK_SIZE = 50
+# Number of seconds after which a job chunk which is not processed is considered lost, and marked as failed
+DEFAULT_ENROLLMENT_JOB_CHUNK_TIMEOUT = 3600
 
 
 class TemplatePreviewView(View):
@@ -118,7 +124,9 @@ class EnterpriseCustomerManageLearnersView(View):
         enterprise_customer = EnterpriseCustomer.objects.get(uuid=customer_uuid)  # pylint: disable=no-member
 
         search_keyword = self.get_search_keyword(request)
-        linked_learners = self.get_enterprise_customer_user_queryset(search_keyword, customer_uuid)
+        linked_learners = EnterpriseCustomerUser.objects.attach_users(
+            self.get_enterprise_customer_user_queryset(search_keyword, customer_uuid)
+        )
         pending_linked_learners = self.get_pending_users_queryset(search_keyword, customer_uuid)
 
         context = {
@@ -218,21 +226,17 @@ class EnterpriseCustomerManageLearnersView(View):
         else:
             parsed_csv = parse_csv(csv_file, expected_columns={ManageLearnersForm.CsvColumns.EMAIL})
 
+        valid_emails = []
         try:
             for index, row in enumerate(parsed_csv):
                 email = row[ManageLearnersForm.CsvColumns.EMAIL]
                 try:
-                    already_linked = validate_email_to_link(email, ignore_existing=True)
+                    validate_email_format(email)
                 except ValidationError as exc:
                     message = _("Error at line {line}: {message}\n").format(line=index + 1, message=exc.message)
                     errors.append(message)
                 else:
-                    if already_linked:
-                        already_linked_emails.append((email, already_linked.enterprise_customer))
-                    elif email in emails:
-                        duplicate_emails.append(email)
-                    else:
-                        emails.add(email)
+                    valid_emails.append(email)
         except ValidationError as exc:
             errors.append(exc.message)
 
@@ -244,9 +248,19 @@ class EnterpriseCustomerManageLearnersView(View):
                 manage_learners_form.add_error(ManageLearnersForm.Fields.BULK_UPLOAD, error)
             return
 
+        # Look up the existing links of all the emails at once, rather than row by row.
+        existing_links = EnterpriseCustomerUser.objects.get_links_by_emails(valid_emails)
+        for email in valid_emails:
+            already_linked = existing_links.get(email)
+            if already_linked:
+                already_linked_emails.append((email, already_linked.enterprise_customer))
+            elif email in emails:
+                duplicate_emails.append(email)
+            else:
+                emails.add(email)
+
         # There were no errors. Now do the actual linking:
-        for email in emails:
-            EnterpriseCustomerUser.objects.link_user(enterprise_customer, email)
+        EnterpriseCustomerUser.objects.link_users(enterprise_customer, emails)
 
         # Report what happened:
         count = len(emails)
@@ -306,32 +320,8 @@ class EnterpriseCustomerManageLearnersView(View):
         Returns:
             Boolean: Whether or not enrollment succeeded for all courses specified
         """
-        enterprise_customer_user, __ = EnterpriseCustomerUser.objects.get_or_create(
-            enterprise_customer=enterprise_customer,
-            user_id=user.id
-        )
-        enrollment_client = EnrollmentApiClient()
-        succeeded = True
-        for course_id in course_ids:
-            try:
-                enrollment_client.enroll_user_in_course(user.username, course_id, course_mode)
-            except HttpClientError as exc:
-                succeeded = False
-                default_message = 'No error message provided'
-                try:
-                    error_message = json.loads(exc.content.decode()).get('message', default_message)
-                except ValueError:
-                    error_message = default_message
-                logging.error(
-                    'Error while enrolling user %(user)s: %(message)s',
-                    dict(user=user.username, message=error_message)
-                )
-            else:
-                EnterpriseCourseEnrollment.objects.get_or_create(
-                    enterprise_customer_user=enterprise_customer_user,
-                    course_id=course_id
-                )
-        return succeeded
+        successes, __ = enrollment.enroll_users(enterprise_customer, [user], course_mode, *course_ids)
+        return bool(successes)
 
     @classmethod
     def get_users_by_email(cls, emails):
@@ -345,10 +335,7 @@ class EnterpriseCustomerManageLearnersView(View):
             users: Queryset of users who exist in the OpenEdX platform and who were in the list of email addresses
             missing_emails: List of unique emails which were in the original list, but do not yet exist as users
         """
-        users = User.objects.filter(email__in=emails)
-        present_emails = users.values_list('email', flat=True)
-        missing_emails = list(set(emails) - set(present_emails))
-        return users, missing_emails
+        return enrollment.get_users_by_email(emails)
 
     @classmethod
     def enroll_user_pending_registration(cls, enterprise_customer, email, course_mode, *course_ids):
@@ -364,19 +351,10 @@ class EnterpriseCustomerManageLearnersView(View):
         Returns:
             The PendingEnterpriseCustomerUser attached to the email address
         """
-        pending_ecu, __ = PendingEnterpriseCustomerUser.objects.get_or_create(
-            enterprise_customer=enterprise_customer,
-            user_email=email
+        pending_users = enrollment.enroll_users_pending_registration(
+            enterprise_customer, [email], course_mode, *course_ids
         )
-        for course_id in course_ids:
-            PendingEnrollment.objects.update_or_create(
-                user=pending_ecu,
-                course_id=course_id,
-                defaults={
-                    'course_mode': course_mode
-                }
-            )
-        return pending_ecu
+        return pending_users[0]
 
     @classmethod
     def enroll_users_in_program(cls, enterprise_customer, program_details, course_mode, emails):
@@ -395,25 +373,7 @@ class EnterpriseCustomerManageLearnersView(View):
                 pending enrollments created for them in the database
             failures: A list of users who could not be enrolled in the program
         """
-        existing_users, unregistered_emails = cls.get_users_by_email(emails)
-        course_ids = get_course_runs_from_program(program_details)
-
-        successes = []
-        pending = []
-        failures = []
-
-        for user in existing_users:
-            succeeded = cls.enroll_user(enterprise_customer, user, course_mode, *course_ids)
-            if succeeded:
-                successes.append(user)
-            else:
-                failures.append(user)
-
-        for email in unregistered_emails:
-            pending_user = cls.enroll_user_pending_registration(enterprise_customer, email, course_mode, *course_ids)
-            pending.append(pending_user)
-
-        return successes, pending, failures
+        return enrollment.enroll_users_in_program(enterprise_customer, program_details, course_mode, emails)
 
     @classmethod
     def enroll_users_in_course(cls, enterprise_customer, course_id, course_mode, emails):
@@ -432,24 +392,7 @@ class EnterpriseCustomerManageLearnersView(View):
                 pending enrollments created for them in the database
             failures: A list of users who could not be enrolled in the course
         """
-        existing_users, unregistered_emails = cls.get_users_by_email(emails)
-
-        successes = []
-        pending = []
-        failures = []
-
-        for user in existing_users:
-            succeeded = cls.enroll_user(enterprise_customer, user, course_mode, course_id)
-            if succeeded:
-                successes.append(user)
-            else:
-                failures.append(user)
-
-        for email in unregistered_emails:
-            pending_user = cls.enroll_user_pending_registration(enterprise_customer, email, course_mode, course_id)
-            pending.append(pending_user)
-
-        return successes, pending, failures
+        return enrollment.enroll_users_in_course(enterprise_customer, course_id, course_mode, emails)
 
     @classmethod
     def send_messages(cls, http_request, message_requests):
@@ -476,6 +419,27 @@ class EnterpriseCustomerManageLearnersView(View):
             request: The HTTP request that's being processed
             course_id: The specific course the learners were enrolled in
             users: An iterable of the users or pending users who were enrolled
+
+        Returns:
+            list: The users or pending users who could not be notified.
+        """
+        enrolled_in = cls.get_course_notification_details(enterprise_customer, request, course_id)
+        if enrolled_in is None:
+            return []
+        return enrollment.send_enrollment_notifications(enterprise_customer, enrolled_in, users)
+
+    @classmethod
+    def get_course_notification_details(cls, enterprise_customer, request, course_id):
+        """
+        Get the details of a course to notify learners with.
+
+        Args:
+            enterprise_customer: The EnterpriseCustomer being linked to
+            request: The HTTP request that's being processed
+            course_id: The specific course the learners were enrolled in
+
+        Returns:
+            dict: The course details used by the notification email, or None if the course was not found.
         """
         course_details = CourseCatalogApiClient(request.user).get_course_run(course_id)
         if not course_details:
@@ -485,7 +449,7 @@ class EnterpriseCustomerManageLearnersView(View):
                     "Proceeding with enrollment, but notifications won't be sent"
                 ).format(course_id)
             )
-            return
+            return None
         course_url = course_details.get('marketing_url')
         if course_url is None:
             # If we didn't get a useful path to the course on a marketing site from the catalog API,
@@ -496,22 +460,12 @@ class EnterpriseCustomerManageLearnersView(View):
                 'about_course',
                 args=(course_id,),
             )
-        course_name = course_details.get('title')
-        course_start = parse_lms_api_datetime(course_details.get('start'))
-
-        with mail.get_connection() as email_conn:
-            for user in users:
-                send_email_notification_message(
-                    user=user,
-                    enrolled_in={
-                        'name': course_name,
-                        'url': course_url,
-                        'type': 'course',
-                        'start': course_start,
-                    },
-                    enterprise_customer=enterprise_customer,
-                    email_connection=email_conn
-                )
+        return {
+            'name': course_details.get('title'),
+            'url': course_url,
+            'type': 'course',
+            'start': parse_lms_api_datetime(course_details.get('start')),
+        }
 
     @classmethod
     def notify_program_learners(cls, enterprise_customer, program_details, users):
@@ -522,27 +476,13 @@ class EnterpriseCustomerManageLearnersView(View):
             enterprise_customer: The EnterpriseCustomer being linked to
             program_details: Details about the specific program the learners were enrolled in
             users: An iterable of the users or pending users who were enrolled
+
+        Returns:
+            list: The users or pending users who could not be notified.
         """
-        program_name = program_details.get('title')
-        program_branding = program_details.get('type')
-        program_url = program_details.get('marketing_url')
-        program_type = 'program'
-        program_start = get_earliest_start_date_from_program(program_details)
-
-        with mail.get_connection() as email_conn:
-            for user in users:
-                send_email_notification_message(
-                    user=user,
-                    enrolled_in={
-                        'name': program_name,
-                        'url': program_url,
-                        'type': program_type,
-                        'start': program_start,
-                        'branding': program_branding,
-                    },
-                    enterprise_customer=enterprise_customer,
-                    email_connection=email_conn
-                )
+        return enrollment.send_enrollment_notifications(
+            enterprise_customer, enrollment.get_program_notification_details(program_details), users
+        )
 
     @classmethod
     def get_success_enrollment_message(cls, users, enrolled_in):
@@ -590,6 +530,30 @@ class EnterpriseCustomerManageLearnersView(View):
             )
         )
 
+    @classmethod
+    def get_failed_notification_message(cls, users, enrolled_in):
+        """
+        Create message for the users who were enrolled in a course or program, but could not be notified.
+
+        Args:
+            users: An iterable of users or pending users whose enrollment notification email could not be sent
+            enrolled_in (str): A string identifier for the course or program the users were enrolled in
+
+        Returns:
+            tuple: A 2-tuple containing a message type and message text
+        """
+        failed_emails = [enrollment.get_user_email(user) for user in users]
+        return (
+            'warning',
+            _(
+                'Enrollment notification emails could not be sent to some users enrolled in {enrolled_in}: '
+                '{user_list}'
+            ).format(
+                enrolled_in=enrolled_in,
+                user_list=', '.join(failed_emails),
+            )
+        )
+
     @classmethod
     def get_pending_enrollment_message(cls, pending_users, enrolled_in):
         """
@@ -630,6 +594,9 @@ class EnterpriseCustomerManageLearnersView(View):
         """
         Enroll the users with the given email addresses to the courses specified, either specifically or by program.
 
+        If there are at least ``ENTERPRISE_ENROLLMENT_JOB_THRESHOLD`` users, they are enrolled in the background
+        by an :class:`EnrollmentJob` instead.
+
         Args:
             cls (type): The EnterpriseCustomerManageLearnersView class itself
             request: The HTTP request the enrollment is being created by
@@ -639,7 +606,16 @@ class EnterpriseCustomerManageLearnersView(View):
             course_id: The ID of the course in which we want to enroll
             program_details: Details about a program in which we want to enroll
             notify: Whether to notify (by email) the users that have been enrolled
+
+        Returns:
+            EnrollmentJob: The job enrolling the users in the background, or None if they were enrolled already.
         """
+        threshold = getattr(settings, 'ENTERPRISE_ENROLLMENT_JOB_THRESHOLD', DEFAULT_ENROLLMENT_JOB_THRESHOLD)
+        if threshold and len(emails) >= threshold:
+            return cls._start_enrollment_job(
+                request, enterprise_customer, emails, mode, course_id, program_details, notify
+            )
+
         pending_messages = []
 
         if course_id:
@@ -650,8 +626,9 @@ class EnterpriseCustomerManageLearnersView(View):
                 emails=emails,
             )
             all_successes = succeeded + pending
+            notification_failed = []
             if notify:
-                cls.notify_enrolled_learners(
+                notification_failed = cls.notify_enrolled_learners(
                     enterprise_customer=enterprise_customer,
                     request=request,
                     course_id=course_id,
@@ -663,6 +640,8 @@ class EnterpriseCustomerManageLearnersView(View):
                 pending_messages.append(cls.get_failed_enrollment_message(failed, course_id))
             if pending:
                 pending_messages.append(cls.get_pending_enrollment_message(pending, course_id))
+            if notification_failed:
+                pending_messages.append(cls.get_failed_notification_message(notification_failed, course_id))
 
         if program_details:
             succeeded, pending, failed = cls.enroll_users_in_program(
@@ -672,8 +651,9 @@ class EnterpriseCustomerManageLearnersView(View):
                 emails=emails,
             )
             all_successes = succeeded + pending
+            notification_failed = []
             if notify:
-                cls.notify_program_learners(
+                notification_failed = cls.notify_program_learners(
                     enterprise_customer=enterprise_customer,
                     program_details=program_details,
                     users=all_successes
@@ -685,8 +665,80 @@ class EnterpriseCustomerManageLearnersView(View):
                 pending_messages.append(cls.get_failed_enrollment_message(failed, program_identifier))
             if pending:
                 pending_messages.append(cls.get_pending_enrollment_message(pending, program_identifier))
+            if notification_failed:
+                pending_messages.append(cls.get_failed_notification_message(notification_failed, program_identifier))
 
         cls.send_messages(request, pending_messages)
+        return None
+
+    @classmethod
+    def _start_enrollment_job(cls, request, enterprise_customer, emails, mode, course_id, program_details, notify):
+        """
+        Start enrolling the users with the given email addresses in the background.
+
+        Args:
+            cls (type): The EnterpriseCustomerManageLearnersView class itself
+            request: The HTTP request the enrollment is being created by
+            enterprise_customer: The instance of EnterpriseCustomer whose attached users we're enrolling
+            emails: An iterable of strings containing email addresses to enroll in a course
+            mode: The enrollment mode the users will be enrolled in the course with
+            course_id: The ID of the course in which we want to enroll
+            program_details: Details about a program in which we want to enroll
+            notify: Whether to notify (by email) the users that have been enrolled
+
+        Returns:
+            EnrollmentJob: The started job.
+        """
+        job = EnrollmentJob(
+            enterprise_customer=enterprise_customer,
+            course_id=course_id or '',
+            program_details=json.dumps(program_details) if program_details else '',
+            course_mode=mode,
+        )
+        if notify:
+            if course_id:
+                job.set_notification(cls.get_course_notification_details(enterprise_customer, request, course_id))
+            else:
+                job.set_notification(enrollment.get_program_notification_details(program_details))
+        job.save()
+        job.add_chunks(
+            list(emails),
+            getattr(settings, 'ENTERPRISE_ENROLLMENT_JOB_CHUNK_SIZE', DEFAULT_ENROLLMENT_JOB_CHUNK_SIZE),
+        )
+        start_enrollment_job(job)
+        return job
+
+    @classmethod
+    def get_enrollment_job_messages(cls, job, progress):
+        """
+        Create messages for the users processed so far by an enrollment job.
+
+        Args:
+            cls (type): The EnterpriseCustomerManageLearnersView class itself
+            job: The EnrollmentJob the users are enrolled by
+            progress: The progress of the job, as returned by ``EnrollmentJob.get_progress``
+
+        Returns:
+            list: 2-tuples containing a message type and message text
+        """
+        enrolled_in = job.enrollment_identifier
+        job_messages = []
+        if progress['succeeded']:
+            # Only the number of successful users is reported, so there's no need to look them up.
+            job_messages.append(cls.get_success_enrollment_message(progress['succeeded'], enrolled_in))
+        if progress['failed']:
+            job_messages.append(
+                cls.get_failed_enrollment_message([User(email=email) for email in progress['failed']], enrolled_in)
+            )
+        if progress['pending']:
+            job_messages.append(cls.get_pending_enrollment_message(
+                [PendingEnterpriseCustomerUser(user_email=email) for email in progress['pending']], enrolled_in
+            ))
+        if progress['notification_failed']:
+            job_messages.append(cls.get_failed_notification_message(
+                [User(email=email) for email in progress['notification_failed']], enrolled_in
+            ))
+        return job_messages
 
     def get(self, request, customer_uuid):
         """
@@ -753,7 +805,7 @@ class EnterpriseCustomerManageLearnersView(View):
 
             if course_id or program_details:
                 course_mode = manage_learners_form.cleaned_data[ManageLearnersForm.Fields.COURSE_MODE]
-                self._enroll_users(
+                job = self._enroll_users(
                     request=request,
                     enterprise_customer=enterprise_customer,
                     emails=linked_learners,
@@ -762,6 +814,10 @@ class EnterpriseCustomerManageLearnersView(View):
                     program_details=program_details,
                     notify=notify,
                 )
+                if job is not None:
+                    return HttpResponseRedirect(
+                        reverse("admin:" + UrlNames.ENROLLMENT_JOB_STATUS, args=(customer_uuid, job.uuid))
+                    )
 
             # Redirect to GET if everything went smooth.
             return HttpResponseRedirect("")
@@ -799,3 +855,55 @@ class EnterpriseCustomerManageLearnersView(View):
             json.dumps({}),
             content_type="application/json"
         )
+
+
+class EnrollmentJobStatusView(View):
+    """
+    Shows the progress and results of an enrollment job.
+    """
+    template = "enterprise/admin/enrollment_job.html"
+
+    class ContextParameters(object):
+        """
+        Namespace-style class for custom context parameters.
+        """
+        ENTERPRISE_CUSTOMER = "enterprise_customer"
+        JOB = "job"
+        PROGRESS = "progress"
+        JOB_MESSAGES = "job_messages"
+        IS_COMPLETED = "is_completed"
+
+    def get(self, request, customer_uuid, job_uuid):
+        """
+        Handle GET request - render the status of the enrollment job.
+
+        Arguments:
+            request (django.http.request.HttpRequest): Request instance
+            customer_uuid (str): Enterprise Customer UUID
+            job_uuid (str): Enrollment job UUID
+
+        Returns:
+            django.http.response.HttpResponse: HttpResponse
+        """
+        enterprise_customer = get_object_or_404(EnterpriseCustomer, uuid=customer_uuid)
+        job = get_object_or_404(EnrollmentJob, uuid=job_uuid, enterprise_customer=enterprise_customer)
+        chunk_timeout = getattr(
+            settings, 'ENTERPRISE_ENROLLMENT_JOB_CHUNK_TIMEOUT', DEFAULT_ENROLLMENT_JOB_CHUNK_TIMEOUT
+        )
+        if chunk_timeout:
+            job.fail_stale_chunks(chunk_timeout)
+        progress = job.get_progress()
+
+        context = {
+            self.ContextParameters.ENTERPRISE_CUSTOMER: enterprise_customer,
+            self.ContextParameters.JOB: job,
+            self.ContextParameters.PROGRESS: progress,
+            self.ContextParameters.JOB_MESSAGES: EnterpriseCustomerManageLearnersView.get_enrollment_job_messages(
+                job, progress
+            ),
+            self.ContextParameters.IS_COMPLETED: progress['status'] == EnrollmentJob.STATUS_COMPLETED,
+        }
+        context.update(admin.site.each_context(request))
+        # pylint: disable=protected-access
+        context.update(EnterpriseCustomerManageLearnersView._build_admin_context(request, enterprise_customer))
+        return render(request, self.template, context)
@@ -3,9 +3,20 @@ Pagination helpers for enterprise api.
 """
 from __future__ import absolute_import, unicode_literals
 
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
 from collections import OrderedDict
 
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
 from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from django.template import loader
+from django.utils.translation import ugettext_lazy as _
 
 from six.moves.urllib.parse import urlparse  # pylint: disable=import-error
 
@@ -44,3 +55,134 @@ def get_paginated_response(data, request):
         ('previous', previous_page),
         ('results', data['results'])
     ]))
+
+
+class CreatedCursorPagination(BasePagination):
+    """
+    Cursor pagination on the ``(created, id)`` ordering of the paginated model.
+
+    Pages are looked up by the position of the item next to them, rather than by their offset, and the results aren't
+    counted, so fetching a page costs the same however deep into the results it is. The cursors are opaque; the
+    ordering of the results can't be changed.
+    """
+    cursor_query_param = 'cursor'
+    page_size = api_settings.PAGE_SIZE
+    invalid_cursor_message = _('Invalid cursor')
+    ordering = ('created', 'id')
+    template = 'rest_framework/pagination/previous_and_next.html'
+
+    def __init__(self):
+        """
+        Initialize the positions of the pages next to the current one.
+        """
+        self.base_url = None
+        self.next_position = None
+        self.previous_position = None
+
+    def paginate_queryset(self, queryset, request, view=None):
+        """
+        Return the page of the queryset following, or preceding, the position of the cursor of the request.
+        """
+        self.base_url = request.build_absolute_uri()
+        position, reverse = self.decode_cursor(request)
+
+        ordering = ['-' + field for field in self.ordering] if reverse else list(self.ordering)
+        queryset = queryset.order_by(*ordering)
+        if position is not None:
+            try:
+                queryset = queryset.filter(self.get_position_filter(position, reverse))
+            except ValidationError:
+                raise NotFound(self.invalid_cursor_message)
+
+        # Fetch one more item to know whether there are more pages in that direction.
+        results = list(queryset[:self.page_size + 1])
+        page = results[:self.page_size]
+        has_more = len(results) > len(page)
+        if reverse:
+            page.reverse()
+
+        # Going backwards, there is always a next page; going forwards, there is a previous one past the first page.
+        has_next, has_previous = (True, has_more) if reverse else (has_more, position is not None)
+        self.next_position = self.get_position(page[-1]) if page and has_next else None
+        self.previous_position = self.get_position(page[0]) if page and has_previous else None
+        if self.next_position is not None or self.previous_position is not None:
+            self.display_page_controls = True
+        return page
+
+    def get_paginated_response(self, data):
+        """
+        Return the page along with the links to the pages next to it.
+        """
+        return Response(OrderedDict([
+            ('next', self.get_link(self.next_position, False)),
+            ('previous', self.get_link(self.previous_position, True)),
+            ('results', data)
+        ]))
+
+    def to_html(self):
+        """
+        Render the links to the pages next to the current one, for the browsable API.
+        """
+        template = loader.get_template(self.template)
+        return template.render({
+            'previous_url': self.get_link(self.previous_position, True),
+            'next_url': self.get_link(self.next_position, False),
+        })
+
+    def get_position(self, instance):
+        """
+        Return the values of the ordering fields of the instance, as text.
+        """
+        position = []
+        for field in self.ordering:
+            value = getattr(instance, field)
+            position.append(value.isoformat() if hasattr(value, 'isoformat') else value)
+        return position
+
+    def get_position_filter(self, position, reverse):
+        """
+        Return the lookup of the items strictly after, or before if reversed, the position.
+        """
+        operator = 'lt' if reverse else 'gt'
+        position_filter = Q()
+        for index, field in enumerate(self.ordering):
+            lookup = Q(**{'{}__{}'.format(field, operator): position[index]})
+            for previous_field, value in zip(self.ordering[:index], position):
+                lookup &= Q(**{previous_field: value})
+            position_filter |= lookup
+        return position_filter
+
+    def get_link(self, position, reverse):
+        """
+        Return the URL of the page following, or preceding if reversed, the position.
+        """
+        if position is None:
+            return None
+        return replace_query_param(self.base_url, self.cursor_query_param, self.encode_cursor(position, reverse))
+
+    def decode_cursor(self, request):
+        """
+        Return the position and the direction of the cursor of the request; an empty cursor starts from the beginning.
+        """
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None, False
+
+        try:
+            cursor = json.loads(urlsafe_b64decode(encoded.encode('ascii')).decode('utf-8'))
+            position, reverse = cursor['p'], bool(cursor.get('r'))
+        except (TypeError, ValueError, KeyError):
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(position, list) or len(position) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+        return position, reverse
+
+    @staticmethod
+    def encode_cursor(position, reverse):
+        """
+        Return the opaque representation of the cursor pointing at the position, in the direction given.
+        """
+        cursor = {'p': position}
+        if reverse:
+            cursor['r'] = 1
+        return urlsafe_b64encode(json.dumps(cursor).encode('utf-8')).decode('ascii')
@@ -17,3 +17,20 @@ def get_service_usernames():
     Return the set of service usernames that are given extended permissions in the API.
     """
     return {getattr(settings, username, None) for username in SERVICE_USERNAMES}
+
+
+def get_request_value_set(request, name):
+    """
+    Return the set of comma-separated values of the named query parameter of the request.
+
+    Arguments:
+        request (HttpRequest): The request to read the query parameter from.
+        name (str): The name of the query parameter.
+
+    Returns:
+        (set): The values of the query parameter, or None if the request doesn't have it.
+    """
+    value = request.GET.get(name)
+    if value is None:
+        return None
+    return {item.strip() for item in value.split(',') if item.strip()}
@@ -3,16 +3,122 @@ Serializers for enterprise api version 1.
 """
 from __future__ import absolute_import, unicode_literals
 
+from collections import OrderedDict
+
 from rest_framework import serializers
 
+from django.conf import settings
 from django.contrib.auth.models import User
 from django.contrib.sites.models import Site
+from django.core.exceptions import FieldDoesNotExist
+from django.db import transaction
+from django.db.models import Manager
 from django.utils.translation import ugettext_lazy as _
 
 from enterprise import models, utils
+from enterprise.api.utils import get_request_value_set
+
+
+def get_related_lookups(serializer):
+    """
+    Get the related objects to join into, or prefetch for, the queryset of the instances a serializer renders.
+
+    Nested serializers are followed, so that the related objects they render are looked up too. Forward relations
+    rendered as primary keys need nothing, as the primary keys are read from the instances themselves.
+
+    Arguments:
+        serializer (Serializer): The model serializer rendering the instances.
+
+    Returns:
+        (tuple): The lists of ``select_related`` and ``prefetch_related`` lookups.
+    """
+    select_related, prefetch_related = [], []
+    if isinstance(serializer, serializers.ListSerializer):
+        serializer = serializer.child
+    model = getattr(getattr(serializer, 'Meta', None), 'model', None)
+    if model is None:
+        return select_related, prefetch_related
+
+    for name, field in serializer.fields.items():
+        source = field.source or name
+        try:
+            model_field = model._meta.get_field(source)  # pylint: disable=protected-access
+        except FieldDoesNotExist:
+            continue
+        if not model_field.is_relation:
+            continue
+
+        many = model_field.one_to_many or model_field.many_to_many
+        nested = field if isinstance(field, serializers.BaseSerializer) else None
+        if nested is None and model_field.concrete and not many:
+            continue
+
+        nested_select, nested_prefetch = get_related_lookups(nested) if nested is not None else ([], [])
+        nested_select = ['{}__{}'.format(source, lookup) for lookup in nested_select]
+        nested_prefetch = ['{}__{}'.format(source, lookup) for lookup in nested_prefetch]
+        if many:
+            prefetch_related.extend([source] + nested_select + nested_prefetch)
+        else:
+            select_related.extend([source] + nested_select)
+            prefetch_related.extend(nested_prefetch)
+
+    return select_related, prefetch_related
+
+
+class SparseFieldsetsMixin(object):
+    """
+    Serializer mixin rendering only the fields asked for with the ``fields`` and ``expand`` query parameters.
 
+    ``fields`` is a comma-separated list of the fields to render; all fields are rendered when it's omitted.
+    ``expand`` is a comma-separated list of the nested objects to render in full; when it's given, the other nested
+    objects are rendered as their primary keys, or left out if they aren't model relations.
 
-class SiteSerializer(serializers.ModelSerializer):
+    The fields left out are removed from the serializer, so they are never read from the instances, and the related
+    objects behind them are neither looked up nor, see ``get_related_lookups``, joined or prefetched.
+    """
+
+    def __init__(self, *args, **kwargs):
+        """
+        Remove the fields not asked for, and collapse the nested objects not to be expanded.
+        """
+        super(SparseFieldsetsMixin, self).__init__(*args, **kwargs)
+        request = self.context.get('request')
+        if request is None:
+            return
+
+        fields = get_request_value_set(request, 'fields')
+        if fields is not None:
+            for name in set(self.fields) - fields:
+                del self.fields[name]
+
+        expand = get_request_value_set(request, 'expand')
+        if expand is not None:
+            for name, field in list(self.fields.items()):
+                if isinstance(field, serializers.BaseSerializer) and name not in expand:
+                    collapsed_field = self.get_collapsed_field(name)
+                    if collapsed_field is None:
+                        del self.fields[name]
+                    else:
+                        self.fields[name] = collapsed_field
+
+    def get_collapsed_field(self, name):
+        """
+        Get a field rendering the primary keys of the objects of a nested field, or None if it's not a relation.
+        """
+        try:
+            model_field = self.Meta.model._meta.get_field(name)  # pylint: disable=no-member,protected-access
+        except FieldDoesNotExist:
+            return None
+        if not model_field.is_relation:
+            return None
+        if model_field.one_to_many or model_field.many_to_many:
+            return serializers.PrimaryKeyRelatedField(many=True, read_only=True)
+        if model_field.concrete:
+            return serializers.ReadOnlyField(source=model_field.attname)
+        return serializers.PrimaryKeyRelatedField(read_only=True)
+
+
+class SiteSerializer(SparseFieldsetsMixin, serializers.ModelSerializer):
     """
     Serializer for Site model.
     """
@@ -23,7 +129,7 @@ class SiteSerializer(serializers.ModelSerializer):
         )
 
 
-class UserSerializer(serializers.ModelSerializer):
+class UserSerializer(SparseFieldsetsMixin, serializers.ModelSerializer):
     """
     Serializer for User model.
     """
@@ -34,7 +140,7 @@ class UserSerializer(serializers.ModelSerializer):
         )
 
 
-class EnterpriseCustomerBrandingConfigurationSerializer(serializers.ModelSerializer):
+class EnterpriseCustomerBrandingConfigurationSerializer(SparseFieldsetsMixin, serializers.ModelSerializer):
     """
     Serializer for EnterpriseCustomerBrandingConfiguration model.
     """
@@ -45,7 +151,7 @@ class EnterpriseCustomerBrandingConfigurationSerializer(serializers.ModelSeriali
         )
 
 
-class EnterpriseCustomerEntitlementSerializer(serializers.ModelSerializer):
+class EnterpriseCustomerEntitlementSerializer(SparseFieldsetsMixin, serializers.ModelSerializer):
     """
     Serializer for EnterpriseCustomerEntitlement model.
     """
@@ -56,7 +162,7 @@ class EnterpriseCustomerEntitlementSerializer(serializers.ModelSerializer):
         )
 
 
-class EnterpriseCustomerSerializer(serializers.ModelSerializer):
+class EnterpriseCustomerSerializer(SparseFieldsetsMixin, serializers.ModelSerializer):
     """
     Serializer for EnterpriseCustomer model.
     """
@@ -74,7 +180,7 @@ class EnterpriseCustomerSerializer(serializers.ModelSerializer):
     )
 
 
-class EnterpriseCourseEnrollmentReadOnlySerializer(serializers.ModelSerializer):
+class EnterpriseCourseEnrollmentReadOnlySerializer(SparseFieldsetsMixin, serializers.ModelSerializer):
     """
     Serializer for EnterpriseCourseEnrollment model.
     """
@@ -85,6 +191,60 @@ class EnterpriseCourseEnrollmentReadOnlySerializer(serializers.ModelSerializer):
         )
 
 
+class EnterpriseCourseEnrollmentBulkWriteSerializer(serializers.ListSerializer):  # pylint: disable=abstract-method
+    """
+    Serializer for writing lists of EnterpriseCourseEnrollment, with a few queries whatever the number of items.
+    """
+
+    def __init__(self, *args, **kwargs):
+        """
+        Initialize the lookup of the EnterpriseCustomerUsers of the usernames of the items.
+        """
+        super(EnterpriseCourseEnrollmentBulkWriteSerializer, self).__init__(*args, **kwargs)
+        self.batch_size = getattr(
+            settings, 'ENTERPRISE_BULK_ENROLLMENT_BATCH_SIZE', models.LINK_QUERY_BATCH_SIZE
+        )
+        self.enterprise_customer_users = None
+
+    def to_internal_value(self, data):
+        """
+        Look the EnterpriseCustomerUsers of all the items up at once, before validating the items.
+        """
+        if isinstance(data, list):
+            self.enterprise_customer_users = models.EnterpriseCustomerUser.objects.get_links_by_usernames(
+                [item['username'] for item in data if isinstance(item, dict) and 'username' in item],
+                batch_size=self.batch_size,
+            )
+        return super(EnterpriseCourseEnrollmentBulkWriteSerializer, self).to_internal_value(data)
+
+    def create(self, validated_data):
+        """
+        Create the missing enrollments, and update the consent of the existing ones, in a single transaction.
+
+        Returns:
+            (list): The items, along with whether their enrollment was created.
+        """
+        enrollments = OrderedDict()
+        for item in validated_data:
+            enterprise_customer_user = self.enterprise_customer_users[item['username']]
+            enrollments[(enterprise_customer_user.pk, item['course_id'])] = item.get('consent_granted')
+
+        with transaction.atomic():
+            created = models.EnterpriseCourseEnrollment.objects.bulk_upsert_consent(
+                enrollments, batch_size=self.batch_size
+            )
+
+        return [
+            OrderedDict([
+                ('username', item['username']),
+                ('course_id', item['course_id']),
+                ('consent_granted', item.get('consent_granted')),
+                ('created', (self.enterprise_customer_users[item['username']].pk, item['course_id']) in created),
+            ])
+            for item in validated_data
+        ]
+
+
 class EnterpriseCourseEnrollmentWriteSerializer(serializers.ModelSerializer):
     """
     Serializer for writing to the EnterpriseCourseEnrollment model.
@@ -94,21 +254,26 @@ class EnterpriseCourseEnrollmentWriteSerializer(serializers.ModelSerializer):
         fields = (
             'username', 'course_id', 'consent_granted'
         )
+        list_serializer_class = EnterpriseCourseEnrollmentBulkWriteSerializer
+
     username = serializers.CharField(max_length=30)
     enterprise_customer_user = None
 
     def validate_username(self, value):
         """
         Verify that the username has a matching user, and that the user has an associated EnterpriseCustomerUser.
+
+        Items of lists use the EnterpriseCustomerUsers looked up by the list serializer.
         """
-        try:
-            user = User.objects.get(username=value)
-        except User.DoesNotExist:
+        enterprise_customer_users = getattr(self.parent, 'enterprise_customer_users', None)
+        if enterprise_customer_users is None:
+            enterprise_customer_users = models.EnterpriseCustomerUser.objects.get_links_by_usernames([value])
+
+        if value not in enterprise_customer_users:
             raise serializers.ValidationError("User does not exist")
 
-        try:
-            enterprise_customer_user = models.EnterpriseCustomerUser.objects.get(user_id=user.pk)
-        except models.EnterpriseCustomerUser.DoesNotExist:
+        enterprise_customer_user = enterprise_customer_users[value]
+        if enterprise_customer_user is None:
             raise serializers.ValidationError("User has no EnterpriseCustomerUser")
 
         self.enterprise_customer_user = enterprise_customer_user
@@ -128,7 +293,7 @@ class EnterpriseCourseEnrollmentWriteSerializer(serializers.ModelSerializer):
         )
 
 
-class UserDataSharingConsentAuditSerializer(serializers.ModelSerializer):
+class UserDataSharingConsentAuditSerializer(SparseFieldsetsMixin, serializers.ModelSerializer):
     """
     Serializer for UserDataSharingConsentAudit model.
     """
@@ -139,7 +304,22 @@ class UserDataSharingConsentAuditSerializer(serializers.ModelSerializer):
         )
 
 
-class EnterpriseCustomerUserReadOnlySerializer(serializers.ModelSerializer):
+class EnterpriseCustomerUserListSerializer(serializers.ListSerializer):  # pylint: disable=abstract-method
+    """
+    Serializer for lists of EnterpriseCustomerUser, which looks the users of all the items up at once.
+    """
+
+    def to_representation(self, data):
+        """
+        Attach the users to the items before serializing them, unless the users aren't rendered.
+        """
+        enterprise_customer_users = data.all() if isinstance(data, Manager) else data
+        if 'user' in self.child.fields:
+            enterprise_customer_users = models.EnterpriseCustomerUser.objects.attach_users(enterprise_customer_users)
+        return super(EnterpriseCustomerUserListSerializer, self).to_representation(enterprise_customer_users)
+
+
+class EnterpriseCustomerUserReadOnlySerializer(SparseFieldsetsMixin, serializers.ModelSerializer):
     """
     Serializer for EnterpriseCustomerUser model.
     """
@@ -148,6 +328,7 @@ class EnterpriseCustomerUserReadOnlySerializer(serializers.ModelSerializer):
         fields = (
             'id', 'enterprise_customer', 'user_id', 'user', 'data_sharing_consent'
         )
+        list_serializer_class = EnterpriseCustomerUserListSerializer
 
     user = UserSerializer()
     enterprise_customer = EnterpriseCustomerSerializer()
@@ -261,80 +442,69 @@ class EnterpriseCatalogCoursesReadOnlySerializer(serializers.Serializer):
 
         We are adding following field in all the courses.
             tpa_hint: a string for identifying Identity Provider.
-        """
-        courses = []
-        enterprise_customer = utils.get_enterprise_customer_for_user(request.user)
 
+        The enterprise context of the requesting user is looked up once, see
+        ``utils.get_enterprise_context_for_user``, so courses are updated without any database access.
+        """
+        enterprise_context = utils.get_enterprise_context_for_user(request.user, request=request)
         global_context = {
-            'tpa_hint': enterprise_customer and enterprise_customer.identity_provider,
-            'enterprise_id': enterprise_customer and enterprise_customer.uuid,
+            'tpa_hint': enterprise_context['tpa_hint'],
+            'enterprise_id': enterprise_context['enterprise_id'],
             'catalog_id': catalog_id,
         }
 
-        for course in self.data['results']:
-            courses.append(
-                self.update_course(course, catalog_id, enterprise_customer, global_context)
-            )
-        self.data['results'] = courses
+        self.data['results'] = [self.update_course(course, global_context) for course in self.data['results']]
 
-    def update_course(self, course, catalog_id, enterprise_customer, global_context):
+    def update_course(self, course, global_context):
         """
         Update course metadata of the given course and return updated course.
 
         Arguments:
             course (dict): Course Metadata returned by course catalog API
-            catalog_id (int): identifier of the catalog given course belongs to.
-            enterprise_customer (EnterpriseCustomer): enterprise customer instance.
-            global_context (dict): Global attributes that should be added to all the courses.
+            global_context (dict): Global attributes that should be added to all the courses, i.e. the identity
+                provider slug, the enterprise customer UUID and the catalog identifier, which are also added to the
+                marketing and track selection urls.
 
         Returns:
             (dict): Updated course metadata
         """
+        query_parameters = {
+            'tpa_hint': global_context.get('tpa_hint'),
+            'enterprise_id': global_context.get('enterprise_id'),
+            'catalog_id': global_context.get('catalog_id'),
+        }
+
         # extract course runs from course metadata and
         # Replace course's course runs with the updated course runs
         course['course_runs'] = self.update_course_runs(
             course_runs=course.get('course_runs') or [],
-            catalog_id=catalog_id,
-            enterprise_customer=enterprise_customer,
+            query_parameters=query_parameters,
         )
 
         # Update marketing urls in course metadata to include enterprise related info.
         if course.get('marketing_url'):
             course.update({
-                "marketing_url": utils.update_query_parameters(
-                    course.get('marketing_url'),
-                    {
-                        'tpa_hint': enterprise_customer and enterprise_customer.identity_provider,
-                        'enterprise_id': enterprise_customer and enterprise_customer.uuid,
-                        'catalog_id': catalog_id,
-                    },
-                ),
+                "marketing_url": utils.update_query_parameters(course.get('marketing_url'), query_parameters),
             })
 
         # now add global context to the course.
         course.update(global_context)
         return course
 
-    def update_course_runs(self, course_runs, catalog_id, enterprise_customer):
+    def update_course_runs(self, course_runs, query_parameters):
         """
         Update Marketing urls in course metadata adn return updated course.
 
         Arguments:
             course_runs (list): List of course runs.
-            catalog_id (int): Course catalog identifier.
-            enterprise_customer (EnterpriseCustomer): enterprise customer instance.
+            query_parameters (dict): The identity provider slug, enterprise customer UUID and catalog identifier to
+                add to the urls of the course runs.
 
         Returns:
             (dict): Dictionary containing updated course metadata.
         """
         updated_course_runs = []
 
-        query_parameters = {
-            'tpa_hint': enterprise_customer and enterprise_customer.identity_provider,
-            'enterprise_id': enterprise_customer and enterprise_customer.uuid,
-            'catalog_id': catalog_id,
-        }
-
         for course_run in course_runs:
             track_selection_url = utils.get_course_track_selection_url(
                 course_run=course_run,
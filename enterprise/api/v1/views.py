@@ -6,9 +6,9 @@ from __future__ import absolute_import, unicode_literals
 from logging import getLogger
 
 from edx_rest_framework_extensions.authentication import BearerAuthentication, JwtAuthentication
-from rest_framework import filters, permissions, viewsets
+from rest_framework import filters, permissions, status, viewsets
 from rest_framework.authentication import SessionAuthentication
-from rest_framework.decorators import detail_route
+from rest_framework.decorators import detail_route, list_route
 from rest_framework.exceptions import NotFound
 from rest_framework.response import Response
 from rest_framework_oauth.authentication import OAuth2Authentication
@@ -18,7 +18,7 @@ from django.contrib.sites.models import Site
 
 from enterprise import models
 from enterprise.api.filters import EnterpriseCustomerUserFilterBackend
-from enterprise.api.pagination import get_paginated_response
+from enterprise.api.pagination import CreatedCursorPagination, get_paginated_response
 from enterprise.api.permissions import IsServiceUserOrReadOnly
 from enterprise.api.throttles import ServiceUserThrottle
 from enterprise.api.v1 import serializers
@@ -27,7 +27,7 @@ from enterprise.course_catalog_api import CourseCatalogApiClient
 logger = getLogger(__name__)  # pylint: disable=invalid-name
 
 
-class EnterpriseModelViewSet(object):
+class EnterpriseModelViewSet(viewsets.GenericViewSet):
     """
     Base class for attribute and method definitions common to all view sets.
     """
@@ -35,6 +35,34 @@ class EnterpriseModelViewSet(object):
     permission_classes = (permissions.IsAuthenticated,)
     authentication_classes = (OAuth2Authentication, SessionAuthentication, BearerAuthentication, JwtAuthentication)
     throttle_classes = (ServiceUserThrottle,)
+    cursor_pagination_class = None
+
+    @property
+    def paginator(self):
+        """
+        The paginator of the view, which is the cursor paginator for requests having a cursor, if the view has one.
+        """
+        if not hasattr(self, '_paginator'):
+            pagination_class = self.cursor_pagination_class
+            if pagination_class is not None and pagination_class.cursor_query_param in self.request.query_params:
+                # Subclasses set cursor_pagination_class to a paginator class; None is only the default.
+                self._paginator = pagination_class()  # pylint: disable=attribute-defined-outside-init,not-callable
+        return super(EnterpriseModelViewSet, self).paginator
+
+    def get_queryset(self):
+        """
+        Join or prefetch the related objects rendered by the serializer of read-only requests.
+
+        Only the related objects of the fields asked for, see ``SparseFieldsetsMixin``, are looked up.
+        """
+        queryset = super(EnterpriseModelViewSet, self).get_queryset()
+        if self.request.method in ('GET', ):
+            select_related, prefetch_related = serializers.get_related_lookups(self.get_serializer())
+            if select_related:
+                queryset = queryset.select_related(*select_related)
+            if prefetch_related:
+                queryset = queryset.prefetch_related(*prefetch_related)
+        return queryset
 
 
 class EnterpriseReadOnlyModelViewSet(EnterpriseModelViewSet, viewsets.ReadOnlyModelViewSet):
@@ -71,6 +99,7 @@ class EnterpriseCourseEnrollmentViewSet(EnterpriseReadWriteModelViewSet):
     API views for `enterprise course enrollment` api endpoint.
     """
     queryset = models.EnterpriseCourseEnrollment.objects.all()
+    cursor_pagination_class = CreatedCursorPagination
 
     FIELDS = (
         'enterprise_customer_user', 'consent_granted', 'course_id'
@@ -86,6 +115,26 @@ class EnterpriseCourseEnrollmentViewSet(EnterpriseReadWriteModelViewSet):
             return serializers.EnterpriseCourseEnrollmentReadOnlySerializer
         return serializers.EnterpriseCourseEnrollmentWriteSerializer
 
+    @list_route(methods=['post'])
+    def bulk(self, request):
+        """
+        Create, or update the consent of, many enterprise course enrollments at once.
+
+        The request data is a list of enrollments, as they are posted one at a time. They are all validated
+        before any of them is written, and written in a single transaction.
+
+        Arguments:
+            request (HttpRequest): Reference to in progress request instance.
+
+        Returns:
+            (HttpResponse): Response object containing the enrollments, along with whether they were created, or
+            the errors of every enrollment if any of them is invalid.
+        """
+        serializer = self.get_serializer(data=request.data, many=True)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        return Response(serializer.save(), status=status.HTTP_201_CREATED)
+
 
 class SiteViewSet(EnterpriseReadOnlyModelViewSet):
     """
@@ -175,6 +224,7 @@ class UserDataSharingConsentAuditViewSet(EnterpriseReadOnlyModelViewSet):
     """
     queryset = models.UserDataSharingConsentAudit.objects.all()
     serializer_class = serializers.UserDataSharingConsentAuditSerializer
+    cursor_pagination_class = CreatedCursorPagination
 
     FIELDS = (
         'user', 'state',
@@ -8,7 +8,9 @@ from __future__ import absolute_import, unicode_literals
 from django.apps import AppConfig, apps
 from django.conf import settings
 
-from enterprise.constants import USER_POST_SAVE_DISPATCH_UID
+from enterprise.constants import (ENTERPRISE_CONTEXT_CHANGE_DISPATCH_UID, PENDING_LINK_POST_SAVE_DISPATCH_UID,
+                                  SSO_CONSENT_CHANGE_DISPATCH_UID, SSO_CUSTOMER_CHANGE_DISPATCH_UID,
+                                  USER_POST_SAVE_DISPATCH_UID)
 
 
 class EnterpriseConfig(AppConfig):
@@ -31,11 +33,32 @@ class EnterpriseConfig(AppConfig):
         """
         Perform other one-time initialization steps.
         """
-        from enterprise.signals import handle_user_post_save
+        from enterprise.models import (EnterpriseCustomer, EnterpriseCustomerIdentityProvider, EnterpriseCustomerUser,
+                                       PendingEnterpriseCustomerUser, UserDataSharingConsentAudit)
+        from enterprise.signals import (handle_enterprise_context_change, handle_pending_link_post_save,
+                                        handle_sso_consent_change, handle_sso_customer_change, handle_user_post_save)
         from enterprise.utils import patch_mako_lookup
-        from django.db.models.signals import pre_migrate, post_save
+        from django.db.models.signals import pre_migrate, post_delete, post_save
 
         post_save.connect(handle_user_post_save, sender=self.auth_user_model, dispatch_uid=USER_POST_SAVE_DISPATCH_UID)
+        post_save.connect(
+            handle_pending_link_post_save,
+            sender=PendingEnterpriseCustomerUser,
+            dispatch_uid=PENDING_LINK_POST_SAVE_DISPATCH_UID,
+        )
+        for sender in (EnterpriseCustomer, EnterpriseCustomerIdentityProvider):
+            for signal in (post_save, post_delete):
+                signal.connect(handle_sso_customer_change, sender=sender, dispatch_uid=SSO_CUSTOMER_CHANGE_DISPATCH_UID)
+        for sender in (EnterpriseCustomerUser, UserDataSharingConsentAudit):
+            for signal in (post_save, post_delete):
+                signal.connect(handle_sso_consent_change, sender=sender, dispatch_uid=SSO_CONSENT_CHANGE_DISPATCH_UID)
+        for sender in (EnterpriseCustomerUser, EnterpriseCustomer, EnterpriseCustomerIdentityProvider):
+            for signal in (post_save, post_delete):
+                signal.connect(
+                    handle_enterprise_context_change,
+                    sender=sender,
+                    dispatch_uid=ENTERPRISE_CONTEXT_CHANGE_DISPATCH_UID,
+                )
         pre_migrate.connect(self._disconnect_user_post_save_for_migrations)
         patch_mako_lookup()
 
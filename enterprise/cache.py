@@ -0,0 +1,367 @@
+# -*- coding: utf-8 -*-
+"""
+Response caches for the remote APIs used by the enterprise app.
+
+Two backends are available:
+
+* ``local``: a process-local, thread-safe LRU cache bounded by ``ENTERPRISE_API_CACHE_MAX_SIZE`` entries.
+* ``django``: stores responses in the Django cache named by ``ENTERPRISE_API_CACHE_ALIAS``; eviction is left
+  to the configured cache server.
+
+The backend is chosen with the ``ENTERPRISE_API_CACHE_BACKEND`` setting, and entries expire after
+``ENTERPRISE_API_CACHE_TIMEOUT`` seconds. A timeout of 0 disables caching.
+"""
+from __future__ import absolute_import, unicode_literals
+
+import copy
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.cache import caches
+
+DEFAULT_BACKEND = 'local'
+DEFAULT_TIMEOUT = 300  # 5 minutes
+DEFAULT_MAX_SIZE = 1000
+DEFAULT_CACHE_ALIAS = 'default'
+DEFAULT_NAMESPACE = 'enterprise.responses'
+
+# Response caches built so far, keyed by name.
+_RESPONSE_CACHES = {}
+_RESPONSE_CACHES_LOCK = threading.Lock()
+
+
+def make_cache_key(prefix, *args, **kwargs):
+    """
+    Build a cache key from the given positional and keyword arguments.
+
+    The arguments are serialized in a stable order and hashed, so the key is safe to use with any cache server.
+
+    Arguments:
+        prefix (str): Namespace for the key, e.g. the name of the API.
+        args (iterable): Positional values identifying the cached response (resource, resource id, etc.)
+        kwargs (dict): Keyword values identifying the cached response (querystring, etc.)
+
+    Returns:
+        str: The cache key.
+    """
+    key_data = json.dumps([args, kwargs], sort_keys=True, default=str)
+    return '{prefix}.{hash}'.format(prefix=prefix, hash=hashlib.md5(key_data.encode('utf-8')).hexdigest())
+
+
+class ResponseCache(object):
+    """
+    Base class for API response caches.
+
+    Keeps count of cache hits and misses so the effectiveness of the cache can be monitored.
+    """
+
+    def __init__(self, timeout=DEFAULT_TIMEOUT):
+        """
+        Initialize the cache.
+
+        Arguments:
+            timeout (int): Number of seconds after which a cached response expires. 0 disables caching.
+        """
+        self.timeout = timeout
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def enabled(self):
+        """
+        Whether responses are cached at all.
+        """
+        return self.timeout > 0
+
+    @property
+    def hit_ratio(self):
+        """
+        Fraction of lookups that were served from the cache; 0 when nothing was looked up yet.
+        """
+        lookups = self.hits + self.misses
+        return float(self.hits) / lookups if lookups else 0.0
+
+    def get(self, key):
+        """
+        Return the response cached under ``key``, or None if it's missing or expired.
+        """
+        if not self.enabled:
+            return None
+        value = self._get(key)
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    def set(self, key, value):
+        """
+        Cache ``value`` under ``key``.
+        """
+        if self.enabled:
+            self._set(key, value)
+
+    def delete(self, key):
+        """
+        Remove the response cached under ``key``, if any.
+        """
+        if self.enabled:
+            self._delete(key)
+
+    def get_or_load(self, key, load, refresh=False, store=True):
+        """
+        Return the response cached under ``key``; on a miss, call ``load`` and cache its result.
+
+        Empty results are not cached, as the remote APIs return those when a request fails.
+
+        Arguments:
+            key (str): The cache key of the response.
+            load (callable): Function returning the response, called on a miss.
+            refresh (bool): If True, call ``load`` even if a response is cached.
+            store (bool): If False, don't cache the loaded response.
+        """
+        value = None if refresh else self.get(key)
+        if value is None:
+            value = load()
+            if value and store:
+                self.set(key, value)
+        return value
+
+    def clear(self):
+        """
+        Drop all cached responses and reset the statistics.
+        """
+        self.hits = 0
+        self.misses = 0
+        self._clear()
+
+    def _get(self, key):
+        """
+        Return the value stored under ``key``, or None.
+        """
+        raise NotImplementedError
+
+    def _set(self, key, value):
+        """
+        Store ``value`` under ``key``.
+        """
+        raise NotImplementedError
+
+    def _delete(self, key):
+        """
+        Remove the value stored under ``key``.
+        """
+        raise NotImplementedError
+
+    def _clear(self):
+        """
+        Remove all stored values.
+        """
+        raise NotImplementedError
+
+
+class LocalResponseCache(ResponseCache):
+    """
+    Process-local response cache with per-entry expiry and least-recently-used eviction.
+
+    Values are copied on the way in and out, so callers can't alter cached responses by modifying the
+    objects they get back.
+    """
+
+    def __init__(self, timeout=DEFAULT_TIMEOUT, max_size=DEFAULT_MAX_SIZE, copy_values=True):
+        """
+        Initialize the cache.
+
+        Arguments:
+            timeout (int): Number of seconds after which a cached response expires. 0 disables caching.
+            max_size (int): Maximum number of responses to keep; the least recently used are evicted first.
+            copy_values (bool): Whether to copy values on the way in and out. Only disable this for values
+                that are never modified after they are cached.
+        """
+        super(LocalResponseCache, self).__init__(timeout)
+        self.max_size = max_size
+        self.copy_values = copy_values
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _copy(self, value):
+        """
+        Return a copy of ``value``, or ``value`` itself if copying is disabled.
+        """
+        return copy.deepcopy(value) if self.copy_values else value
+
+    def _get(self, key):
+        """
+        Return the value stored under ``key`` and mark it as most recently used.
+        """
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at <= time.time():
+                return None
+            self._entries[key] = entry
+            return self._copy(value)
+
+    def _set(self, key, value):
+        """
+        Store ``value`` under ``key``, evicting the least recently used entries if the cache is full.
+        """
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = (time.time() + self.timeout, self._copy(value))
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def _delete(self, key):
+        """
+        Remove the value stored under ``key``.
+        """
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def _clear(self):
+        """
+        Remove all stored values.
+        """
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        """
+        Return the number of stored entries, including those that expired but were not evicted yet.
+        """
+        return len(self._entries)
+
+
+class DjangoResponseCache(ResponseCache):
+    """
+    Response cache backed by one of the Django caches, so responses can be shared between processes.
+
+    Keys are prefixed with the cache's namespace and a generation, stored in the Django cache too; clearing the cache
+    starts a new generation, so only the responses of this cache are dropped, and the rest of the Django cache is
+    left alone.
+    """
+
+    def __init__(self, timeout=DEFAULT_TIMEOUT, cache_alias=DEFAULT_CACHE_ALIAS, namespace=DEFAULT_NAMESPACE):
+        """
+        Initialize the cache.
+
+        Arguments:
+            timeout (int): Number of seconds after which a cached response expires. 0 disables caching.
+            cache_alias (str): Name of the Django cache (from the ``CACHES`` setting) to store responses in.
+            namespace (str): Prefix of the keys of the responses in the Django cache.
+        """
+        super(DjangoResponseCache, self).__init__(timeout)
+        self.cache = caches[cache_alias]
+        self.namespace = namespace
+
+    @property
+    def _generation_key(self):
+        """
+        Key of the current generation of the responses in the Django cache.
+        """
+        return '{namespace}.generation'.format(namespace=self.namespace)
+
+    def _make_key(self, key):
+        """
+        Return the key of the value stored under ``key`` in the Django cache, in the current generation.
+        """
+        generation = self.cache.get(self._generation_key)
+        if generation is None:
+            # Another process may start the first generation concurrently; only one of them wins.
+            self.cache.add(self._generation_key, uuid4().hex, None)
+            generation = self.cache.get(self._generation_key)
+        return '{namespace}.{generation}.{key}'.format(namespace=self.namespace, generation=generation, key=key)
+
+    def _get(self, key):
+        """
+        Return the value stored under ``key``, or None.
+        """
+        return self.cache.get(self._make_key(key))
+
+    def _set(self, key, value):
+        """
+        Store ``value`` under ``key``.
+        """
+        self.cache.set(self._make_key(key), value, self.timeout)
+
+    def _delete(self, key):
+        """
+        Remove the value stored under ``key``.
+        """
+        self.cache.delete(self._make_key(key))
+
+    def _clear(self):
+        """
+        Remove all stored values, by starting a new generation; the old values expire on their own.
+        """
+        self.cache.set(self._generation_key, uuid4().hex, None)
+
+
+def get_response_cache(name):
+    """
+    Return the response cache with the given name, creating it from the Django settings on first use.
+
+    Arguments:
+        name (str): Name of the cache, e.g. the API whose responses are cached.
+
+    Returns:
+        ResponseCache: The cache instance shared by every caller using the same name.
+    """
+    with _RESPONSE_CACHES_LOCK:
+        if name not in _RESPONSE_CACHES:
+            backend = getattr(settings, 'ENTERPRISE_API_CACHE_BACKEND', DEFAULT_BACKEND)
+            timeout = getattr(settings, 'ENTERPRISE_API_CACHE_TIMEOUT', DEFAULT_TIMEOUT)
+            if backend == 'django':
+                _RESPONSE_CACHES[name] = DjangoResponseCache(
+                    timeout=timeout,
+                    cache_alias=getattr(settings, 'ENTERPRISE_API_CACHE_ALIAS', DEFAULT_CACHE_ALIAS),
+                    namespace='{prefix}.{name}'.format(prefix=DEFAULT_NAMESPACE, name=name),
+                )
+            elif backend == 'local':
+                _RESPONSE_CACHES[name] = LocalResponseCache(
+                    timeout=timeout,
+                    max_size=getattr(settings, 'ENTERPRISE_API_CACHE_MAX_SIZE', DEFAULT_MAX_SIZE),
+                )
+            else:
+                raise ValueError('Unknown ENTERPRISE_API_CACHE_BACKEND: {}'.format(backend))
+        return _RESPONSE_CACHES[name]
+
+
+def get_local_cache(name, timeout, max_size=DEFAULT_MAX_SIZE, copy_values=True):
+    """
+    Return the process-local cache with the given name, creating it with the given options on first use.
+
+    Unlike :func:`get_response_cache`, this is not configured by the ``ENTERPRISE_API_CACHE_*`` settings; it is
+    meant for derived data, like indexes built from API responses, which must stay in the process.
+
+    Arguments:
+        name (str): Name of the cache.
+        timeout (int): Number of seconds after which a cached value expires. 0 disables caching.
+        max_size (int): Maximum number of values to keep; the least recently used are evicted first.
+        copy_values (bool): Whether to copy values on the way in and out.
+
+    Returns:
+        LocalResponseCache: The cache instance shared by every caller using the same name.
+    """
+    with _RESPONSE_CACHES_LOCK:
+        if name not in _RESPONSE_CACHES:
+            _RESPONSE_CACHES[name] = LocalResponseCache(timeout=timeout, max_size=max_size, copy_values=copy_values)
+        return _RESPONSE_CACHES[name]
+
+
+def reset_response_caches():
+    """
+    Forget all the response caches, so they are rebuilt from the current settings on next use.
+    """
+    with _RESPONSE_CACHES_LOCK:
+        for cache in _RESPONSE_CACHES.values():
+            cache.clear()
+        _RESPONSE_CACHES.clear()
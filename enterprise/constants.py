@@ -9,3 +9,23 @@ from __future__ import absolute_import, unicode_literals
 # with an EnterpriseCustomer when applicable. This it the unique identifier
 # used to ensure that signal receiver is only called once.
 USER_POST_SAVE_DISPATCH_UID = "user_post_save_upgrade_pending_enterprise_customer_user"
+
+# We listen to the PendingEnterpriseCustomerUser post_save signal in order to keep the index of pending emails, used
+# by the User post_save signal receiver, up to date. This is the unique identifier used to ensure that signal
+# receiver is only called once.
+PENDING_LINK_POST_SAVE_DISPATCH_UID = "pending_link_post_save_invalidate_pending_email_index"
+
+# We listen to the EnterpriseCustomer and EnterpriseCustomerIdentityProvider post_save and post_delete signals in
+# order to forget the customers cached by identity provider. This is the unique identifier used to ensure that
+# signal receiver is only called once.
+SSO_CUSTOMER_CHANGE_DISPATCH_UID = "sso_customer_change_clear_cache"
+
+# We listen to the EnterpriseCustomerUser and UserDataSharingConsentAudit post_save and post_delete signals in order
+# to forget the cached links and consent states of users. This is the unique identifier used to ensure that signal
+# receiver is only called once.
+SSO_CONSENT_CHANGE_DISPATCH_UID = "sso_consent_change_forget_consent_state"
+
+# Signal receiver for EnterpriseCustomerUser, EnterpriseCustomer and EnterpriseCustomerIdentityProvider changes, in
+# order to forget the cached enterprise contexts of users. This is the unique identifier used to ensure that signal
+# receiver is only called once.
+ENTERPRISE_CONTEXT_CHANGE_DISPATCH_UID = "enterprise_context_change_forget_enterprise_context"
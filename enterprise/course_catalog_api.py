@@ -4,8 +4,17 @@ Utilities to get details from the course catalog API.
 """
 from __future__ import absolute_import, unicode_literals
 
+import copy
+import threading
+from contextlib import closing
+
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from django.conf import settings
+from django.db import connection
 from django.utils.translation import ugettext_lazy as _
 
+from enterprise.cache import get_local_cache, get_response_cache, make_cache_key
 from enterprise.utils import MultipleProgramMatchError, NotConnectedToOpenEdX
 
 try:
@@ -24,12 +33,61 @@ except ImportError:
     get_edx_api_data = None
 
 
+# Number of seconds after which the program index is rebuilt from the Course Catalog API.
+DEFAULT_PROGRAM_INDEX_TIMEOUT = 900  # 15 minutes
+# Maximum number of program indexes (one per user) kept in memory.
+PROGRAM_INDEX_MAX_SIZE = 100
+# Maximum number of Course Catalog API requests made concurrently when fetching several course runs.
+DEFAULT_MAX_WORKERS = 8
+
+
+class ProgramIndex(object):
+    """
+    In-memory index of programs by title and by UUID.
+
+    Built once from the Course Catalog API programs listing, so lookups don't need to scan all the programs.
+    """
+
+    def __init__(self, programs):
+        """
+        Index the given programs.
+
+        Arguments:
+            programs (list): Program data provided by Course Catalog API.
+        """
+        self.programs_by_title = {}
+        self.programs_by_uuid = {}
+        for program in programs:
+            self.programs_by_title.setdefault(program.get('title'), []).append(program)
+            if program.get('uuid'):
+                self.programs_by_uuid[program['uuid']] = program
+
+    def __len__(self):
+        """
+        Return the number of indexed programs.
+        """
+        return sum(len(programs) for programs in self.programs_by_title.values())
+
+    def get_by_title(self, program_title):
+        """
+        Return a list of copies of all programs with the given title.
+        """
+        return copy.deepcopy(self.programs_by_title.get(program_title, []))
+
+    def get_by_uuid(self, program_uuid):
+        """
+        Return a copy of the program with the given UUID, or None if not found.
+        """
+        return copy.deepcopy(self.programs_by_uuid.get(program_uuid))
+
+
 class CourseCatalogApiClient(object):
     """
     Object builds an API client to make calls to the Catalog API.
     """
 
     DEFAULT_VALUE_SAFEGUARD = object()
+    CACHE_NAME = 'course_catalog_api'
 
     def __init__(self, user):
         """
@@ -54,6 +112,9 @@ class CourseCatalogApiClient(object):
 
         self.user = user
         self.client = course_discovery_api_client(user)
+        # API clients of the worker threads, which must not share the requests session of ``self.client``
+        self._thread_clients = threading.local()
+        self._thread_clients.client = self.client
 
     def get_all_catalogs(self):
         """
@@ -86,6 +147,49 @@ class CourseCatalogApiClient(object):
             traverse_pagination=False, many=False,
         )
 
+    def iter_catalog_courses(self, catalog_id):
+        """
+        Yield all the courses of a catalog, fetching them page by page.
+
+        While the courses of a page are being consumed, the next page is fetched in the background. At most two
+        pages are held in memory at any time, and pages are not stored in the response cache.
+
+        Arguments:
+            catalog_id(int): Course Catalog ID.
+
+        Yields:
+            dict: Course data provided by Course Catalog API.
+        """
+        executor = ThreadPoolExecutor(max_workers=1)
+        next_response = None
+        try:
+            page = 1
+            response = self._get_catalog_courses_page(catalog_id, page)
+            while response:
+                next_response = None
+                if response.get('next'):
+                    page += 1
+                    next_response = executor.submit(
+                        self._run_in_thread, self._get_catalog_courses_page, catalog_id, page
+                    )
+                for course in response.get('results', []):
+                    yield course
+                response = next_response.result() if next_response else None
+        finally:
+            if next_response:
+                next_response.cancel()
+            executor.shutdown(wait=False)
+
+    def _get_catalog_courses_page(self, catalog_id, page):
+        """
+        Return one page of catalog courses, bypassing the response cache.
+        """
+        resource = 'catalogs/{}/courses/'.format(catalog_id)
+        return self._load_data(
+            resource, default={}, use_cache=False, cache_response=False, querystring={'page': page},
+            traverse_pagination=False, many=False,
+        )
+
     def get_course_run(self, course_run_id):
         """
         Return course_run data, including name, ID and seats.
@@ -108,8 +212,7 @@ class CourseCatalogApiClient(object):
         Returns:
             dict: Program data provided by Course Catalog API
         """
-        all_programs = self._load_data('programs', default=[])
-        matching_programs = [program for program in all_programs if program.get('title') == program_title]
+        matching_programs = self.get_program_index().get_by_title(program_title)
         if len(matching_programs) > 1:
             raise MultipleProgramMatchError(len(matching_programs))
         elif len(matching_programs) == 1:
@@ -117,17 +220,52 @@ class CourseCatalogApiClient(object):
         else:
             return None
 
+    def get_program_index(self, refresh=False):
+        """
+        Return the index of all the programs available to the user.
+
+        The index is built from the programs listing the first time it is needed, shared by all clients of the
+        same user, and rebuilt once it is older than ``ENTERPRISE_PROGRAM_INDEX_TIMEOUT`` seconds. Empty indexes,
+        e.g. built after a failed request, are not cached.
+
+        Arguments:
+            refresh (bool): Rebuild the index now, even if it has not expired yet.
+
+        Returns:
+            ProgramIndex: Index of the programs provided by Course Catalog API.
+        """
+        index_cache = get_local_cache(
+            'program_index',
+            timeout=getattr(settings, 'ENTERPRISE_PROGRAM_INDEX_TIMEOUT', DEFAULT_PROGRAM_INDEX_TIMEOUT),
+            max_size=PROGRAM_INDEX_MAX_SIZE,
+            copy_values=False,
+        )
+        cache_key = make_cache_key('program_index', self.user.pk)
+        program_index = None if refresh else index_cache.get(cache_key)
+        if program_index is None:
+            program_index = ProgramIndex(self._load_data('programs', default=[], use_cache=not refresh))
+            # An empty listing is what the API returns when a request fails, so an empty index is not cached.
+            if program_index:
+                index_cache.set(cache_key, program_index)
+        return program_index
+
     def get_program_by_uuid(self, program_uuid):
         """
         Return single program by UUID, or None if not found.
 
+        The program is looked up in the program index first, and only requested on its own if it is not indexed,
+        e.g. when it was created after the index was built.
+
         Arguments:
             program_uuid(string): Program UUID in string form
 
         Returns:
             dict: Program data provided by Course Catalog API
         """
-        return self._load_data('programs', resource_id=program_uuid, default=None)
+        program = self.get_program_index().get_by_uuid(program_uuid)
+        if program is None:
+            program = self._load_data('programs', resource_id=program_uuid, default=None)
+        return program
 
     def get_common_course_modes(self, course_run_ids):
         """
@@ -168,37 +306,113 @@ class CourseCatalogApiClient(object):
             {}
         """
         available_course_modes = None
-        for course_run_id in course_run_ids:
-            course_run = self.get_course_run(course_run_id) or {}
-            course_run_modes = {seat.get('type') for seat in course_run.get('seats', [])}
+        with closing(self.iter_course_runs(course_run_ids)) as course_runs:
+            for __, course_run in course_runs:
+                course_run_modes = {seat.get('type') for seat in course_run.get('seats', [])}
 
-            if available_course_modes is None:
-                available_course_modes = course_run_modes
-            else:
-                available_course_modes &= course_run_modes
+                if available_course_modes is None:
+                    available_course_modes = course_run_modes
+                else:
+                    available_course_modes &= course_run_modes
 
-            if not available_course_modes:
-                return available_course_modes
+                if not available_course_modes:
+                    # Closing the iterator cancels the requests that haven't started yet.
+                    return available_course_modes
 
         return available_course_modes
 
-    def _load_data(self, resource, default=DEFAULT_VALUE_SAFEGUARD, **kwargs):
+    def iter_course_runs(self, course_run_ids):
+        """
+        Fetch several course runs concurrently, yielding each one as soon as it is available.
+
+        Requests are made by a pool of at most ``ENTERPRISE_CATALOG_API_MAX_WORKERS`` threads. Closing the
+        iterator before it is exhausted cancels the requests that haven't started yet.
+
+        Arguments:
+            course_run_ids(Iterable[str]): Target Course run IDs.
+
+        Yields:
+            tuple: (course run ID, course run data); the data is an empty dict if the course run was not found.
+        """
+        course_run_ids = list(course_run_ids)
+        max_workers = min(
+            getattr(settings, 'ENTERPRISE_CATALOG_API_MAX_WORKERS', DEFAULT_MAX_WORKERS),
+            len(course_run_ids),
+        )
+        if max_workers <= 1:
+            for course_run_id in course_run_ids:
+                yield course_run_id, self.get_course_run(course_run_id) or {}
+            return
+
+        executor = ThreadPoolExecutor(max_workers=max_workers)
+        futures = {
+            executor.submit(self._run_in_thread, self.get_course_run, course_run_id): course_run_id
+            for course_run_id in course_run_ids
+        }
+        try:
+            for future in as_completed(futures):
+                yield futures[future], future.result() or {}
+        finally:
+            for future in futures:
+                future.cancel()
+            executor.shutdown(wait=False)
+
+    @staticmethod
+    def _run_in_thread(method, *args):
+        """
+        Call ``method`` from a worker thread, closing the database connection the thread may have opened.
+        """
+        try:
+            return method(*args)
+        finally:
+            connection.close()
+
+    def _get_thread_client(self):
+        """
+        Return the API client of the current thread, creating it on first use in a worker thread.
+        """
+        client = getattr(self._thread_clients, 'client', None)
+        if client is None:
+            client = self._thread_clients.client = course_discovery_api_client(self.user)
+        return client
+
+    @property
+    def response_cache(self):
+        """
+        The cache shared by all clients for Course Catalog API responses.
+        """
+        return get_response_cache(self.CACHE_NAME)
+
+    def _load_data(self, resource, default=DEFAULT_VALUE_SAFEGUARD, use_cache=True, cache_response=True, **kwargs):
         """
         Load data from API client.
 
+        Responses are cached per user, keyed by the resource, resource_id, querystring and the other
+        ``get_edx_api_data`` arguments; see :mod:`enterprise.cache` for the cache settings.
+
         Arguments:
             resource(string): type of resource to load
             default(any): value to return if API query returned empty result. Sensible values: [], {}, None etc.
+            use_cache(bool): if False, always query the API instead of returning a cached response.
+            cache_response(bool): if False, don't store the API response in the cache.
 
         Returns:
             dict: Deserialized response from Course Catalog API
         """
         default_val = default if default != self.DEFAULT_VALUE_SAFEGUARD else {}
-        result = get_edx_api_data(
-            CatalogIntegration.current(),
-            self.user,
-            resource,
-            api=self.client,
-            **kwargs
-        )
+        cache_key = make_cache_key(self.CACHE_NAME, self.user.pk, resource, **kwargs)
+
+        def load():
+            """
+            Query the Course Catalog API.
+            """
+            return get_edx_api_data(
+                CatalogIntegration.current(),
+                self.user,
+                resource,
+                api=self._get_thread_client(),
+                **kwargs
+            )
+
+        result = self.response_cache.get_or_load(cache_key, load, refresh=not use_cache, store=cache_response)
         return result or default_val
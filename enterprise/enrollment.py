@@ -0,0 +1,265 @@
+"""
+Enrollment of enterprise learners in courses and programs.
+
+Shared by the Manage Learners admin view, which enrolls learners right away, and the background tasks processing
+enrollment jobs.
+"""
+from __future__ import absolute_import, unicode_literals
+
+import logging
+
+from django.contrib.auth.models import User
+
+from enterprise.lms_api import EnrollmentApiClient, EnrollmentExecutor, parse_lms_api_datetime
+from enterprise.models import EnterpriseCourseEnrollment, EnterpriseCustomerUser, PendingEnrollment
+from enterprise.utils import send_email_notification_messages
+
+
+def get_course_runs_from_program(program):
+    """
+    Return course runs from program data.
+
+    Arguments:
+        program(dict): Program data from Course Catalog API
+
+    Returns:
+        set: course runs in given program
+    """
+    course_runs = set()
+    for course in program.get("courses", []):
+        for run in course.get("course_runs", []):
+            if "key" in run and run["key"]:
+                course_runs.add(run["key"])
+
+    return course_runs
+
+
+def get_earliest_start_date_from_program(program):
+    """
+    Get the earliest date that one of the courses in the program was available.
+    For the sake of emails to new learners, we treat this as the program start date.
+
+    Arguemnts:
+        program (dict): Program data from Course Catalog API
+
+    returns:
+        datetime.datetime: The date and time at which the first course started
+    """
+    start_dates = []
+    for course in program.get('courses', []):
+        for run in course.get('course_runs', []):
+            if run.get('start'):
+                start_dates.append(parse_lms_api_datetime(run['start']))
+    if not start_dates:
+        return None
+    return min(start_dates)
+
+
+def enroll_users(enterprise_customer, users, course_mode, *course_ids):
+    """
+    Enroll users in any number of courses using a particular course mode, making the enrollments concurrently.
+
+    Args:
+        enterprise_customer: The EnterpriseCustomer which is sponsoring the enrollment
+        users: The users who need to be enrolled in the courses
+        course_mode: The mode with which the enrollments should be created
+        *course_ids: An iterable containing any number of course IDs to eventually enroll the users in.
+
+    Returns:
+        successes: A list of users who were successfully enrolled in all courses specified
+        failures: A list of users who could not be enrolled in some of the courses
+    """
+    users = list(users)
+    succeeded, failed = EnrollmentExecutor(client_class=EnrollmentApiClient).enroll(
+        (user.username, course_id, course_mode) for user in users for course_id in course_ids
+    )
+
+    link_ids = EnterpriseCustomerUser.objects.get_or_create_links(enterprise_customer, [user.id for user in users])
+
+    successes = []
+    failures = []
+    enrollments = []
+    for user in users:
+        user_succeeded = True
+        for course_id in course_ids:
+            if (user.username, course_id) in succeeded:
+                enrollments.append((link_ids[user.id], course_id))
+            else:
+                user_succeeded = False
+                logging.error(
+                    'Error while enrolling user %(user)s: %(message)s',
+                    dict(user=user.username, message=failed[(user.username, course_id)])
+                )
+        if user_succeeded:
+            successes.append(user)
+        else:
+            failures.append(user)
+    EnterpriseCourseEnrollment.objects.bulk_upsert(enrollments)
+    return successes, failures
+
+
+def get_users_by_email(emails):
+    """
+    Accept a list of emails, and separate them into users that exist on OpenEdX and users who don't.
+
+    Args:
+        emails: An iterable of email addresses to split between existing and nonexisting
+
+    Returns:
+        users: Queryset of users who exist in the OpenEdX platform and who were in the list of email addresses
+        missing_emails: List of unique emails which were in the original list, but do not yet exist as users
+    """
+    users = User.objects.filter(email__in=emails)
+    # Emails are compared case-insensitively, like databases with a case-insensitive collation match them.
+    present_emails = {email.lower() for email in users.values_list('email', flat=True)}
+    missing_emails = list({email for email in emails if email.lower() not in present_emails})
+    return users, missing_emails
+
+
+def enroll_users_pending_registration(enterprise_customer, emails, course_mode, *course_ids):
+    """
+    Create pending enrollments for many users at once, which will take effect on registration.
+
+    Args:
+        enterprise_customer: The EnterpriseCustomer which is sponsoring the enrollment
+        emails: The email addresses for the pending links to be created
+        course_mode: The mode with which the eventual enrollments should be created
+        *course_ids: An iterable containing any number of course IDs to eventually enroll the users in.
+
+    Returns:
+        list: The PendingEnterpriseCustomerUsers attached to the email addresses, in the same order
+    """
+    pending_links = EnterpriseCustomerUser.objects.get_or_create_pending_links(enterprise_customer, emails)
+    pending_users = [pending_links[email] for email in emails]
+    PendingEnrollment.objects.bulk_upsert(
+        (pending_user.id, course_id, course_mode) for pending_user in pending_users for course_id in course_ids
+    )
+    return pending_users
+
+
+def enroll_users_in_program(enterprise_customer, program_details, course_mode, emails):
+    """
+    Enroll existing users in all courses in a program, and create pending enrollments for nonexisting users.
+
+    Args:
+        enterprise_customer: The EnterpriseCustomer which is sponsoring the enrollment
+        program_details: The details of the program in which we're enrolling
+        course_mode (str): The mode with which we're enrolling in the program
+        emails: An iterable of email addresses which need to be enrolled
+
+    Returns:
+        successes: A list of users who were successfully enrolled in all courses of the program
+        pending: A list of PendingEnterpriseCustomerUsers who were successfully linked and had
+            pending enrollments created for them in the database
+        failures: A list of users who could not be enrolled in the program
+    """
+    existing_users, unregistered_emails = get_users_by_email(emails)
+    course_ids = get_course_runs_from_program(program_details)
+
+    successes, failures = enroll_users(enterprise_customer, existing_users, course_mode, *course_ids)
+    pending = enroll_users_pending_registration(enterprise_customer, unregistered_emails, course_mode, *course_ids)
+    return successes, pending, failures
+
+
+def enroll_users_in_course(enterprise_customer, course_id, course_mode, emails):
+    """
+    Enroll existing users in a course, and create a pending enrollment for nonexisting users.
+
+    Args:
+        enterprise_customer: The EnterpriseCustomer which is sponsoring the enrollment
+        course_id (str): The unique identifier of the course in which we're enrolling
+        course_mode (str): The mode with which we're enrolling in the course
+        emails: An iterable of email addresses which need to be enrolled
+
+    Returns:
+        successes: A list of users who were successfully enrolled in the course
+        pending: A list of PendingEnterpriseCustomerUsers who were successfully linked and had
+            pending enrollments created for them in the database
+        failures: A list of users who could not be enrolled in the course
+    """
+    existing_users, unregistered_emails = get_users_by_email(emails)
+
+    successes, failures = enroll_users(enterprise_customer, existing_users, course_mode, course_id)
+    pending = enroll_users_pending_registration(enterprise_customer, unregistered_emails, course_mode, course_id)
+    return successes, pending, failures
+
+
+def get_program_notification_details(program_details):
+    """
+    Get the details of a program to notify learners with.
+
+    Args:
+        program_details: Details about the specific program the learners were enrolled in
+
+    Returns:
+        dict: The program details used by the notification email.
+    """
+    return {
+        'name': program_details.get('title'),
+        'url': program_details.get('marketing_url'),
+        'type': 'program',
+        'start': get_earliest_start_date_from_program(program_details),
+        'branding': program_details.get('type'),
+    }
+
+
+def send_enrollment_notifications(enterprise_customer, enrolled_in, users):
+    """
+    Notify learners about a course or program in which they've been enrolled.
+
+    Args:
+        enterprise_customer: The EnterpriseCustomer being linked to
+        enrolled_in: Details about the course or program the learners were enrolled in
+        users: An iterable of the users or pending users who were enrolled
+
+    Returns:
+        list: The users or pending users who could not be notified.
+    """
+    __, failed = send_email_notification_messages(users, enrolled_in, enterprise_customer)
+    return failed
+
+
+def get_user_email(user):
+    """
+    Return the email of a user, or of a pending user.
+    """
+    # Users have an `email` attribute; PendingEnterpriseCustomerUsers have `user_email`.
+    return user.email if hasattr(user, 'email') else user.user_email
+
+
+def process_enrollment_job_chunk(job, emails):
+    """
+    Enroll users as part of an enrollment job, and notify them if the job asks to.
+
+    Args:
+        job: The EnrollmentJob the users are enrolled by
+        emails: An iterable of strings containing email addresses to enroll
+
+    Returns:
+        dict: The emails of the users ``succeeded``, ``pending`` and ``failed``, and of the users who were enrolled
+        but could not be notified (``notification_failed``).
+    """
+    if job.course_id:
+        succeeded, pending, failed = enroll_users_in_course(
+            enterprise_customer=job.enterprise_customer,
+            course_id=job.course_id,
+            course_mode=job.course_mode,
+            emails=emails,
+        )
+    else:
+        succeeded, pending, failed = enroll_users_in_program(
+            enterprise_customer=job.enterprise_customer,
+            program_details=job.get_program_details(),
+            course_mode=job.course_mode,
+            emails=emails,
+        )
+    enrolled_in = job.get_notification()
+    notification_failed = []
+    if enrolled_in is not None:
+        notification_failed = send_enrollment_notifications(job.enterprise_customer, enrolled_in, succeeded + pending)
+    return {
+        'succeeded': [user.email for user in succeeded],
+        'pending': [pending_user.user_email for pending_user in pending],
+        'failed': [user.email for user in failed],
+        'notification_failed': [get_user_email(user) for user in notification_failed],
+    }
@@ -5,14 +5,22 @@ Utilities to get details from the course catalog API.
 from __future__ import absolute_import, unicode_literals
 
 import datetime
+import json
+import threading
+import time
+from logging import getLogger
 
 import requests
+from concurrent.futures import ThreadPoolExecutor, wait
 from edx_rest_api_client.client import EdxRestApiClient
+from edx_rest_api_client.exceptions import HttpClientError, HttpServerError
+from six.moves.urllib.parse import urlparse  # pylint: disable=import-error
 from slumber.exceptions import HttpNotFoundError
 
 from django.conf import settings
 
-from enterprise.utils import NotConnectedToEdX
+from enterprise.cache import get_response_cache, make_cache_key
+from enterprise.utils import NotConnectedToEdX, chunks
 
 try:
     from opaque_keys.edx.keys import CourseKey
@@ -24,21 +32,150 @@ try:
 except ImportError:
     CourseEnrollment = None
 
+logger = getLogger(__name__)  # pylint: disable=invalid-name
 
 LMS_API_DATETIME_FORMAT = '%Y-%m-%dT%H:%M:%SZ'
 
+# Number of usernames sent to the Third Party Auth API in a single remote ID lookup
+REMOTE_ID_BATCH_SIZE = 100
+
+
+# Default options of the connection pools shared by the LMS API clients
+DEFAULT_POOL_CONNECTIONS = 10  # Number of hosts for which connections are kept
+DEFAULT_POOL_MAXSIZE = 10  # Number of connections kept per host
+
+# Name of the response cache holding the course names resolved by get_course_names
+COURSE_NAMES_CACHE_NAME = 'course_api.names'
+# Number of seconds get_course_names waits for the Course API before giving up on the missing names
+DEFAULT_COURSE_NAMES_TIMEOUT = 2
+# Maximum number of Course API requests made concurrently by get_course_names
+DEFAULT_COURSE_NAMES_MAX_WORKERS = 8
+
+# Default options of the concurrent enrollments made by EnrollmentExecutor
+DEFAULT_ENROLLMENT_MAX_WORKERS = 8  # Maximum number of Enrollment API requests made concurrently
+DEFAULT_ENROLLMENT_MAX_RETRIES = 3  # Number of times an enrollment is retried after a server error
+DEFAULT_ENROLLMENT_RETRY_BACKOFF = 0.5  # Number of seconds before the first retry, doubled on each retry
+DEFAULT_ENROLLMENT_RATE_LIMIT = 0  # Maximum number of requests per second made to a host, 0 for no limit
+
+_SESSION_REGISTRY = None
+_SESSION_REGISTRY_LOCK = threading.Lock()
+
+# Rate limiters shared by all the enrollment executors of the process, keyed by rate
+_RATE_LIMITERS = {}
+_RATE_LIMITERS_LOCK = threading.Lock()
+
+
+class LmsSessionRegistry(object):
+    """
+    Registry of the HTTP sessions used by the LMS API clients.
+
+    Each thread gets its own ``requests.Session``, as sessions are not thread-safe, but all of them share one
+    pool of connections, so TCP connections and TLS handshakes are reused across clients and threads.
+    """
+
+    def __init__(self, pool_connections=DEFAULT_POOL_CONNECTIONS, pool_maxsize=DEFAULT_POOL_MAXSIZE,
+                 pool_block=False, keep_alive=True):
+        """
+        Create the shared connection pool.
+
+        Arguments:
+            pool_connections (int): Number of hosts for which connections are kept.
+            pool_maxsize (int): Maximum number of connections kept for each host.
+            pool_block (bool): Whether to wait for a connection to a host to be free, instead of opening
+                one that won't be kept, once ``pool_maxsize`` connections are in use.
+            keep_alive (bool): Whether to keep connections open between requests.
+        """
+        self.keep_alive = keep_alive
+        self.adapter = requests.adapters.HTTPAdapter(
+            pool_connections=pool_connections, pool_maxsize=pool_maxsize, pool_block=pool_block,
+        )
+        self._local = threading.local()
+
+    def get_session(self):
+        """
+        Return the session of the current thread, creating it on first use.
+        """
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            session = requests.Session()
+            session.mount('http://', self.adapter)
+            session.mount('https://', self.adapter)
+            if not self.keep_alive:
+                session.headers['Connection'] = 'close'
+            self._local.session = session
+        return session
+
+    def get_stats(self):
+        """
+        Return connection reuse statistics of the hosts currently in the pool.
+
+        Returns:
+            dict: Number of ``requests`` made, of ``connections`` opened to make them, and of requests which
+            ``reused`` an open connection.
+        """
+        pools = self.adapter.poolmanager.pools
+        requests_count = connections_count = 0
+        for key in pools.keys():
+            pool = pools.get(key)
+            if pool is not None:
+                requests_count += pool.num_requests
+                connections_count += pool.num_connections
+        return {
+            'requests': requests_count,
+            'connections': connections_count,
+            'reused': max(requests_count - connections_count, 0),
+        }
+
+    def close(self):
+        """
+        Close all the pooled connections.
+        """
+        self.adapter.close()
+
+
+def get_session_registry():
+    """
+    Return the process-wide session registry, creating it from the Django settings on first use.
+
+    The pool is configured with ``ENTERPRISE_LMS_API_POOL_CONNECTIONS``, ``ENTERPRISE_LMS_API_POOL_MAXSIZE``,
+    ``ENTERPRISE_LMS_API_POOL_BLOCK`` and ``ENTERPRISE_LMS_API_KEEP_ALIVE``.
+    """
+    global _SESSION_REGISTRY  # pylint: disable=global-statement
+    with _SESSION_REGISTRY_LOCK:
+        if _SESSION_REGISTRY is None:
+            _SESSION_REGISTRY = LmsSessionRegistry(
+                pool_connections=getattr(settings, 'ENTERPRISE_LMS_API_POOL_CONNECTIONS', DEFAULT_POOL_CONNECTIONS),
+                pool_maxsize=getattr(settings, 'ENTERPRISE_LMS_API_POOL_MAXSIZE', DEFAULT_POOL_MAXSIZE),
+                pool_block=getattr(settings, 'ENTERPRISE_LMS_API_POOL_BLOCK', False),
+                keep_alive=getattr(settings, 'ENTERPRISE_LMS_API_KEEP_ALIVE', True),
+            )
+        return _SESSION_REGISTRY
+
+
+def reset_session_registry():
+    """
+    Close the pooled connections, so the registry is rebuilt from the current settings on next use.
+    """
+    global _SESSION_REGISTRY  # pylint: disable=global-statement
+    with _SESSION_REGISTRY_LOCK:
+        if _SESSION_REGISTRY is not None:
+            _SESSION_REGISTRY.close()
+        _SESSION_REGISTRY = None
+
 
 class LmsApiClient(object):
     """
     Object builds an API client to make calls to the edxapp LMS API.
+
+    All the clients of a thread share one session, which pools connections with the other threads.
     """
 
     def __init__(self, url, append_slash=False):
         """
         Create an LMS API client, authenticated with the API token from Django settings.
         """
-        session = requests.Session()
-        session.headers = {"X-Edx-Api-Key": settings.EDX_API_KEY}
+        session = get_session_registry().get_session()
+        session.headers["X-Edx-Api-Key"] = settings.EDX_API_KEY
         self.client = EdxRestApiClient(
             url, append_slash=append_slash, session=session
         )
@@ -157,19 +294,269 @@ class ThirdPartyAuthApiClient(LmsApiClient):
                 return row.get('remote_id')
         return None
 
+    def get_remote_ids(self, identity_provider, usernames, batch_size=REMOTE_ID_BATCH_SIZE):
+        """
+        Retrieve the remote identifiers for many usernames at once.
+
+        Usernames are sent to the provider's user mapping endpoint ``batch_size`` at a time, and every page of
+        results is traversed, so the number of API calls grows with the number of batches rather than with
+        the number of users.
+
+        Args:
+        * ``identity_provider`` (str): identifier slug for the third-party authentication service used during SSO.
+        * ``usernames`` (iterable): The usernames for which to retrieve the remote names.
+        * ``batch_size`` (int): The number of usernames to look up with each API call.
+
+        Returns:
+            dict: the remote name of each user, keyed by username.  Users which are not found are omitted.
+        """
+        remote_ids = {}
+        users_endpoint = self.client.providers(identity_provider).users
+        for usernames_batch in chunks(usernames, batch_size):
+            page = 1
+            while page:
+                try:
+                    returned = users_endpoint.get(username=usernames_batch, page=page, page_size=batch_size)
+                except HttpNotFoundError:
+                    break
+
+                for row in returned.get('results', []):
+                    if row.get('username') in usernames_batch:
+                        remote_ids.setdefault(row['username'], row.get('remote_id'))
+
+                page = page + 1 if returned.get('next') else None
+        return remote_ids
+
+
+def get_course_names(course_ids, timeout=None):
+    """
+    Return the names of the given courses, fetching the ones that aren't cached concurrently from the Course API.
+
+    Names are cached in the ``course_api.names`` response cache. The missing names are fetched by at most
+    ``ENTERPRISE_COURSE_NAMES_MAX_WORKERS`` threads, and only for ``timeout`` seconds: names that aren't
+    fetched by then are left out of the result, and cached once they arrive, so they are available next time.
+
+    Args:
+        course_ids (iterable): The course IDs identifying the courses.
+        timeout (float): Number of seconds to wait for the Course API; ``ENTERPRISE_COURSE_NAMES_TIMEOUT``
+            by default.
+
+    Returns:
+        dict: The name of each course, keyed by course ID.  Courses whose names could not be fetched in time
+        are omitted.
+    """
+    if timeout is None:
+        timeout = getattr(settings, 'ENTERPRISE_COURSE_NAMES_TIMEOUT', DEFAULT_COURSE_NAMES_TIMEOUT)
+    cache = get_response_cache(COURSE_NAMES_CACHE_NAME)
+
+    course_names = {}
+    missing_course_ids = []
+    for course_id in course_ids:
+        if course_id in course_names or course_id in missing_course_ids:
+            continue
+        name = cache.get(make_cache_key(COURSE_NAMES_CACHE_NAME, course_id))
+        if name is None:
+            missing_course_ids.append(course_id)
+        else:
+            course_names[course_id] = name
+    if not missing_course_ids:
+        return course_names
+
+    max_workers = getattr(settings, 'ENTERPRISE_COURSE_NAMES_MAX_WORKERS', DEFAULT_COURSE_NAMES_MAX_WORKERS)
+    executor = ThreadPoolExecutor(max_workers=min(max_workers, len(missing_course_ids)))
+    futures = {executor.submit(_fetch_course_name, course_id): course_id for course_id in missing_course_ids}
+    done, not_done = wait(futures, timeout=timeout)
+    for future in not_done:
+        future.cancel()
+    executor.shutdown(wait=False)
+
+    for future in done:
+        name = future.result()
+        if name:
+            course_names[futures[future]] = name
+    return course_names
+
+
+def _fetch_course_name(course_id):
+    """
+    Fetch the name of the course from the Course API, and cache it.
+
+    Returns:
+        str or None: The name of the course.  None if it could not be fetched.
+    """
+    try:
+        # Clients are cheap to build, and each thread must use its own session.
+        name = CourseApiClient().get_course_details(course_id).get('name')
+    except (HttpClientError, HttpServerError, requests.RequestException) as exc:
+        logger.warning('Could not fetch the name of course %s: %s', course_id, exc)
+        return None
+    if name:
+        get_response_cache(COURSE_NAMES_CACHE_NAME).set(make_cache_key(COURSE_NAMES_CACHE_NAME, course_id), name)
+    return name
+
+
+class HostRateLimiter(object):
+    """
+    Spaces out the requests made to each host, so that at most ``rate`` requests per second are made to any host.
+    """
+
+    def __init__(self, rate):
+        """
+        Create a rate limiter.
+
+        Arguments:
+            rate (float): Maximum number of requests per second made to a host; 0 or None for no limit.
+        """
+        self.interval = 1.0 / rate if rate else 0
+        self._next_request_times = {}
+        self._lock = threading.Lock()
+
+    def wait(self, url):
+        """
+        Block until a request can be made to the host of the URL, and reserve the slot for it.
+        """
+        if not self.interval:
+            return
+        host = urlparse(url).netloc
+        with self._lock:
+            now = time.time()
+            request_time = max(now, self._next_request_times.get(host, now))
+            self._next_request_times[host] = request_time + self.interval
+        if request_time > now:
+            time.sleep(request_time - now)
+
+
+def get_host_rate_limiter(rate):
+    """
+    Return the rate limiter of the process for the given rate, creating it on first use.
+
+    The limiter is shared by all the callers using the same rate, so that concurrent callers together make at most
+    ``rate`` requests per second to any host.
+
+    Arguments:
+        rate (float): Maximum number of requests per second made to a host; 0 or None for no limit.
+
+    Returns:
+        HostRateLimiter: The shared rate limiter.
+    """
+    rate = rate or 0
+    with _RATE_LIMITERS_LOCK:
+        if rate not in _RATE_LIMITERS:
+            _RATE_LIMITERS[rate] = HostRateLimiter(rate)
+        return _RATE_LIMITERS[rate]
+
+
+class EnrollmentExecutor(object):
+    """
+    Enrolls users in courses through the Enrollment API, making several requests concurrently.
+
+    Enrollments failing with a server error, or because the Enrollment API could not be reached, are retried with an
+    exponential backoff; enrollments failing with a client error are not. Requests to each host are rate limited,
+    across all the executors of the process.
+    """
+
+    def __init__(self, max_workers=None, max_retries=None, retry_backoff=None, rate_limit=None, client_class=None):
+        """
+        Create an enrollment executor, configured with the Django settings by default.
+
+        Arguments:
+            max_workers (int): Maximum number of concurrent requests; ``ENTERPRISE_ENROLLMENT_API_MAX_WORKERS``.
+            max_retries (int): Number of retries after a server error; ``ENTERPRISE_ENROLLMENT_API_MAX_RETRIES``.
+            retry_backoff (float): Number of seconds before the first retry, doubled on each retry;
+                ``ENTERPRISE_ENROLLMENT_API_RETRY_BACKOFF``.
+            rate_limit (float): Maximum number of requests per second made to a host, 0 for no limit;
+                ``ENTERPRISE_ENROLLMENT_API_RATE_LIMIT``.
+            client_class (type): Class of the clients making the requests; :class:`EnrollmentApiClient`.
+        """
+        if max_workers is None:
+            max_workers = getattr(settings, 'ENTERPRISE_ENROLLMENT_API_MAX_WORKERS', DEFAULT_ENROLLMENT_MAX_WORKERS)
+        if max_retries is None:
+            max_retries = getattr(settings, 'ENTERPRISE_ENROLLMENT_API_MAX_RETRIES', DEFAULT_ENROLLMENT_MAX_RETRIES)
+        if retry_backoff is None:
+            retry_backoff = getattr(
+                settings, 'ENTERPRISE_ENROLLMENT_API_RETRY_BACKOFF', DEFAULT_ENROLLMENT_RETRY_BACKOFF
+            )
+        if rate_limit is None:
+            rate_limit = getattr(settings, 'ENTERPRISE_ENROLLMENT_API_RATE_LIMIT', DEFAULT_ENROLLMENT_RATE_LIMIT)
+        self.max_workers = max_workers
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.rate_limiter = get_host_rate_limiter(rate_limit)
+        self.client_class = client_class or EnrollmentApiClient
+
+    def enroll(self, enrollments):
+        """
+        Enroll users in courses.
+
+        Arguments:
+            enrollments (iterable): 3-tuples of the username, course ID and mode of each enrollment.
+
+        Returns:
+            tuple: The ``(username, course_id)`` pairs which were enrolled, as a set, and the error message of those
+            which could not be enrolled, as a dict keyed by the same pairs.
+        """
+        enrollments = list(enrollments)
+        if self.max_workers > 1 and len(enrollments) > 1:
+            with ThreadPoolExecutor(max_workers=min(self.max_workers, len(enrollments))) as executor:
+                errors = list(executor.map(lambda enrollment: self._enroll(*enrollment), enrollments))
+        else:
+            errors = [self._enroll(*enrollment) for enrollment in enrollments]
+
+        succeeded = set()
+        failed = {}
+        for (username, course_id, __), error in zip(enrollments, errors):
+            if error is None:
+                succeeded.add((username, course_id))
+            else:
+                failed[(username, course_id)] = error
+        return succeeded, failed
+
+    def _enroll(self, username, course_id, mode):
+        """
+        Enroll the user in the course, retrying after server and connection errors.
+
+        Returns:
+            str or None: The error message, if the user could not be enrolled.
+        """
+        # Clients are cheap to build, and each thread must use its own session.
+        client = self.client_class()
+        retries = 0
+        while True:
+            self.rate_limiter.wait(settings.ENTERPRISE_ENROLLMENT_API_URL)
+            try:
+                client.enroll_user_in_course(username, course_id, mode)
+            except (HttpServerError, requests.exceptions.RequestException) as exc:
+                if retries >= self.max_retries:
+                    return _get_error_message(exc)
+                time.sleep(self.retry_backoff * 2 ** retries)
+                retries += 1
+            except HttpClientError as exc:
+                return _get_error_message(exc)
+            else:
+                return None
+
+
+def _get_error_message(exc):
+    """
+    Return the message of the error response of the LMS API, or a default message if it has none.
+    """
+    default_message = 'No error message provided'
+    if isinstance(exc, requests.exceptions.RequestException):
+        return 'Unable to reach the Enrollment API: {}'.format(exc)
+    try:
+        return json.loads(exc.content.decode()).get('message', default_message)
+    except (AttributeError, ValueError):
+        return default_message
+
 
 def enroll_user_in_course_locally(user, course_id, mode):
     """
     Enroll a user in a course, using local database methods.
 
-    This is only used in one place; in models.py. It is necessary
-    because the enrollment API can't enroll a user before it exists, and
-    the post_save signal for users results in a user not actually being
-    saved until after the API call is made.
-
-    In Django 1.9 and later, there's a transaction.on_commit hook that we can
-    use to create a callback. Once we're able to depend on having Django 1.9, we
-    can shift over to that, but for right now, we have to do it this way.
+    This is used to complete the pending enrollments of newly registered learners, see
+    :func:`enterprise.tasks.complete_pending_enrollments`. Those are completed once the user is committed, through
+    ``transaction.on_commit``, or right away, in the registration's transaction, on Django 1.8, which has no such hook:
+    the Enrollment API couldn't see the new user then, while local database methods can.
     """
     if CourseKey is None and CourseEnrollment is None:
         raise NotConnectedToEdX("This package must be installed in an OpenEdX environment.")
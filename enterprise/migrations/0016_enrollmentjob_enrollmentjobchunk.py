@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.9.12 on 2026-10-18 15:47
+from __future__ import unicode_literals
+
+import uuid
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+import model_utils.fields
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('enterprise', '0015_auto_20170130_0003'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EnrollmentJob',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created', model_utils.fields.AutoCreatedField(default=django.utils.timezone.now, editable=False, verbose_name='created')),
+                ('modified', model_utils.fields.AutoLastModifiedField(default=django.utils.timezone.now, editable=False, verbose_name='modified')),
+                ('uuid', models.UUIDField(default=uuid.uuid4, editable=False, unique=True)),
+                ('course_id', models.CharField(blank=True, max_length=255)),
+                ('program_details', models.TextField(blank=True, help_text='Program data from the Course Catalog API, in JSON format, if enrolling in a program.')),
+                ('course_mode', models.CharField(max_length=25)),
+                ('notification', models.TextField(blank=True, help_text='Details of the course or program for the enrollment notification email, in JSON format. Empty if learners are not notified.')),
+                ('enterprise_customer', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='enrollment_jobs', to='enterprise.EnterpriseCustomer')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='EnrollmentJobChunk',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('emails', models.TextField(help_text='Emails of the learners to enroll, in JSON format.')),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('running', 'Running'), ('completed', 'Completed'), ('failed', 'Failed')], default='pending', max_length=10)),
+                ('results', models.TextField(blank=True, help_text='Emails of the learners succeeded, pending and failed, in JSON format.')),
+                ('started', models.DateTimeField(blank=True, help_text='When the chunk started to be processed.', null=True)),
+                ('job', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='chunks', to='enterprise.EnrollmentJob')),
+            ],
+            options={
+                'ordering': ('id',),
+            },
+        ),
+    ]
@@ -0,0 +1,23 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.9.12 on 2026-10-18 16:11
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('enterprise', '0016_enrollmentjob_enrollmentjobchunk'),
+    ]
+
+    operations = [
+        migrations.AlterIndexTogether(
+            name='enterprisecourseenrollment',
+            index_together=set([('created', 'id')]),
+        ),
+        migrations.AlterIndexTogether(
+            name='userdatasharingconsentaudit',
+            index_together=set([('created', 'id')]),
+        ),
+    ]
@@ -4,28 +4,37 @@ Database models for enterprise.
 """
 from __future__ import absolute_import, unicode_literals
 
+import json
 import os
+import threading
+from datetime import timedelta
 from logging import getLogger
 from uuid import uuid4
 
 import six
 from simple_history.models import HistoricalRecords
 
+from django.apps import apps
+from django.conf import settings
 from django.contrib.auth.models import User
 from django.contrib.sites.models import Site
+from django.core.cache import cache
 from django.core.exceptions import ObjectDoesNotExist
 from django.core.files.storage import default_storage
-from django.db import models
+from django.db import IntegrityError, models, transaction
 from django.template import Context, Template
 from django.utils.encoding import python_2_unicode_compatible
 from django.utils.functional import lazy
 from django.utils.safestring import mark_safe
+from django.utils.timezone import now
 from django.utils.translation import ugettext_lazy as _
 
 from model_utils.models import TimeStampedModel
 
 from enterprise import utils
-from enterprise.lms_api import ThirdPartyAuthApiClient, enroll_user_in_course_locally
+from enterprise.cache import get_local_cache, make_cache_key
+from enterprise.lms_api import (LMS_API_DATETIME_FORMAT, ThirdPartyAuthApiClient, enroll_user_in_course_locally,
+                                parse_lms_api_datetime)
 from enterprise.validators import validate_image_extension, validate_image_size
 
 logger = getLogger(__name__)  # pylint: disable=invalid-name
@@ -160,6 +169,45 @@ class EnterpriseCustomer(TimeStampedModel):
         return self.enable_data_sharing_consent
 
 
+# Number of values used in a single IN query, or rows inserted by a single query, when linking or enrolling
+# learners in bulk
+LINK_QUERY_BATCH_SIZE = 500
+
+
+def _match_emails(user_emails, values_by_email):
+    """
+    Key the values looked up by email with the emails as given, comparing emails case-insensitively.
+
+    Databases with a case-insensitive collation, such as MySQL, match emails whatever their case; the values found
+    are keyed by the emails as they are stored, which may not be spelled like the emails looked up.
+
+    Arguments:
+        user_emails (iterable): The emails looked up.
+        values_by_email (dict): The values found, keyed by the emails as they are stored.
+
+    Returns:
+        dict: The values found, keyed by the emails looked up.
+    """
+    values_by_lowercase_email = {email.lower(): value for email, value in values_by_email.items()}
+    matched_values = {}
+    for email in user_emails:
+        # Exact matches win over matches differing only in case.
+        value = values_by_email.get(email, values_by_lowercase_email.get(email.lower()))
+        if value is not None:
+            matched_values[email] = value
+    return matched_values
+
+
+def _unique_emails(user_emails):
+    """
+    Return the emails, leaving out those differing from another one only in case.
+    """
+    unique_emails = {}
+    for email in sorted(user_emails):
+        unique_emails.setdefault(email.lower(), email)
+    return set(unique_emails.values())
+
+
 class EnterpriseCustomerUserManager(models.Manager):
     """
     Model manager for :class:`.EnterpriseCustomerUser` entity.
@@ -187,6 +235,65 @@ class EnterpriseCustomerUserManager(models.Manager):
 
         return None
 
+    def get_links_by_emails(self, user_emails):
+        """
+        Return the links of many emails at once.
+
+        This is the bulk counterpart of :meth:`get_link_by_email`; emails are looked up with a few ``IN`` queries
+        against ``User``, :class:`.EnterpriseCustomerUser` and :class:`.PendingEnterpriseCustomerUser`.
+
+        Returns:
+            dict: :class:`.EnterpriseCustomerUser` or :class:`.PendingEnterpriseCustomerUser` instances keyed by
+            email.  Emails which are not linked to any Enterprise Customer are omitted.
+        """
+        user_emails = set(user_emails)
+        user_ids = self._get_user_ids_by_email(user_emails)
+
+        links_by_user_id = {}
+        for user_ids_batch in utils.chunks(user_ids.values(), LINK_QUERY_BATCH_SIZE):
+            links = self.filter(user_id__in=user_ids_batch).select_related('enterprise_customer').order_by('pk')
+            for link in links:
+                links_by_user_id.setdefault(link.user_id, link)
+        links_by_email = {
+            email: links_by_user_id[user_id] for email, user_id in user_ids.items() if user_id in links_by_user_id
+        }
+
+        unlinked_emails = user_emails - set(links_by_email)
+        pending_links_by_email = {}
+        for user_emails_batch in utils.chunks(unlinked_emails, LINK_QUERY_BATCH_SIZE):
+            pending_links = PendingEnterpriseCustomerUser.objects.filter(
+                user_email__in=user_emails_batch
+            ).select_related('enterprise_customer')
+            for pending_link in pending_links:
+                pending_links_by_email[pending_link.user_email] = pending_link
+        links_by_email.update(_match_emails(unlinked_emails, pending_links_by_email))
+
+        return links_by_email
+
+    def get_links_by_usernames(self, usernames, batch_size=LINK_QUERY_BATCH_SIZE):
+        """
+        Return the links of many usernames at once.
+
+        Users and links are looked up with one ``IN`` query each per ``batch_size`` usernames, and the users are
+        attached to their links.
+
+        Returns:
+            dict: :class:`.EnterpriseCustomerUser` instances keyed by username, or None for users who aren't linked
+            to any Enterprise Customer. Usernames which don't match any user are omitted.
+        """
+        links_by_username = {}
+        for usernames_batch in utils.chunks(set(usernames), batch_size):
+            users = {user.pk: user for user in User.objects.filter(username__in=usernames_batch)}
+            links_by_user_id = {}
+            for link in self.filter(user_id__in=users).select_related('enterprise_customer').order_by('pk'):
+                links_by_user_id.setdefault(link.user_id, link)
+            for user_id, user in users.items():
+                link = links_by_user_id.get(user_id)
+                if link is not None:
+                    link.cache_user(user)
+                links_by_username[user.username] = link
+        return links_by_username
+
     def link_user(self, enterprise_customer, user_email):
         """
         Link user email to Enterprise Customer.
@@ -200,6 +307,157 @@ class EnterpriseCustomerUserManager(models.Manager):
         except User.DoesNotExist:
             PendingEnterpriseCustomerUser.objects.create(enterprise_customer=enterprise_customer, user_email=user_email)
 
+    def link_users(self, enterprise_customer, user_emails):
+        """
+        Link many user emails to Enterprise Customer at once.
+
+        This is the bulk counterpart of :meth:`link_user`; users are looked up with a few ``IN`` queries, and
+        the links are inserted with ``bulk_create``. The emails must not be linked to any Enterprise Customer yet.
+        """
+        user_emails = set(user_emails)
+        user_ids = self._get_user_ids_by_email(user_emails)
+        with transaction.atomic():
+            self.bulk_create(
+                [EnterpriseCustomerUser(enterprise_customer=enterprise_customer, user_id=user_id)
+                 for user_id in set(user_ids.values())],
+                batch_size=LINK_QUERY_BATCH_SIZE,
+            )
+            # bulk_create doesn't send post_save signals.
+            utils.forget_enterprise_context(*set(user_ids.values()))
+            PendingEnterpriseCustomerUser.objects.bulk_create(
+                [PendingEnterpriseCustomerUser(enterprise_customer=enterprise_customer, user_email=user_email)
+                 for user_email in _unique_emails(user_emails - set(user_ids))],
+                batch_size=LINK_QUERY_BATCH_SIZE,
+            )
+            # bulk_create doesn't send post_save signals.
+            pending_email_index.invalidate()
+
+    def attach_users(self, enterprise_customer_users):
+        """
+        Look the users of many links up at once, and attach them to the links.
+
+        ``user_id`` is not a foreign key, so ``select_related`` can't join the users into the links query; this
+        fetches them with a single ``User`` query per :data:`LINK_QUERY_BATCH_SIZE` links instead, so reading
+        :attr:`EnterpriseCustomerUser.user` doesn't query the database for each link.
+
+        Arguments:
+            enterprise_customer_users (iterable): :class:`.EnterpriseCustomerUser` instances or queryset.
+
+        Returns:
+            list: The :class:`.EnterpriseCustomerUser` instances, with their users attached.
+        """
+        enterprise_customer_users = list(enterprise_customer_users)
+        users = {}
+        user_ids = {enterprise_customer_user.user_id for enterprise_customer_user in enterprise_customer_users}
+        for user_ids_batch in utils.chunks(user_ids, LINK_QUERY_BATCH_SIZE):
+            users.update((user.pk, user) for user in User.objects.filter(pk__in=user_ids_batch))
+        for enterprise_customer_user in enterprise_customer_users:
+            enterprise_customer_user.cache_user(users.get(enterprise_customer_user.user_id))
+        return enterprise_customer_users
+
+    def get_or_create_links(self, enterprise_customer, user_ids):
+        """
+        Return the links of many users to Enterprise Customer, creating the missing ones in bulk.
+
+        Returns:
+            dict: IDs of the :class:`.EnterpriseCustomerUser` instances keyed by ``user_id``.
+        """
+        user_ids = set(user_ids)
+        link_ids = self._get_link_ids(enterprise_customer, user_ids)
+        missing_user_ids = user_ids - set(link_ids)
+        if missing_user_ids:
+            self.bulk_create(
+                [EnterpriseCustomerUser(enterprise_customer=enterprise_customer, user_id=user_id)
+                 for user_id in missing_user_ids],
+                batch_size=LINK_QUERY_BATCH_SIZE,
+            )
+            # bulk_create doesn't send post_save signals.
+            utils.forget_enterprise_context(*missing_user_ids)
+            # bulk_create doesn't set the primary keys of the rows it inserts on every database backend.
+            link_ids.update(self._get_link_ids(enterprise_customer, missing_user_ids))
+        return link_ids
+
+    def get_or_create_pending_links(self, enterprise_customer, user_emails):
+        """
+        Return the pending links of many emails to Enterprise Customer, creating the missing ones in bulk.
+
+        Returns:
+            dict: :class:`.PendingEnterpriseCustomerUser` instances keyed by email.
+        """
+        user_emails = set(user_emails)
+        pending_links = self._get_pending_links(enterprise_customer, user_emails)
+        missing_user_emails = user_emails - set(pending_links)
+        if missing_user_emails:
+            PendingEnterpriseCustomerUser.objects.bulk_create(
+                [PendingEnterpriseCustomerUser(enterprise_customer=enterprise_customer, user_email=user_email)
+                 for user_email in _unique_emails(missing_user_emails)],
+                batch_size=LINK_QUERY_BATCH_SIZE,
+            )
+            # bulk_create doesn't send post_save signals.
+            pending_email_index.invalidate()
+            pending_links.update(self._get_pending_links(enterprise_customer, missing_user_emails))
+        return pending_links
+
+    def _get_link_ids(self, enterprise_customer, user_ids):
+        """
+        Return the IDs of the links of the users to Enterprise Customer, keyed by ``user_id``.
+        """
+        link_ids = {}
+        for user_ids_batch in utils.chunks(user_ids, LINK_QUERY_BATCH_SIZE):
+            link_ids.update(
+                self.filter(enterprise_customer=enterprise_customer, user_id__in=user_ids_batch).values_list(
+                    'user_id', 'id'
+                )
+            )
+        return link_ids
+
+    @staticmethod
+    def _get_pending_links(enterprise_customer, user_emails):
+        """
+        Return the pending links of the emails to Enterprise Customer, keyed by email as given.
+        """
+        pending_links = {}
+        for user_emails_batch in utils.chunks(user_emails, LINK_QUERY_BATCH_SIZE):
+            for pending_link in PendingEnterpriseCustomerUser.objects.filter(
+                    enterprise_customer=enterprise_customer, user_email__in=user_emails_batch
+            ):
+                pending_links[pending_link.user_email] = pending_link
+        return _match_emails(user_emails, pending_links)
+
+    @staticmethod
+    def _get_user_ids_by_email(user_emails):
+        """
+        Return the IDs of the users with the given emails, keyed by email as given.
+
+        If several users share an email, the one created first is used.
+        """
+        user_ids = {}
+        for user_emails_batch in utils.chunks(user_emails, LINK_QUERY_BATCH_SIZE):
+            users = User.objects.filter(email__in=user_emails_batch).order_by('-pk').values_list('email', 'id')
+            user_ids.update(users)
+        return _match_emails(user_emails, user_ids)
+
+    def get_remote_ids(self, enterprise_customer):
+        """
+        Retrieve the SSO provider's identifiers for all the learners linked to the Enterprise Customer.
+
+        This is the bulk counterpart of :meth:`EnterpriseCustomerUser.get_remote_id`; it looks the learners up with
+        a single ``User`` query and a few paged LMS Third Party API calls.
+
+        Returns:
+            dict: remote identifiers keyed by ``user_id``. Learners whose remote identity is not found are
+            omitted, and the dict is empty if the Enterprise Customer has no identity_provider.
+        """
+        identity_provider = enterprise_customer.identity_provider
+        if not identity_provider:
+            return {}
+
+        user_ids = self.filter(enterprise_customer=enterprise_customer).values_list('user_id', flat=True)
+        # The linked user IDs are selected by a subquery, rather than sent back as query parameters.
+        usernames = dict(User.objects.filter(pk__in=user_ids).values_list('username', 'id'))
+        remote_ids = ThirdPartyAuthApiClient().get_remote_ids(identity_provider, list(usernames))
+        return {usernames[username]: remote_id for username, remote_id in remote_ids.items()}
+
     def unlink_user(self, enterprise_customer, user_email):
         """
         Unlink user email from Enterprise Customer.
@@ -244,6 +502,9 @@ class EnterpriseCustomerUser(TimeStampedModel):
 
     objects = EnterpriseCustomerUserManager()
 
+    # Attribute holding the consent records attached by EnterpriseCourseEnrollmentQuerySet.with_consent
+    PREFETCHED_CONSENT_ATTRIBUTE = 'prefetched_data_sharing_consent'
+
     class Meta(object):
         app_label = 'enterprise'
         verbose_name = _("Enterprise Customer User")
@@ -257,11 +518,39 @@ class EnterpriseCustomerUser(TimeStampedModel):
 
         Return :class:`django.contrib.auth.models.User` instance associated with this
         :class:`EnterpriseCustomerUser` instance via email.
+
+        The user is looked up once, and memoized on the instance until ``user_id`` changes.
         """
-        try:
-            return User.objects.get(pk=self.user_id)
-        except User.DoesNotExist:
-            return None
+        cached_user = getattr(self, '_cached_user', None)
+        if cached_user is None or cached_user[0] != self.user_id:
+            try:
+                user = User.objects.get(pk=self.user_id)
+            except User.DoesNotExist:
+                user = None
+            self.cache_user(user)
+        return self._cached_user[1]
+
+    def cache_user(self, user):
+        """
+        Attach the User associated with this instance, so :attr:`user` doesn't look it up.
+
+        Arguments:
+            user: The :class:`django.contrib.auth.models.User` with ``user_id`` as primary key, or None if there
+                is no such user.
+        """
+        self._cached_user = (self.user_id, user)  # pylint: disable=attribute-defined-outside-init
+
+    def get_data_sharing_consent(self):
+        """
+        Return the account-wide :class:`.UserDataSharingConsentAudit` of this learner, or None if there isn't one.
+
+        Uses the consent records attached by :meth:`EnterpriseCourseEnrollmentQuerySet.with_consent` when they are
+        available, so resolving consent for a prefetched set of enrollments does not query the database per row.
+        """
+        prefetched_consent = getattr(self, self.PREFETCHED_CONSENT_ATTRIBUTE, None)
+        if prefetched_consent is not None:
+            return prefetched_consent[0] if prefetched_consent else None
+        return self.data_sharing_consent.first()
 
     @property
     def user_email(self):
@@ -291,7 +580,7 @@ class EnterpriseCustomerUser(TimeStampedModel):
                 "entitlement_id: id of the entitlements available to the learner.
         """
         # Check if Enterprise Learner consents to data sharing and store the boolean result
-        learner_consent_state = self.data_sharing_consent.first()
+        learner_consent_state = self.get_data_sharing_consent()
         learner_consent_enabled = learner_consent_state and learner_consent_state.enabled
 
         entitlements = self.enterprise_customer.enterprise_customer_entitlements
@@ -390,6 +679,134 @@ class PendingEnterpriseCustomerUser(TimeStampedModel):
         return self.__str__()
 
 
+class PendingEmailIndex(object):
+    """
+    Process-local index of the emails of :class:`.PendingEnterpriseCustomerUser` records, for cheap negative checks.
+
+    The index is rebuilt with a single query whenever its version changes. The version is kept in the default Django
+    cache, so that it is shared by all processes, and changed whenever pending links are created or their emails are
+    changed. Deleted pending links are left in the index, which only causes needless lookups.
+
+    The index is only used when the default cache is shared by all processes: with a process-local cache, other
+    processes would never learn about new pending links, so every email may then be pending.
+    """
+
+    VERSION_CACHE_KEY = 'enterprise.pending_email_index.version'
+    # Cache backends keeping their values in the memory of each process, or not at all
+    PROCESS_LOCAL_CACHE_BACKENDS = frozenset([
+        'django.core.cache.backends.dummy.DummyCache',
+        'django.core.cache.backends.locmem.LocMemCache',
+    ])
+
+    def __init__(self):
+        """
+        Initialize an empty index, to be built on first use.
+        """
+        self._lock = threading.Lock()
+        self._version = None
+        self._email_hashes = frozenset()
+
+    @staticmethod
+    def _hash(email):
+        """
+        Return the hash of the email in the index; emails are compared case-insensitively, like some databases do.
+        """
+        return hash(email.lower())
+
+    @classmethod
+    def is_cache_shared(cls):
+        """
+        Return whether the default Django cache is shared by all processes, so that it can signal index changes.
+        """
+        backend = settings.CACHES.get('default', {}).get('BACKEND')
+        return backend is not None and backend not in cls.PROCESS_LOCAL_CACHE_BACKENDS
+
+    def may_contain(self, email):
+        """
+        Return whether a pending link may exist for the email; if not, there is none.
+        """
+        if not email:
+            return False
+        if not self.is_cache_shared():
+            return True
+
+        version = cache.get(self.VERSION_CACHE_KEY)
+        if version is None:
+            cache.add(self.VERSION_CACHE_KEY, uuid4().hex, None)
+            version = cache.get(self.VERSION_CACHE_KEY)
+            if version is None:
+                # The cache doesn't keep anything, so the index can't be kept up to date.
+                return True
+
+        if version != self._version:
+            with self._lock:
+                if version != self._version:
+                    self._email_hashes = frozenset(
+                        self._hash(user_email) for user_email in
+                        PendingEnterpriseCustomerUser.objects.values_list('user_email', flat=True).iterator()
+                    )
+                    self._version = version
+        return self._hash(email) in self._email_hashes
+
+    def invalidate(self):
+        """
+        Make every process rebuild its index, now and, within a transaction, once the transaction is committed.
+        """
+        cache.set(self.VERSION_CACHE_KEY, uuid4().hex, None)
+        # Processes rebuilding their index before the transaction is committed miss the new pending links.
+        # Django 1.8 has no on_commit hook.
+        on_commit = getattr(transaction, 'on_commit', None)
+        if on_commit is not None:
+            on_commit(lambda: cache.set(self.VERSION_CACHE_KEY, uuid4().hex, None))
+
+
+# Pylint considers module level variable as "Constant" and expects them to be upper-cased
+pending_email_index = PendingEmailIndex()  # pylint: disable=invalid-name
+
+
+class PendingEnrollmentManager(models.Manager):
+    """
+    Model manager for :class:`.PendingEnrollment` entity.
+    """
+
+    def bulk_upsert(self, enrollments):
+        """
+        Create or update many pending enrollments with a few queries.
+
+        This is the bulk counterpart of ``update_or_create``: the existing enrollments are looked up with ``IN``
+        queries, those whose course mode changed are updated with one query per mode, and the missing ones are
+        inserted with ``bulk_create``.
+
+        Arguments:
+            enrollments (iterable): 3-tuples of the :class:`.PendingEnterpriseCustomerUser` ID, course ID and
+                course mode of each enrollment.
+        """
+        course_modes = {(user_id, course_id): course_mode for user_id, course_id, course_mode in enrollments}
+        for keys_batch in utils.chunks(course_modes, LINK_QUERY_BATCH_SIZE):
+            keys_batch = set(keys_batch)
+            existing = self.filter(
+                user_id__in={user_id for user_id, __ in keys_batch},
+                course_id__in={course_id for __, course_id in keys_batch},
+            ).values_list('pk', 'user_id', 'course_id', 'course_mode')
+
+            ids_by_mode = {}
+            for enrollment_id, user_id, course_id, course_mode in existing:
+                key = (user_id, course_id)
+                if key not in keys_batch:
+                    continue
+                keys_batch.remove(key)
+                if course_mode != course_modes[key]:
+                    ids_by_mode.setdefault(course_modes[key], []).append(enrollment_id)
+
+            with transaction.atomic():
+                for course_mode, ids in ids_by_mode.items():
+                    self.filter(pk__in=ids).update(course_mode=course_mode, modified=now())
+                self.bulk_create([
+                    PendingEnrollment(user_id=key[0], course_id=key[1], course_mode=course_modes[key])
+                    for key in keys_batch
+                ])
+
+
 @python_2_unicode_compatible
 class PendingEnrollment(TimeStampedModel):
     """
@@ -417,6 +834,8 @@ class PendingEnrollment(TimeStampedModel):
         app_label = 'enterprise'
         unique_together = (("user", "course_id"),)
 
+    objects = PendingEnrollmentManager()
+
     def complete_enrollment(self):
         """
         Enroll the linked user in the linked course.
@@ -439,6 +858,223 @@ class PendingEnrollment(TimeStampedModel):
         return self.__str__()
 
 
+@python_2_unicode_compatible
+class EnrollmentJob(TimeStampedModel):
+    """
+    Enrollment of many learners in a course or program, processed in the background.
+
+    The learners are split into :class:`.EnrollmentJobChunk` instances, which are processed independently; the job's
+    progress and results are aggregated from its chunks.
+    """
+
+    STATUS_PENDING = 'pending'
+    STATUS_RUNNING = 'running'
+    STATUS_COMPLETED = 'completed'
+
+    uuid = models.UUIDField(default=uuid4, editable=False, unique=True)
+    enterprise_customer = models.ForeignKey(EnterpriseCustomer, related_name='enrollment_jobs')
+    course_id = models.CharField(max_length=255, blank=True)
+    program_details = models.TextField(
+        blank=True,
+        help_text=_("Program data from the Course Catalog API, in JSON format, if enrolling in a program."),
+    )
+    course_mode = models.CharField(max_length=25)
+    notification = models.TextField(
+        blank=True,
+        help_text=_("Details of the course or program for the enrollment notification email, in JSON format. "
+                    "Empty if learners are not notified."),
+    )
+
+    class Meta(object):
+        app_label = 'enterprise'
+
+    def __str__(self):
+        """
+        Return human-readable string representation.
+        """
+        return "<EnrollmentJob {uuid}>: {enterprise_name} - {enrolled_in}".format(
+            uuid=self.uuid,
+            enterprise_name=self.enterprise_customer.name,
+            enrolled_in=self.enrollment_identifier,
+        )
+
+    def __repr__(self):
+        """
+        Return uniquely identifying string representation.
+        """
+        return self.__str__()
+
+    @property
+    def enrollment_identifier(self):
+        """
+        Human-readable identifier of the course or program the learners are enrolled in.
+        """
+        if self.course_id:
+            return self.course_id
+        program_details = self.get_program_details()
+        return program_details.get('title', program_details.get('uuid', _('the program')))
+
+    def get_program_details(self):
+        """
+        Return the program data, or an empty dict if enrolling in a course.
+        """
+        return json.loads(self.program_details) if self.program_details else {}
+
+    def get_notification(self):
+        """
+        Return the details of the course or program for the notification email, or None if not notifying.
+        """
+        if not self.notification:
+            return None
+        enrolled_in = json.loads(self.notification)
+        if enrolled_in.get('start'):
+            enrolled_in['start'] = parse_lms_api_datetime(enrolled_in['start'])
+        return enrolled_in
+
+    def set_notification(self, enrolled_in):
+        """
+        Store the details of the course or program for the notification email; None disables notifications.
+        """
+        notification = ''
+        if enrolled_in is not None:
+            details = dict(enrolled_in)
+            if details.get('start'):
+                details['start'] = details['start'].strftime(LMS_API_DATETIME_FORMAT)
+            notification = json.dumps(details)
+        self.notification = notification
+
+    def add_chunks(self, emails, chunk_size):
+        """
+        Split the emails to enroll into chunks of ``chunk_size`` emails.
+
+        Returns:
+            list: The created :class:`.EnrollmentJobChunk` instances.
+        """
+        return EnrollmentJobChunk.objects.bulk_create([
+            EnrollmentJobChunk(job=self, emails=json.dumps(emails_chunk))
+            for emails_chunk in utils.chunks(emails, chunk_size)
+        ])
+
+    def fail_stale_chunks(self, timeout):
+        """
+        Mark the chunks which should have been processed by now as failed, so that the job can complete.
+
+        Chunks are left running, or pending, when the process handling them dies, e.g. on a web process restart with
+        the ``local`` backend. Chunks running for more than ``timeout`` seconds, or still pending that long after the
+        job was created, are considered lost: all their learners are reported as failed.
+
+        Arguments:
+            timeout (int): Number of seconds after which a chunk which is not processed is considered lost.
+
+        Returns:
+            int: The number of chunks marked as failed.
+        """
+        deadline = now() - timedelta(seconds=timeout)
+        stale_chunks = self.chunks.filter(
+            models.Q(status=EnrollmentJobChunk.STATUS_RUNNING, started__lt=deadline) |
+            models.Q(status=EnrollmentJobChunk.STATUS_PENDING, job__created__lt=deadline)
+        )
+        failed_count = 0
+        for chunk in stale_chunks:
+            # The status is checked again, in case the chunk was processed in the meantime.
+            failed_count += EnrollmentJobChunk.objects.filter(pk=chunk.pk, status=chunk.status).update(
+                status=EnrollmentJobChunk.STATUS_FAILED,
+                results=json.dumps({'failed': chunk.get_emails()}),
+            )
+        if failed_count:
+            logger.warning('Marked %d stale chunks of enrollment job %s as failed', failed_count, self.uuid)
+        return failed_count
+
+    def get_progress(self):
+        """
+        Return the progress of the job, aggregated from its chunks.
+
+        Returns:
+            dict: The ``status`` of the job, the ``total`` number of learners, the number of learners ``processed``
+            so far, and the emails of the learners ``succeeded``, ``pending``, ``failed`` and ``notification_failed``
+            (enrolled, but not notified) in the processed chunks.
+        """
+        progress = {'total': 0, 'processed': 0, 'succeeded': [], 'pending': [], 'failed': [], 'notification_failed': []}
+        statuses = set()
+        for chunk in self.chunks.all():
+            statuses.add(chunk.status)
+            emails_count = len(chunk.get_emails())
+            progress['total'] += emails_count
+            if chunk.status in (EnrollmentJobChunk.STATUS_COMPLETED, EnrollmentJobChunk.STATUS_FAILED):
+                progress['processed'] += emails_count
+            results = chunk.get_results()
+            for outcome in ('succeeded', 'pending', 'failed', 'notification_failed'):
+                progress[outcome].extend(results.get(outcome, []))
+
+        finished_statuses = {EnrollmentJobChunk.STATUS_COMPLETED, EnrollmentJobChunk.STATUS_FAILED}
+        if statuses <= finished_statuses:
+            progress['status'] = self.STATUS_COMPLETED
+        elif statuses == {EnrollmentJobChunk.STATUS_PENDING}:
+            progress['status'] = self.STATUS_PENDING
+        else:
+            progress['status'] = self.STATUS_RUNNING
+        return progress
+
+
+@python_2_unicode_compatible
+class EnrollmentJobChunk(models.Model):
+    """
+    Part of an :class:`.EnrollmentJob`: the learners processed by a single background task.
+    """
+
+    STATUS_PENDING = 'pending'
+    STATUS_RUNNING = 'running'
+    STATUS_COMPLETED = 'completed'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = (
+        (STATUS_PENDING, _('Pending')),
+        (STATUS_RUNNING, _('Running')),
+        (STATUS_COMPLETED, _('Completed')),
+        (STATUS_FAILED, _('Failed')),
+    )
+
+    job = models.ForeignKey(EnrollmentJob, related_name='chunks')
+    emails = models.TextField(help_text=_("Emails of the learners to enroll, in JSON format."))
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    results = models.TextField(
+        blank=True,
+        help_text=_("Emails of the learners succeeded, pending and failed, in JSON format."),
+    )
+    started = models.DateTimeField(null=True, blank=True, help_text=_("When the chunk started to be processed."))
+
+    class Meta(object):
+        app_label = 'enterprise'
+        ordering = ('id',)
+
+    def __str__(self):
+        """
+        Return human-readable string representation.
+        """
+        return "<EnrollmentJobChunk {ID}>: {job_uuid} - {status}".format(
+            ID=self.id,
+            job_uuid=self.job.uuid,
+            status=self.status,
+        )
+
+    def __repr__(self):
+        """
+        Return uniquely identifying string representation.
+        """
+        return self.__str__()
+
+    def get_emails(self):
+        """
+        Return the emails of the learners to enroll.
+        """
+        return json.loads(self.emails)
+
+    def get_results(self):
+        """
+        Return the emails of the learners succeeded, pending, failed and not notified, keyed by outcome.
+        """
+        return json.loads(self.results) if self.results else {}
+
+
 def logo_path(instance, filename):
     """
     Delete the file if it already exist and returns the enterprise customer logo image path.
@@ -584,6 +1220,7 @@ class UserDataSharingConsentAudit(TimeStampedModel):
         app_label = 'enterprise'
         verbose_name = "Data Sharing Consent Audit State"
         verbose_name_plural = "Data Sharing Consent Audit States"
+        index_together = (('created', 'id'),)
 
     NOT_SET = 'not_set'
     ENABLED = 'enabled'
@@ -672,6 +1309,161 @@ class EnterpriseCustomerEntitlement(TimeStampedModel):
         return self.__str__()
 
 
+class EnterpriseCourseEnrollmentQuerySet(models.QuerySet):
+    """
+    QuerySet for :class:`.EnterpriseCourseEnrollment` entities.
+    """
+
+    def with_consent(self):
+        """
+        Fetch everything needed to resolve the effective data sharing consent of the enrollments.
+
+        The enterprise learner and customer are joined into the enrollment query, and the learners'
+        account-wide consent records are fetched with one additional query, so
+        :meth:`EnterpriseCourseEnrollment.consent_available` and
+        :attr:`EnterpriseCourseEnrollment.consent_needed` don't hit the database for each enrollment.
+        """
+        return self.select_related(
+            'enterprise_customer_user__enterprise_customer',
+        ).prefetch_related(
+            models.Prefetch(
+                'enterprise_customer_user__data_sharing_consent',
+                queryset=UserDataSharingConsentAudit.objects.order_by('pk'),
+                to_attr=EnterpriseCustomerUser.PREFETCHED_CONSENT_ATTRIBUTE,
+            )
+        )
+
+    def bulk_upsert(self, enrollments):
+        """
+        Create the enrollments which don't exist yet, with a few queries.
+
+        This is the bulk counterpart of ``get_or_create``: the existing enrollments are looked up with ``IN``
+        queries, and the missing ones are inserted with ``bulk_create``, along with their history records.
+
+        Arguments:
+            enrollments (iterable): ``(enterprise_customer_user_id, course_id)`` pairs.
+
+        Returns:
+            int: The number of enrollments created.
+        """
+        created_count = 0
+        for keys_batch in utils.chunks(set(enrollments), LINK_QUERY_BATCH_SIZE):
+            keys_batch = set(keys_batch)
+            keys_batch -= {(enrollment.enterprise_customer_user_id, enrollment.course_id)
+                           for enrollment in self._filter_keys(keys_batch)}
+            if not keys_batch:
+                continue
+            try:
+                with transaction.atomic():
+                    self.bulk_create([
+                        EnterpriseCourseEnrollment(enterprise_customer_user_id=ecu_id, course_id=course_id)
+                        for ecu_id, course_id in keys_batch
+                    ])
+                    # bulk_create neither sends post_save signals nor sets the primary keys of the inserted rows
+                    # on every database backend, so the history records are created from the stored rows.
+                    self._create_history_records(self._filter_keys(keys_batch))
+            except IntegrityError:
+                # Some enrollments were created concurrently; fall back to creating the batch row by row.
+                for ecu_id, course_id in keys_batch:
+                    __, created = self.get_or_create(enterprise_customer_user_id=ecu_id, course_id=course_id)
+                    created_count += created
+            else:
+                created_count += len(keys_batch)
+        return created_count
+
+    def bulk_upsert_consent(self, enrollments, batch_size=LINK_QUERY_BATCH_SIZE):
+        """
+        Create the enrollments which don't exist yet, and update the consent of the others, with a few queries.
+
+        Existing enrollments are looked up with ``IN`` queries; those whose consent differs are updated with one
+        query per consent value, and the missing ones are inserted with ``bulk_create``, ``batch_size`` enrollments
+        at a time. History records are created for both.
+
+        Arguments:
+            enrollments (dict): ``consent_granted`` values keyed by ``(enterprise_customer_user_id, course_id)``.
+            batch_size (int): Number of enrollments looked up, or inserted, by a single query.
+
+        Returns:
+            set: The keys of the enrollments created.
+        """
+        created = set()
+        for keys_batch in utils.chunks(enrollments, batch_size):
+            keys_batch = set(keys_batch)
+            updated = []
+            for enrollment in self._filter_keys(keys_batch):
+                key = (enrollment.enterprise_customer_user_id, enrollment.course_id)
+                keys_batch.discard(key)
+                if enrollment.consent_granted != enrollments[key]:
+                    enrollment.consent_granted = enrollments[key]
+                    updated.append(enrollment)
+
+            if updated:
+                modified = now()
+                with transaction.atomic():
+                    for consent_granted in {enrollment.consent_granted for enrollment in updated}:
+                        self.filter(pk__in=[
+                            enrollment.pk for enrollment in updated if enrollment.consent_granted == consent_granted
+                        ]).update(consent_granted=consent_granted, modified=modified)
+                    for enrollment in updated:
+                        enrollment.modified = modified
+                    self._create_history_records(updated, history_type='~')
+
+            if not keys_batch:
+                continue
+            try:
+                with transaction.atomic():
+                    self.bulk_create([
+                        EnterpriseCourseEnrollment(
+                            enterprise_customer_user_id=ecu_id, course_id=course_id,
+                            consent_granted=enrollments[(ecu_id, course_id)],
+                        )
+                        for ecu_id, course_id in keys_batch
+                    ])
+                    self._create_history_records(self._filter_keys(keys_batch))
+            except IntegrityError:
+                # Some enrollments were created concurrently; fall back to upserting the batch row by row.
+                for ecu_id, course_id in keys_batch:
+                    __, was_created = self.update_or_create(
+                        enterprise_customer_user_id=ecu_id, course_id=course_id,
+                        defaults={'consent_granted': enrollments[(ecu_id, course_id)]},
+                    )
+                    if was_created:
+                        created.add((ecu_id, course_id))
+            else:
+                created.update(keys_batch)
+        return created
+
+    def _filter_keys(self, keys):
+        """
+        Return the enrollments matching the ``(enterprise_customer_user_id, course_id)`` pairs.
+        """
+        enrollments = self.filter(
+            enterprise_customer_user_id__in={ecu_id for ecu_id, __ in keys},
+            course_id__in={course_id for __, course_id in keys},
+        )
+        return [
+            enrollment for enrollment in enrollments
+            if (enrollment.enterprise_customer_user_id, enrollment.course_id) in keys
+        ]
+
+    @staticmethod
+    def _create_history_records(enrollments, history_type='+'):
+        """
+        Record the creation, or the update, of the enrollments in their history.
+        """
+        history_model = apps.get_model('enterprise', 'HistoricalEnterpriseCourseEnrollment')
+        history_date = now()
+        history_model.objects.bulk_create([
+            history_model(
+                history_date=history_date,
+                history_type=history_type,
+                history_user=None,
+                **{field.attname: getattr(enrollment, field.attname) for field in enrollment._meta.fields}
+            )
+            for enrollment in enrollments
+        ])
+
+
 @python_2_unicode_compatible
 class EnterpriseCourseEnrollment(TimeStampedModel):
     """
@@ -685,8 +1477,11 @@ class EnterpriseCourseEnrollment(TimeStampedModel):
 
     class Meta(object):
         unique_together = (('enterprise_customer_user', 'course_id',),)
+        index_together = (('created', 'id'),)
         app_label = 'enterprise'
 
+    objects = EnterpriseCourseEnrollmentQuerySet.as_manager()
+
     enterprise_customer_user = models.ForeignKey(
         EnterpriseCustomerUser,
         blank=False,
@@ -727,7 +1522,7 @@ class EnterpriseCourseEnrollment(TimeStampedModel):
             # If it is indeterminate...
 
             # Check for an account-wide value and use that.
-            consent_state = self.enterprise_customer_user.data_sharing_consent.first()
+            consent_state = self.enterprise_customer_user.get_data_sharing_consent()
             if consent_state is not None:
                 return consent_state.enabled
             else:
@@ -766,6 +1561,10 @@ class EnterpriseCourseEnrollment(TimeStampedModel):
         return self.__str__()
 
 
+# Number of seconds compiled enrollment notification email templates are cached for
+DEFAULT_COMPILED_TEMPLATES_TIMEOUT = 3600  # 1 hour
+
+
 @python_2_unicode_compatible
 class EnrollmentNotificationEmailTemplate(TimeStampedModel):
     """
@@ -804,17 +1603,21 @@ class EnrollmentNotificationEmailTemplate(TimeStampedModel):
     site = models.OneToOneField(Site, related_name="enterprise_enrollment_template")
     history = HistoricalRecords()
 
+    # Name of the process-local cache holding the compiled templates
+    COMPILED_TEMPLATES_CACHE_NAME = 'notification_templates'
+    COMPILED_TEMPLATES_MAX_SIZE = 100
+
     def render_html_template(self, kwargs):
         """
         Render just the HTML template and return it as a string.
         """
-        return self.render_template(mark_safe(self.html_template), kwargs)
+        return self.render_template('html_template', kwargs)
 
     def render_plaintext_template(self, kwargs):
         """
         Render just the plaintext template and return it as a string.
         """
-        return self.render_template(self.plaintext_template, kwargs)
+        return self.render_template('plaintext_template', kwargs)
 
     def render_all_templates(self, kwargs):
         """
@@ -822,14 +1625,64 @@ class EnrollmentNotificationEmailTemplate(TimeStampedModel):
         """
         return self.render_plaintext_template(kwargs), self.render_html_template(kwargs)
 
-    def render_template(self, template_text, kwargs):
+    def render_template(self, field_name, kwargs):
         """
-        Create a template from the DB-backed text and render it.
+        Render the DB-backed template stored in the given field, compiling it only once.
         """
-        template = Template(template_text)
+        template = self.get_compiled_template(field_name)
         context = Context(kwargs)
         return template.render(context)
 
+    def get_compiled_template(self, field_name):
+        """
+        Return the compiled template stored in the given field.
+
+        Templates are parsed once, and kept in the ``notification_templates`` process-local cache, keyed by the ID
+        and modification time of the stored templates, for ``ENTERPRISE_NOTIFICATION_TEMPLATE_CACHE_TIMEOUT``
+        seconds. Saving the templates changes their modification time, so the previous versions are not used
+        anymore; they are dropped from the cache once they expire.
+
+        Arguments:
+            field_name (str): ``html_template`` or ``plaintext_template``.
+
+        Returns:
+            django.template.Template: The compiled template.
+        """
+        template_text = getattr(self, field_name)
+        if field_name == 'html_template':
+            template_text = mark_safe(template_text)
+        if self.pk is None:
+            return Template(template_text)
+
+        templates_cache = self._get_compiled_templates_cache()
+        key = self._get_compiled_template_key(field_name)
+        template = templates_cache.get(key)
+        if template is None:
+            template = Template(template_text)
+            templates_cache.set(key, template)
+        return template
+
+    def _get_compiled_template_key(self, field_name):
+        """
+        Return the key of the compiled template stored in the given field.
+        """
+        return make_cache_key(self.COMPILED_TEMPLATES_CACHE_NAME, self.pk, self.modified, field_name)
+
+    @classmethod
+    def _get_compiled_templates_cache(cls):
+        """
+        Return the cache holding the compiled templates.
+        """
+        return get_local_cache(
+            cls.COMPILED_TEMPLATES_CACHE_NAME,
+            timeout=getattr(
+                settings, 'ENTERPRISE_NOTIFICATION_TEMPLATE_CACHE_TIMEOUT', DEFAULT_COMPILED_TEMPLATES_TIMEOUT
+            ),
+            max_size=cls.COMPILED_TEMPLATES_MAX_SIZE,
+            # Compiled templates are never modified, and can be rendered by several threads at once.
+            copy_values=False,
+        )
+
     def __str__(self):
         """
         Return human-readable string representation.
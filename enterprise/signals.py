@@ -6,8 +6,11 @@ from __future__ import absolute_import, unicode_literals
 
 from logging import getLogger
 
-from enterprise.models import EnterpriseCourseEnrollment, EnterpriseCustomerUser, PendingEnterpriseCustomerUser
-from enterprise.utils import disable_for_loaddata
+from enterprise.models import (EnterpriseCourseEnrollment, EnterpriseCustomerUser, PendingEnterpriseCustomerUser,
+                               pending_email_index)
+from enterprise.tasks import start_pending_enrollments
+from enterprise.tpa_pipeline import clear_sso_customer_cache, forget_link_and_consent_state
+from enterprise.utils import clear_enterprise_context_cache, disable_for_loaddata, forget_enterprise_context
 
 logger = getLogger(__name__)  # pylint: disable=invalid-name
 
@@ -18,7 +21,7 @@ def handle_user_post_save(sender, **kwargs):  # pylint: disable=unused-argument
     Handle User model changes - checks if pending enterprise customer user record exists and upgrades it to actual link.
 
     If there are pending enrollments attached to the PendingEnterpriseCustomerUser, then this signal also takes the
-    newly-created users and enrolls them in the relevant courses.
+    newly-created users and enrolls them in the relevant courses, once the user is committed.
     """
     created = kwargs.get("created", False)
     user_instance = kwargs.get("instance", None)
@@ -26,6 +29,13 @@ def handle_user_post_save(sender, **kwargs):  # pylint: disable=unused-argument
     if user_instance is None:
         return  # should never happen, but better safe than 500 error
 
+    update_fields = kwargs.get("update_fields")
+    if not created and update_fields is not None and "email" not in update_fields:
+        return  # the email didn't change, e.g. last_login was updated
+
+    if not pending_email_index.may_contain(user_instance.email):
+        return  # nothing to do in this case, which is the most common one
+
     try:
         pending_ecu = PendingEnterpriseCustomerUser.objects.get(user_email=user_instance.email)
     except PendingEnterpriseCustomerUser.DoesNotExist:
@@ -50,13 +60,52 @@ def handle_user_post_save(sender, **kwargs):  # pylint: disable=unused-argument
         enterprise_customer=pending_ecu.enterprise_customer,
         user_id=user_instance.id
     )
-    for enrollment in pending_ecu.pendingenrollment_set.all():
-        # EnterpriseCustomers may enroll users in courses before the users themselves
-        # actually exist in the system; in such a case, the enrollment for each such
-        # course is finalized when the user registers with the OpenEdX platform.
-        enrollment.complete_enrollment()
-        EnterpriseCourseEnrollment.objects.get_or_create(
-            enterprise_customer_user=enterprise_customer_user,
-            course_id=enrollment.course_id
+    # EnterpriseCustomers may enroll users in courses before the users themselves
+    # actually exist in the system; in such a case, the enrollment for each such
+    # course is finalized when the user registers with the OpenEdX platform.
+    pending_enrollments = list(pending_ecu.pendingenrollment_set.values_list('course_id', 'course_mode'))
+    if pending_enrollments:
+        EnterpriseCourseEnrollment.objects.bulk_upsert(
+            (enterprise_customer_user.id, course_id) for course_id, __ in pending_enrollments
         )
+        # The LMS enrollments are made in the background, so registration doesn't wait for them.
+        start_pending_enrollments(user_instance.id, pending_enrollments)
     pending_ecu.delete()
+
+
+def handle_sso_customer_change(sender, **kwargs):  # pylint: disable=unused-argument
+    """
+    Handle EnterpriseCustomer and EnterpriseCustomerIdentityProvider changes - forgets the customers cached by provider.
+    """
+    clear_sso_customer_cache()
+
+
+@disable_for_loaddata
+def handle_sso_consent_change(sender, instance, **kwargs):  # pylint: disable=unused-argument
+    """
+    Handle EnterpriseCustomerUser and UserDataSharingConsentAudit changes - forgets the cached link and consent state.
+    """
+    try:
+        enterprise_customer_user = instance if isinstance(instance, EnterpriseCustomerUser) else instance.user
+    except EnterpriseCustomerUser.DoesNotExist:
+        return  # the link is being deleted too, and its own deletion forgets the consent state
+    forget_link_and_consent_state(enterprise_customer_user.enterprise_customer_id, enterprise_customer_user.user_id)
+
+
+@disable_for_loaddata
+def handle_pending_link_post_save(sender, **kwargs):  # pylint: disable=unused-argument
+    """
+    Handle PendingEnterpriseCustomerUser changes - makes every process rebuild its index of pending emails.
+    """
+    pending_email_index.invalidate()
+
+
+@disable_for_loaddata
+def handle_enterprise_context_change(sender, instance, **kwargs):  # pylint: disable=unused-argument
+    """
+    Handle changes of the links, customers and identity providers - forgets the affected cached enterprise contexts.
+    """
+    if isinstance(instance, EnterpriseCustomerUser):
+        forget_enterprise_context(instance.user_id)
+    else:
+        clear_enterprise_context_cache()
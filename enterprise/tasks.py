@@ -0,0 +1,226 @@
+# -*- coding: utf-8 -*-
+"""
+Background tasks of the enterprise app.
+
+Enrollment jobs are processed chunk by chunk, either by Celery workers, when Celery is available, or by a pool of
+threads in the web process. The backend is chosen with the ``ENTERPRISE_ENROLLMENT_JOB_BACKEND`` setting (``celery``
+or ``local``). The pending enrollments of newly registered learners are completed by the same backend.
+"""
+from __future__ import absolute_import, unicode_literals
+
+import json
+import threading
+from logging import getLogger
+
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import connection, transaction
+from django.utils.timezone import now
+
+from enterprise.enrollment import process_enrollment_job_chunk
+from enterprise.lms_api import enroll_user_in_course_locally
+from enterprise.models import EnrollmentJobChunk
+
+try:
+    from celery import shared_task
+except ImportError:
+    shared_task = None
+
+
+logger = getLogger(__name__)  # pylint: disable=invalid-name
+
+# Number of threads processing enrollment job chunks in the web process, when Celery is not used
+DEFAULT_LOCAL_WORKERS = 4
+# Number of threads completing the pending enrollments of new learners in the web process, when Celery is not used
+DEFAULT_PENDING_ENROLLMENTS_LOCAL_WORKERS = 2
+
+_LOCAL_EXECUTORS = {}
+_LOCAL_EXECUTORS_LOCK = threading.Lock()
+
+
+def run_enrollment_job_chunk(chunk_id):
+    """
+    Enroll the learners of an enrollment job chunk, and record the results.
+
+    Chunks which are not pending, e.g. because they were already processed, are skipped.
+
+    Arguments:
+        chunk_id (int): The ID of the :class:`enterprise.models.EnrollmentJobChunk` to process.
+    """
+    updated = EnrollmentJobChunk.objects.filter(
+        pk=chunk_id, status=EnrollmentJobChunk.STATUS_PENDING
+    ).update(status=EnrollmentJobChunk.STATUS_RUNNING, started=now())
+    if not updated:
+        return
+
+    chunk = EnrollmentJobChunk.objects.select_related('job__enterprise_customer').get(pk=chunk_id)
+    try:
+        results = process_enrollment_job_chunk(chunk.job, chunk.get_emails())
+    except Exception:  # pylint: disable=broad-except
+        logger.exception('Enrollment job chunk %s failed', chunk_id)
+        chunk.status = EnrollmentJobChunk.STATUS_FAILED
+        chunk.results = json.dumps({'failed': chunk.get_emails()})
+    else:
+        chunk.status = EnrollmentJobChunk.STATUS_COMPLETED
+        chunk.results = json.dumps(results)
+    chunk.save(update_fields=['status', 'results'])
+
+
+def complete_pending_enrollments(user_id, enrollments):
+    """
+    Enroll a newly registered learner in the courses they were enrolled in before registering.
+
+    Enrollments which fail are logged, and don't prevent the others from being made.
+
+    Arguments:
+        user_id (int): The ID of the learner's :class:`User`.
+        enrollments (list): ``(course_id, course_mode)`` pairs of the learner's pending enrollments.
+    """
+    user = User.objects.get(pk=user_id)
+    for course_id, course_mode in enrollments:
+        try:
+            enroll_user_in_course_locally(user, course_id, course_mode)
+        except Exception:  # pylint: disable=broad-except
+            logger.exception('Unable to enroll user %s in course %s', user_id, course_id)
+
+
+if shared_task is not None:
+    # pylint: disable=invalid-name
+    run_enrollment_job_chunk_task = shared_task(name='enterprise.run_enrollment_job_chunk')(run_enrollment_job_chunk)
+    complete_pending_enrollments_task = shared_task(
+        name='enterprise.complete_pending_enrollments'
+    )(complete_pending_enrollments)
+else:
+    run_enrollment_job_chunk_task = None  # pylint: disable=invalid-name
+    complete_pending_enrollments_task = None  # pylint: disable=invalid-name
+
+
+def _run_in_local_thread(chunk_id):
+    """
+    Process the chunk, closing the database connection the worker thread opened.
+    """
+    try:
+        run_enrollment_job_chunk(chunk_id)
+    finally:
+        connection.close()
+
+
+def _complete_pending_locally(user_id, enrollments):
+    """
+    Complete the pending enrollments, closing the database connection the worker thread opened.
+    """
+    try:
+        complete_pending_enrollments(user_id, enrollments)
+    finally:
+        connection.close()
+
+
+def _get_thread_pool(name, max_workers):
+    """
+    Return the named pool of threads of this process, creating it with ``max_workers`` threads on first use.
+    """
+    with _LOCAL_EXECUTORS_LOCK:
+        if name not in _LOCAL_EXECUTORS:
+            _LOCAL_EXECUTORS[name] = ThreadPoolExecutor(max_workers=max_workers)
+        return _LOCAL_EXECUTORS[name]
+
+
+def _get_local_executor():
+    """
+    Return the pool of threads processing enrollment job chunks in this process, creating it on first use.
+    """
+    return _get_thread_pool(
+        'enrollment_jobs',
+        getattr(settings, 'ENTERPRISE_ENROLLMENT_JOB_LOCAL_WORKERS', DEFAULT_LOCAL_WORKERS),
+    )
+
+
+def _get_pending_enrollments_executor():
+    """
+    Return the pool of threads completing pending enrollments in this process, creating it on first use.
+
+    Pending enrollments have their own pool, so that learners registering are not kept waiting behind large enrollment
+    jobs.
+    """
+    return _get_thread_pool(
+        'pending_enrollments',
+        getattr(settings, 'ENTERPRISE_PENDING_ENROLLMENTS_LOCAL_WORKERS', DEFAULT_PENDING_ENROLLMENTS_LOCAL_WORKERS),
+    )
+
+
+def get_enrollment_job_backend():
+    """
+    Return the name of the backend processing enrollment jobs: ``celery`` if available, ``local`` otherwise.
+    """
+    default_backend = 'celery' if run_enrollment_job_chunk_task is not None else 'local'
+    backend = getattr(settings, 'ENTERPRISE_ENROLLMENT_JOB_BACKEND', default_backend)
+    if backend == 'celery' and run_enrollment_job_chunk_task is None:
+        raise ValueError('ENTERPRISE_ENROLLMENT_JOB_BACKEND is "celery", but Celery is not installed.')
+    if backend not in ('celery', 'local'):
+        raise ValueError('Unknown ENTERPRISE_ENROLLMENT_JOB_BACKEND: {}'.format(backend))
+    return backend
+
+
+def start_enrollment_job(job):
+    """
+    Queue all the chunks of an enrollment job for processing, once the current transaction is committed.
+
+    Arguments:
+        job (EnrollmentJob): The job to start.
+    """
+    backend = get_enrollment_job_backend()
+    chunk_ids = list(job.chunks.values_list('pk', flat=True))
+
+    def queue_chunks():
+        """
+        Hand the chunks over to the backend.
+        """
+        for chunk_id in chunk_ids:
+            if backend == 'celery':
+                run_enrollment_job_chunk_task.delay(chunk_id)
+            else:
+                _get_local_executor().submit(_run_in_local_thread, chunk_id)
+
+    # Workers must not look for the chunks before they are committed. Django 1.8 has no on_commit hook.
+    on_commit = getattr(transaction, 'on_commit', None)
+    if on_commit is not None:
+        on_commit(queue_chunks)
+    else:
+        queue_chunks()
+
+
+def start_pending_enrollments(user_id, enrollments):
+    """
+    Complete the pending enrollments of a newly registered learner in the background, once the user is committed.
+
+    Without an on_commit hook, i.e. on Django 1.8, the enrollments are completed right away, in the current
+    transaction, as workers could not see the new user yet.
+
+    Arguments:
+        user_id (int): The ID of the learner's :class:`User`.
+        enrollments (list): ``(course_id, course_mode)`` pairs of the learner's pending enrollments.
+    """
+    on_commit = getattr(transaction, 'on_commit', None)
+    if on_commit is None:
+        complete_pending_enrollments(user_id, enrollments)
+        return
+
+    try:
+        backend = get_enrollment_job_backend()
+    except ValueError:
+        # Registration must not fail because of the enrollment job settings.
+        logger.exception('Completing the pending enrollments of user %s in the web process instead.', user_id)
+        backend = 'local'
+
+    def queue_enrollments():
+        """
+        Hand the enrollments over to the backend.
+        """
+        if backend == 'celery':
+            complete_pending_enrollments_task.delay(user_id, enrollments)
+        else:
+            _get_pending_enrollments_executor().submit(_complete_pending_locally, user_id, enrollments)
+
+    on_commit(queue_enrollments)
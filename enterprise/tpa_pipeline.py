@@ -3,10 +3,12 @@ Module provides elements to be used in third-party auth pipeline.
 """
 from __future__ import absolute_import, unicode_literals
 
+from django.conf import settings
 from django.core.urlresolvers import reverse
 from django.shortcuts import redirect
 from django.utils.translation import ugettext as _
 
+from enterprise.cache import get_local_cache, make_cache_key
 from enterprise.models import EnterpriseCustomer, EnterpriseCustomerUser, UserDataSharingConsentAudit
 from enterprise.utils import NotConnectedToEdX
 
@@ -20,16 +22,42 @@ try:
 except ImportError:
     Registry = None
 
+SSO_CUSTOMER_CACHE_NAME = 'sso_enterprise_customers'
+DEFAULT_SSO_CUSTOMER_CACHE_TIMEOUT = 60  # 1 minute
+
+SSO_CONSENT_CACHE_NAME = 'sso_consent_states'
+DEFAULT_SSO_CONSENT_CACHE_TIMEOUT = 30  # 30 seconds
+
+# Name of the request attribute memoizing the EnterpriseCustomers looked up during the request, by provider ID.
+REQUEST_SSO_CUSTOMERS_ATTRIBUTE = '_enterprise_customers_by_provider_id'
+
+
+def get_sso_customer_cache():
+    """
+    Return the process-local cache of the EnterpriseCustomers tied to identity providers, keyed by provider ID.
+
+    Entries expire after ``ENTERPRISE_SSO_CUSTOMER_CACHE_TIMEOUT`` seconds, and the whole cache is cleared whenever
+    an EnterpriseCustomer or an EnterpriseCustomerIdentityProvider is saved or deleted in the process. The cached
+    customers are shared rather than copied, so they must only be read.
+    """
+    return get_local_cache(
+        SSO_CUSTOMER_CACHE_NAME,
+        timeout=getattr(settings, 'ENTERPRISE_SSO_CUSTOMER_CACHE_TIMEOUT', DEFAULT_SSO_CUSTOMER_CACHE_TIMEOUT),
+        copy_values=False,
+    )
+
 
 def get_enterprise_customer_for_request(request):
     """
     Get the EnterpriseCustomer associated with a particular request.
+
+    The EnterpriseCustomer is looked up at most once per request.
     """
     pipeline = request.session.get('partial_pipeline')
-    return get_ec_for_running_pipeline(pipeline)
+    return get_ec_for_running_pipeline(pipeline, request=request)
 
 
-def get_ec_for_running_pipeline(pipeline):
+def get_ec_for_running_pipeline(pipeline, request=None):
     """
     Get the EnterpriseCustomer associated with a running pipeline.
     """
@@ -41,21 +69,47 @@ def get_ec_for_running_pipeline(pipeline):
     if pipeline is None:
         return None
     provider = Registry.get_from_pipeline(pipeline)
-    return get_enterprise_customer_for_sso(provider)
+    return get_enterprise_customer_for_sso(provider, request=request)
 
 
-def get_enterprise_customer_for_sso(provider):
+def get_enterprise_customer_for_sso(provider, request=None):
     """
     Get the EnterpriseCustomer object tied to an identity provider.
+
+    Customers are cached by provider ID, see ``get_sso_customer_cache``, and memoized on the request if one is given.
+    Providers which aren't tied to any customer are not cached, so that newly tied customers are found right away.
     """
     if provider is None:
         return None
-    try:
-        return EnterpriseCustomer.objects.get(  # pylint: disable=no-member
-            enterprise_customer_identity_provider__provider_id=provider.provider_id
-        )
-    except EnterpriseCustomer.DoesNotExist:
-        return None
+
+    memoized_customers = None
+    if request is not None:
+        memoized_customers = vars(request).setdefault(REQUEST_SSO_CUSTOMERS_ATTRIBUTE, {})
+        if provider.provider_id in memoized_customers:
+            return memoized_customers[provider.provider_id]
+
+    cache = get_sso_customer_cache()
+    customer = cache.get(provider.provider_id)
+    if customer is None:
+        try:
+            customer = EnterpriseCustomer.objects.get(  # pylint: disable=no-member
+                enterprise_customer_identity_provider__provider_id=provider.provider_id
+            )
+        except EnterpriseCustomer.DoesNotExist:
+            pass
+        else:
+            cache.set(provider.provider_id, customer)
+
+    if memoized_customers is not None:
+        memoized_customers[provider.provider_id] = customer
+    return customer
+
+
+def clear_sso_customer_cache():
+    """
+    Forget the EnterpriseCustomers cached by provider ID.
+    """
+    get_sso_customer_cache().clear()
 
 
 def active_provider_enforces_data_sharing(request, enforcement_location):
@@ -89,6 +143,59 @@ def active_provider_requests_data_sharing(request):
     return False
 
 
+def get_sso_consent_cache():
+    """
+    Return the process-local cache of the links of users to EnterpriseCustomers, and of their granted consent states.
+
+    Entries expire after ``ENTERPRISE_SSO_CONSENT_CACHE_TIMEOUT`` seconds, and are removed whenever the link or the
+    consent they were read from is saved or deleted in the process.
+    """
+    return get_local_cache(
+        SSO_CONSENT_CACHE_NAME,
+        timeout=getattr(settings, 'ENTERPRISE_SSO_CONSENT_CACHE_TIMEOUT', DEFAULT_SSO_CONSENT_CACHE_TIMEOUT),
+    )
+
+
+def get_sso_consent_cache_key(enterprise_customer_uuid, user_id):
+    """
+    Return the key of the link of a user to an EnterpriseCustomer, and of their consent state, in the cache.
+    """
+    return make_cache_key(SSO_CONSENT_CACHE_NAME, str(enterprise_customer_uuid), user_id)
+
+
+def get_link_and_consent_state(enterprise_customer, user_id):
+    """
+    Get the link of a user to an EnterpriseCustomer, along with the state of the user's account-level consent.
+
+    Both are looked up with a single query. Only users who are linked and granted consent are cached, see
+    ``get_sso_consent_cache``: other users are about to link or consent, possibly in another process, which must not
+    be missed.
+
+    Returns:
+        tuple: The ID of the EnterpriseCustomerUser, or None if the user isn't linked to the EnterpriseCustomer, and
+        the state of the UserDataSharingConsentAudit, or None if the user has no consent record.
+    """
+    cache = get_sso_consent_cache()
+    cache_key = get_sso_consent_cache_key(enterprise_customer.uuid, user_id)
+    link_and_consent_state = cache.get(cache_key)
+    if link_and_consent_state is None:
+        rows = EnterpriseCustomerUser.objects.filter(
+            enterprise_customer=enterprise_customer,
+            user_id=user_id,
+        ).order_by('data_sharing_consent__pk').values_list('pk', 'data_sharing_consent__state')[:1]
+        link_and_consent_state = tuple(rows[0]) if rows else (None, None)
+        if link_and_consent_state[1] == UserDataSharingConsentAudit.ENABLED:
+            cache.set(cache_key, link_and_consent_state)
+    return link_and_consent_state
+
+
+def forget_link_and_consent_state(enterprise_customer_uuid, user_id):
+    """
+    Remove the link of a user to an EnterpriseCustomer, and the user's consent state, from the cache.
+    """
+    get_sso_consent_cache().delete(get_sso_consent_cache_key(enterprise_customer_uuid, user_id))
+
+
 def get_consent_status_for_pipeline(pipeline):
     """
     Get the consent object for the current pipeline.
@@ -139,24 +246,23 @@ def handle_enterprise_logistration(backend, user, **kwargs):
         # This pipeline element is not being activated as a part of an Enterprise logistration
         return
 
+    # Find the link between the user and the enterprise customer, and the user's account-level consent record
+    link_id, consent_state = get_link_and_consent_state(enterprise_customer, user.id)
+
     if not enterprise_customer.requests_data_sharing_consent:
         # This enterprise customer attached to this pipeline element does not request data sharing consent;
         # proceed with the creation of a link between the user and the enterprise customer, then exit.
-        EnterpriseCustomerUser.objects.create(
-            enterprise_customer=enterprise_customer,
-            user_id=user.id
-        )
+        if link_id is None:
+            EnterpriseCustomerUser.objects.get_or_create(
+                enterprise_customer=enterprise_customer,
+                user_id=user.id
+            )
         return
 
-    try:
-        # Find an existing account-level consent record for the user
-        consent = UserDataSharingConsentAudit.objects.get(
-            user__user_id=user.id,
-            user__enterprise_customer=enterprise_customer,
-        )
-    except UserDataSharingConsentAudit.DoesNotExist:
+    if consent_state is None:
         return redirect_to_consent()
 
-    if (not consent.enabled) and enterprise_customer.enforces_data_sharing_consent(EnterpriseCustomer.AT_LOGIN):
+    consent_enabled = consent_state == UserDataSharingConsentAudit.ENABLED
+    if not consent_enabled and enterprise_customer.enforces_data_sharing_consent(EnterpriseCustomer.AT_LOGIN):
         # If consent has been declined, and the enterprise customer requires it, redirect to get it.
         return redirect_to_consent()
@@ -8,16 +8,19 @@ import logging
 import os
 import re
 from functools import wraps
+from itertools import islice
 
 from django.apps import apps
 from django.conf import settings
 from django.core import mail
 from django.core.exceptions import ObjectDoesNotExist
 from django.core.urlresolvers import reverse
+from django.db import transaction
 from django.template.loader import render_to_string
 from django.utils.translation import ugettext as _
 
 import enterprise
+from enterprise.cache import DjangoResponseCache, make_cache_key
 # pylint: disable=import-error,wrong-import-order
 from six.moves.urllib.parse import parse_qs, urlencode, urlparse, urlsplit, urlunparse, urlunsplit
 
@@ -35,6 +38,16 @@ except ImportError:
 
 LOGGER = logging.getLogger(__name__)
 
+# Number of enrollment notification emails sent over one email connection
+DEFAULT_NOTIFICATION_EMAIL_CHUNK_SIZE = 100
+
+ENTERPRISE_CONTEXT_CACHE_NAME = 'enterprise_contexts'
+ENTERPRISE_CONTEXT_CACHE_NAMESPACE = 'enterprise.contexts'
+DEFAULT_ENTERPRISE_CONTEXT_CACHE_TIMEOUT = 300  # 5 minutes
+
+# Name of the request attribute memoizing the enterprise context of the requesting user.
+REQUEST_ENTERPRISE_CONTEXT_ATTRIBUTE = '_enterprise_context'
+
 
 class NotConnectedToEdX(Exception):
     """
@@ -127,6 +140,28 @@ def get_all_field_names(model):
     return [f.name for f in model._meta.get_fields()]
 
 
+def chunks(iterable, chunk_size):
+    """
+    Split an iterable into consecutive lists of at most ``chunk_size`` items.
+
+    The iterable is consumed lazily, so this can be used to process large querysets (via ``.iterator()``)
+    in bounded memory.
+
+    Arguments:
+        iterable: Any iterable
+        chunk_size (int): Maximum number of items per chunk
+
+    Yields:
+        list: The next chunk of items.
+    """
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+
 def disable_for_loaddata(signal_handler):
     """
     Decorator that turns off signal handlers when loading fixture data.
@@ -228,7 +263,7 @@ def consent_necessary_for_course(user, course_id):
         model_name='EnterpriseCourseEnrollment'
     )
     try:
-        enrollment = EnterpriseCourseEnrollment.objects.get(
+        enrollment = EnterpriseCourseEnrollment.objects.with_consent().get(
             enterprise_customer_user__user_id=user.id,
             course_id=course_id
         )
@@ -327,6 +362,111 @@ def send_email_notification_message(user, enrolled_in, enterprise_customer, emai
         email_connection: An existing Django email connection that can be used without
             creating a new connection for each individual message
     """
+    site_template_configuration = get_site_template_configuration(enterprise_customer)
+    subject_line = get_notification_subject_line(enrolled_in['name'], site_template_configuration)
+    message = build_notification_email(
+        user, enrolled_in, enterprise_customer, subject_line, site_template_configuration, email_connection
+    )
+    return message.send()
+
+
+def send_email_notification_messages(users, enrolled_in, enterprise_customer, email_connection=None, chunk_size=None):
+    """
+    Send emails notifying many users about their enrollment in a course or program.
+
+    This is the bulk counterpart of :func:`send_email_notification_message`: the site template configuration and
+    the subject line are resolved once, and the messages are sent in chunks of ``chunk_size`` messages
+    (``ENTERPRISE_NOTIFICATION_EMAIL_CHUNK_SIZE`` by default), each chunk over one open email connection.
+    A message which can't be built or sent is logged and reported, without affecting the other messages.
+
+    Arguments:
+        users: An iterable of User objects or PendingEnterpriseCustomerUsers to notify
+        enrolled_in (dict): Details of the course or program the users enrolled in; see
+            :func:`send_email_notification_message`.
+        enterprise_customer: The EnterpriseCustomer that the enrollments were created using.
+        email_connection: An existing Django email connection to use instead of the default one.
+        chunk_size (int): Number of messages sent before the connection is closed and reopened.
+
+    Returns:
+        tuple: The list of users who were notified, and the list of users who could not be notified.
+    """
+    if chunk_size is None:
+        chunk_size = getattr(
+            settings, 'ENTERPRISE_NOTIFICATION_EMAIL_CHUNK_SIZE', DEFAULT_NOTIFICATION_EMAIL_CHUNK_SIZE
+        )
+    if email_connection is None:
+        email_connection = mail.get_connection()
+    site_template_configuration = get_site_template_configuration(enterprise_customer)
+    subject_line = get_notification_subject_line(enrolled_in['name'], site_template_configuration)
+
+    notified = []
+    failed = []
+    for users_chunk in chunks(users, chunk_size):
+        messages = []
+        for user in users_chunk:
+            try:
+                message = build_notification_email(
+                    user, enrolled_in, enterprise_customer, subject_line, site_template_configuration,
+                    email_connection,
+                )
+            except Exception:  # pylint: disable=broad-except
+                LOGGER.exception('Could not build the enrollment notification email of %s', user)
+                failed.append(user)
+            else:
+                messages.append((user, message))
+
+        opened = email_connection.open()
+        try:
+            for user, message in messages:
+                # Messages are handed over one by one, so a failure is attributed to its recipient and the
+                # messages sent before it are not sent again.
+                try:
+                    email_connection.send_messages([message])
+                except Exception:  # pylint: disable=broad-except
+                    LOGGER.exception('Could not send the enrollment notification email to %s', message.to[0])
+                    failed.append(user)
+                else:
+                    notified.append(user)
+        finally:
+            if opened:
+                email_connection.close()
+    return notified, failed
+
+
+def get_site_template_configuration(enterprise_customer):
+    """
+    Return the enrollment notification email templates of the site of the Enterprise Customer, or None.
+    """
+    try:
+        return enterprise_customer.site.enterprise_enrollment_template
+    except (ObjectDoesNotExist, AttributeError):
+        return None
+
+
+def build_notification_email(
+        user,
+        enrolled_in,
+        enterprise_customer,
+        subject_line,
+        template_configuration=None,
+        email_connection=None,
+):
+    """
+    Build the email notifying a user about their enrollment in a course or program.
+
+    Arguments:
+        user: Either a User object or a PendingEnterpriseCustomerUser that we can use
+            to get details for the email
+        enrolled_in (dict): Details of the course or program the user enrolled in; see
+            :func:`send_email_notification_message`.
+        enterprise_customer: The EnterpriseCustomer that the enrollment was created using.
+        subject_line (str): The subject of the email.
+        template_configuration: A database-backed object with templates stored that can be used to render the email.
+        email_connection: The Django email connection the email will be sent with.
+
+    Returns:
+        EmailMultiAlternatives: The email, with plaintext and HTML bodies.
+    """
     if hasattr(user, 'first_name') and hasattr(user, 'username'):
         # PendingEnterpriseCustomerUsers don't have usernames or real names. We should
         # template slightly differently to make sure weird stuff doesn't happen.
@@ -349,23 +489,18 @@ def send_email_notification_message(user, enrolled_in, enterprise_customer, emai
         'enrolled_in': enrolled_in,
         'organization_name': enterprise_customer.name,
     }
-    try:
-        site_template_configuration = enterprise_customer.site.enterprise_enrollment_template
-    except (ObjectDoesNotExist, AttributeError):
-        site_template_configuration = None
-
-    plain_msg, html_msg = build_notification_message(msg_context, site_template_configuration)
-
-    subject_line = get_notification_subject_line(enrolled_in['name'], site_template_configuration)
+    plain_msg, html_msg = build_notification_message(msg_context, template_configuration)
 
-    return mail.send_mail(
+    message = mail.EmailMultiAlternatives(
         subject_line,
         plain_msg,
         settings.DEFAULT_FROM_EMAIL,
         [user_email],
-        html_message=html_msg,
-        connection=email_connection
+        connection=email_connection,
     )
+    if html_msg:
+        message.attach_alternative(html_msg, 'text/html')
+    return message
 
 
 def get_reversed_url_by_site(request, site, *args, **kwargs):
@@ -445,6 +580,93 @@ def get_enterprise_customer_for_user(auth_user):
     return enterprise_customer_user.enterprise_customer
 
 
+def get_enterprise_context_cache():
+    """
+    Return the cache of the enterprise contexts of users, keyed by user ID.
+
+    The contexts are kept in the default Django cache, so that they are shared by all processes. Entries expire after
+    ``ENTERPRISE_CONTEXT_CACHE_TIMEOUT`` seconds, and are removed whenever the user's link to an EnterpriseCustomer is
+    saved or deleted; the whole cache is cleared whenever an EnterpriseCustomer or an
+    EnterpriseCustomerIdentityProvider is saved or deleted.
+    """
+    return DjangoResponseCache(
+        timeout=getattr(settings, 'ENTERPRISE_CONTEXT_CACHE_TIMEOUT', DEFAULT_ENTERPRISE_CONTEXT_CACHE_TIMEOUT),
+        namespace=ENTERPRISE_CONTEXT_CACHE_NAMESPACE,
+    )
+
+
+def get_enterprise_context_for_user(auth_user, request=None):
+    """
+    Return the enterprise context of the given user, i.e. their enterprise customer's UUID and identity provider.
+
+    The context is looked up with a single query, cached, see ``get_enterprise_context_cache``, and memoized on the
+    request if one is given.
+
+    Arguments:
+        auth_user (contrib.auth.User): Django User
+        request (HttpRequest): The request the context is looked up for, if any.
+
+    Returns:
+        (dict): ``enterprise_id``, the UUID of the enterprise customer associated with the user, and ``tpa_hint``, the
+        slug of the customer's identity provider; both are `None` if the user isn't associated with any enterprise
+        customer, and ``tpa_hint`` is `None` if the customer has no identity provider.
+    """
+    if request is not None and REQUEST_ENTERPRISE_CONTEXT_ATTRIBUTE in vars(request):
+        return vars(request)[REQUEST_ENTERPRISE_CONTEXT_ATTRIBUTE]
+
+    cache = get_enterprise_context_cache()
+    cache_key = make_cache_key(ENTERPRISE_CONTEXT_CACHE_NAME, auth_user.id)
+    enterprise_context = cache.get(cache_key)
+    if enterprise_context is None:
+        rows = enterprise.models.EnterpriseCustomerUser.objects.filter(user_id=auth_user.id).order_by('pk').values_list(
+            'enterprise_customer__uuid', 'enterprise_customer__enterprise_customer_identity_provider__provider_id',
+        )[:1]
+        enterprise_id, tpa_hint = rows[0] if rows else (None, None)
+        enterprise_context = {'enterprise_id': enterprise_id, 'tpa_hint': tpa_hint}
+        cache.set(cache_key, enterprise_context)
+
+    if request is not None:
+        vars(request)[REQUEST_ENTERPRISE_CONTEXT_ATTRIBUTE] = enterprise_context
+    return enterprise_context
+
+
+def _run_now_and_on_commit(func):
+    """
+    Call ``func`` now and, within a transaction, once the transaction is committed.
+
+    Processes looking a context up before the transaction is committed would cache the previous one again.
+    Django 1.8 has no on_commit hook.
+    """
+    func()
+    on_commit = getattr(transaction, 'on_commit', None)
+    if on_commit is not None:
+        on_commit(func)
+
+
+def forget_enterprise_context(*user_ids):
+    """
+    Remove the enterprise contexts of the given users from the cache.
+    """
+    cache_keys = [make_cache_key(ENTERPRISE_CONTEXT_CACHE_NAME, user_id) for user_id in user_ids]
+
+    def forget():
+        """
+        Delete the cached contexts.
+        """
+        enterprise_context_cache = get_enterprise_context_cache()
+        for cache_key in cache_keys:
+            enterprise_context_cache.delete(cache_key)
+
+    _run_now_and_on_commit(forget)
+
+
+def clear_enterprise_context_cache():
+    """
+    Forget the enterprise contexts of all users.
+    """
+    _run_now_and_on_commit(lambda: get_enterprise_context_cache().clear())
+
+
 def get_course_track_selection_url(course_run, query_parameters):
     """
     Return track selection url for the given course.
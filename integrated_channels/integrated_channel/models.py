@@ -9,7 +9,7 @@ from django.utils.translation import ugettext_lazy as _
 from model_utils.models import TimeStampedModel
 
 from enterprise.models import EnterpriseCustomer, EnterpriseCourseEnrollment
-from enterprise.utils import NotConnectedToOpenEdX
+from enterprise.utils import NotConnectedToOpenEdX, chunks
 
 try:
     from certificates.api import GeneratedCertificate
@@ -21,6 +21,9 @@ try:
 except ImportError:
     CourseKey = None
 
+# Number of enrollments whose certificates are fetched with a single query
+LEARNER_DATA_BATCH_SIZE = 1000
+
 
 @python_2_unicode_compatible
 class EnterpriseIntegratedChannel(TimeStampedModel):
@@ -89,10 +92,14 @@ class EnterpriseCustomerPluginConfiguration(TimeStampedModel):
         for learner_data in self.collect_learner_data():
             transmitter.transmit(learner_data)
 
-    def collect_learner_data(self):
+    def collect_learner_data(self, batch_size=LEARNER_DATA_BATCH_SIZE):
         """
         Collect learner data for the ``EnterpriseCustomer`` where data sharing consent is granted.
 
+        Enrollments are processed in chunks of ``batch_size``: the enrollments, their consent state and their
+        certificates are fetched with a constant number of queries per chunk and matched in memory, so the
+        number of queries grows with the number of chunks, not with the number of enrollments.
+
         Yields a learner data object for each enrollment, containing:
 
         * ``enterprise_enrollment``: ``EnterpriseCourseEnrollment`` object.
@@ -104,30 +111,60 @@ class EnterpriseCustomerPluginConfiguration(TimeStampedModel):
             raise NotConnectedToOpenEdX(_('This package must be installed in an OpenEdX environment.'))
 
         # Fetch the consenting enrollment data, including the enterprise_customer_user
-        enrollment_queryset = EnterpriseCourseEnrollment.objects.select_related(
-            'enterprise_customer_user'
-        ).filter(
+        enrollment_queryset = EnterpriseCourseEnrollment.objects.filter(
             enterprise_customer_user__enterprise_customer=self.enterprise_customer,
-        )
-        for enterprise_enrollment in enrollment_queryset:
+        ).order_by('pk')
+        enrollment_ids = enrollment_queryset.values_list('pk', flat=True)
+        for enrollment_ids_chunk in chunks(enrollment_ids.iterator(), batch_size):
+            enrollments = enrollment_queryset.with_consent().filter(pk__in=enrollment_ids_chunk)
 
             # Omit any enrollments where consent has not been granted
-            if not enterprise_enrollment.consent_available():
+            consenting_enrollments = [
+                (enterprise_enrollment, CourseKey.from_string(enterprise_enrollment.course_id))
+                for enterprise_enrollment in enrollments if enterprise_enrollment.consent_available()
+            ]
+            if not consenting_enrollments:
                 continue
 
-            # Fetch the user+course certificate, if found
-            try:
-                certificate = GeneratedCertificate.eligible_certificates.get(
-                    user__id=enterprise_enrollment.enterprise_customer_user.user_id,
-                    course_id=CourseKey.from_string(enterprise_enrollment.course_id),
+            certificates = self.get_certificates(
+                user_ids={
+                    enterprise_enrollment.enterprise_customer_user.user_id
+                    for enterprise_enrollment, __ in consenting_enrollments
+                },
+                course_keys={course_key for __, course_key in consenting_enrollments},
+            )
+
+            for enterprise_enrollment, course_key in consenting_enrollments:
+                yield self.get_learner_data(
+                    enterprise_enrollment=enterprise_enrollment,
+                    certificate=certificates.get(
+                        (enterprise_enrollment.enterprise_customer_user.user_id, course_key)
+                    ),
                 )
-            except GeneratedCertificate.DoesNotExist:
-                certificate = None
 
-            yield self.get_learner_data(
-                enterprise_enrollment=enterprise_enrollment,
-                certificate=certificate,
-            )
+    @staticmethod
+    def get_certificates(user_ids, course_keys):
+        """
+        Fetch the eligible certificates for the given users and courses in a single query.
+
+        The query matches every combination of the given users and courses, so callers must look up the
+        (user, course) pairs they are actually interested in.
+
+        Arguments:
+            user_ids (set): IDs of the users whose certificates should be fetched
+            course_keys (set): ``CourseKey`` objects for the courses whose certificates should be fetched
+
+        Returns:
+            dict: ``GeneratedCertificate`` objects, keyed by ``(user_id, course_key)``.
+        """
+        certificates = GeneratedCertificate.eligible_certificates.filter(
+            user__id__in=user_ids,
+            course_id__in=course_keys,
+        )
+        return {
+            (certificate.user_id, certificate.course_id): certificate
+            for certificate in certificates
+        }
 
     def get_learner_data(self, enterprise_enrollment, certificate):
         """
@@ -12,9 +12,11 @@ from simple_history.models import HistoricalRecords
 from django.db import models
 from django.utils import timezone
 from django.utils.encoding import python_2_unicode_compatible
+from django.utils.functional import cached_property
 
 from model_utils.models import TimeFramedModel
 
+from enterprise.models import EnterpriseCustomerUser
 from integrated_channels.integrated_channel.models import EnterpriseCustomerPluginConfiguration
 from .transmitters.learner_data import SuccessFactorsLearnerDataTransmitter
 
@@ -86,12 +88,22 @@ class SAPSuccessFactorsEnterpriseCustomerConfiguration(EnterpriseCustomerPluginC
         """
         return 'SAP'
 
+    @cached_property
+    def remote_ids(self):
+        """
+        The SAP SuccessFactors user ID of each learner linked to the Enterprise Customer, keyed by ``user_id``.
+
+        Fetched in bulk the first time it is needed, and kept for the rest of the transmission run.
+        """
+        return EnterpriseCustomerUser.objects.get_remote_ids(self.enterprise_customer)
+
     def get_learner_data(self, enterprise_enrollment, certificate):
         """
         Returns a LearnerDataTransmissionAudit initialized from the given enrollment and certificate data.
         """
         return LearnerDataTransmissionAudit(
             enterprise_enrollment=enterprise_enrollment,
+            sapsf_user_id=self.remote_ids.get(enterprise_enrollment.enterprise_customer_user.user_id),
             certificate=certificate,
             # Used only if certificate is None
             course_completed=False,
@@ -132,7 +144,8 @@ class LearnerDataTransmissionAudit(models.Model):
 
         Optional arguments:
         * ``enterprise_enrollment``: If provided, then ``enterprise_course_enrollment_id``, ``user_id``, * ``course_id``
-          are pulled from this EnterpriseCourseEnrollment object.
+          are pulled from this EnterpriseCourseEnrollment object.  ``sapsf_user_id`` is looked up from the LMS
+          Third Party API, unless it is provided too.
         * ``certificate``: If provided, then ``course_completed=True``; ``completed_timestamp`, ``grade``
           are pulled from this GeneratedCertificate object.
 
@@ -141,7 +154,8 @@ class LearnerDataTransmissionAudit(models.Model):
         enterprise_enrollment = kwargs.pop('enterprise_enrollment', None)
         if enterprise_enrollment is not None:
             kwargs['enterprise_course_enrollment_id'] = enterprise_enrollment.id
-            kwargs['sapsf_user_id'] = enterprise_enrollment.enterprise_customer_user.get_remote_id()
+            if 'sapsf_user_id' not in kwargs:
+                kwargs['sapsf_user_id'] = enterprise_enrollment.enterprise_customer_user.get_remote_id()
             kwargs['course_id'] = enterprise_enrollment.course_id
 
         certificate = kwargs.pop('certificate', None)
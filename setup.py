@@ -60,6 +60,7 @@ setup(
         "django-simple-history",
         "edx-django-oauth2-provider",
         "edx-drf-extensions",
+        "futures;python_version==\"2.7\"",
         "Pillow>=3.1.1",
         "unicodecsv>=0.14.1",
     ],
@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+"""
+Tests for the `edx-enterprise` admin model classes.
+"""
+from __future__ import absolute_import, unicode_literals
+
+import unittest
+
+import mock
+from pytest import mark
+
+from django.contrib import admin
+
+from enterprise.admin import EnterpriseCustomerUserAdmin
+from enterprise.models import EnterpriseCustomerUser
+from test_utils.factories import EnterpriseCustomerUserFactory, UserFactory
+
+
+@mark.django_db
+class TestEnterpriseCustomerUserAdmin(unittest.TestCase):
+    """
+    Tests for EnterpriseCustomerUserAdmin.
+    """
+
+    @mock.patch('enterprise.admin.get_course_names')
+    @mock.patch('enterprise.admin.EnrollmentApiClient')
+    @mock.patch('enterprise.admin.reverse', side_effect=lambda name, args: '/courses/{}/about'.format(args[0]))
+    def test_get_enrolled_course_string(self, reverse_mock, enrollment_client, get_course_names_mock):
+        # pylint: disable=unused-argument
+        user = UserFactory()
+        enterprise_customer_user = EnterpriseCustomerUserFactory(user_id=user.id)
+        enrollment_client.return_value.get_enrolled_courses.return_value = [
+            {'course_details': {'course_id': 'course-v1:edX+DemoX+Demo_Course'}},
+            {'course_details': {'course_id': 'course-v1:edX+Slow+Course'}},
+        ]
+        get_course_names_mock.return_value = {'course-v1:edX+DemoX+Demo_Course': 'edX Demo Course'}
+
+        model_admin = EnterpriseCustomerUserAdmin(EnterpriseCustomerUser, admin.site)
+        courses_string = model_admin.get_enrolled_course_string(enterprise_customer_user)
+
+        get_course_names_mock.assert_called_once_with(
+            ['course-v1:edX+DemoX+Demo_Course', 'course-v1:edX+Slow+Course']
+        )
+        # The course whose name was not fetched in time is shown by its course ID.
+        assert courses_string == (
+            '<a href="/courses/course-v1:edX+DemoX+Demo_Course/about">edX Demo Course</a><br/>'
+            '<a href="/courses/course-v1:edX+Slow+Course/about">course-v1:edX+Slow+Course</a>'
+        )
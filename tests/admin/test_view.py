@@ -5,26 +5,33 @@ Tests for the `edx-enterprise` admin forms module.
 from __future__ import absolute_import, unicode_literals
 
 import json
+from datetime import timedelta
 
 import ddt
 import mock
 import six
-from edx_rest_api_client.exceptions import HttpClientError
+from edx_rest_api_client.exceptions import HttpClientError, HttpServerError
 from pytest import mark
 
 from django.conf import settings
 from django.contrib.auth.models import User
 from django.contrib.messages import constants as messages
 from django.core import mail
+from django.db import connection
 from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
 
 from enterprise import admin as enterprise_admin
 from enterprise.admin import EnterpriseCustomerManageLearnersView, TemplatePreviewView
 from enterprise.admin.forms import ManageLearnersForm
-from enterprise.admin.utils import ValidationMessages, get_course_runs_from_program
+from enterprise.admin.utils import ValidationMessages
 from enterprise.django_compatibility import reverse
-from enterprise.models import (EnrollmentNotificationEmailTemplate, EnterpriseCourseEnrollment, EnterpriseCustomerUser,
-                               PendingEnrollment, PendingEnterpriseCustomerUser)
+from enterprise.enrollment import get_course_runs_from_program
+from enterprise.models import (EnrollmentJob, EnrollmentJobChunk, EnrollmentNotificationEmailTemplate,
+                               EnterpriseCourseEnrollment, EnterpriseCustomerUser, PendingEnrollment,
+                               PendingEnterpriseCustomerUser)
+from enterprise.tasks import run_enrollment_job_chunk
 from test_utils import fake_catalog_api, fake_enrollment_api
 from test_utils.factories import (FAKER, EnterpriseCustomerFactory, EnterpriseCustomerUserFactory,
                                   PendingEnterpriseCustomerUserFactory, SiteFactory, UserFactory)
@@ -478,7 +485,7 @@ class TestEnterpriseCustomerManageLearnersViewPostSingleUser(BaseTestEnterpriseC
         return response
 
     @mock.patch("enterprise.admin.views.CourseCatalogApiClient")
-    @mock.patch("enterprise.admin.views.EnrollmentApiClient")
+    @mock.patch("enterprise.enrollment.EnrollmentApiClient")
     @mock.patch("enterprise.admin.forms.EnrollmentApiClient")
     def test_post_enroll_user(self, forms_client, views_client, course_catalog_client):
         catalog_instance = course_catalog_client.return_value
@@ -511,8 +518,38 @@ class TestEnterpriseCustomerManageLearnersViewPostSingleUser(BaseTestEnterpriseC
         assert enrollment.course_id == course_id
         assert len(mail.outbox) == 1
 
+    @mock.patch("enterprise.utils.mail.get_connection")
     @mock.patch("enterprise.admin.views.CourseCatalogApiClient")
-    @mock.patch("enterprise.admin.views.EnrollmentApiClient")
+    @mock.patch("enterprise.enrollment.EnrollmentApiClient")
+    @mock.patch("enterprise.admin.forms.EnrollmentApiClient")
+    def test_post_enroll_user_notification_failed(self, forms_client, views_client, course_catalog_client, connection):
+        connection.return_value.send_messages.side_effect = Exception("SMTP server unavailable")
+        catalog_instance = course_catalog_client.return_value
+        catalog_instance.get_course_run.return_value = {
+            "title": "Cool Science",
+            "start": "2017-01-01T12:00:00Z",
+            "marketing_url": "http://localhost:8000/courses/course-v1:HarvardX+CoolScience+2016"
+        }
+        views_client.return_value.enroll_user_in_course.side_effect = fake_enrollment_api.enroll_user_in_course
+        forms_client.return_value.get_course_details.side_effect = fake_enrollment_api.get_course_details
+        user = UserFactory()
+        course_id = "course-v1:HarvardX+CoolScience+2016"
+
+        response = self._enroll_user_request(user, "verified", course_id=course_id)
+
+        self._assert_django_messages(response, set([
+            (messages.SUCCESS, "1 user was enrolled to {}.".format(course_id)),
+            (
+                messages.WARNING,
+                "Enrollment notification emails could not be sent to some users enrolled in {}: {}".format(
+                    course_id, user.email
+                ),
+            ),
+        ]))
+        assert EnterpriseCourseEnrollment.objects.filter(course_id=course_id).count() == 1
+
+    @mock.patch("enterprise.admin.views.CourseCatalogApiClient")
+    @mock.patch("enterprise.enrollment.EnrollmentApiClient")
     @mock.patch("enterprise.admin.forms.EnrollmentApiClient")
     def test_post_enroll_no_course_detail(self, forms_client, views_client, course_catalog_client):
         catalog_instance = course_catalog_client.return_value
@@ -544,7 +581,7 @@ class TestEnterpriseCustomerManageLearnersViewPostSingleUser(BaseTestEnterpriseC
 
     @mock.patch("enterprise.utils.reverse")
     @mock.patch("enterprise.admin.views.CourseCatalogApiClient")
-    @mock.patch("enterprise.admin.views.EnrollmentApiClient")
+    @mock.patch("enterprise.enrollment.EnrollmentApiClient")
     @mock.patch("enterprise.admin.forms.EnrollmentApiClient")
     def test_post_enrollment_error(self, forms_client, views_client, course_catalog_client, reverse_mock):
         reverse_mock.return_value = '/courses/course-v1:HarvardX+CoolScience+2016'
@@ -567,10 +604,10 @@ class TestEnterpriseCustomerManageLearnersViewPostSingleUser(BaseTestEnterpriseC
             (messages.ERROR, "Enrollment of some users in {} failed: {}".format(course_id, user.email)),
         ]))
 
-    @mock.patch('enterprise.admin.views.logging.error')
+    @mock.patch('enterprise.enrollment.logging.error')
     @mock.patch("enterprise.utils.reverse")
     @mock.patch("enterprise.admin.views.CourseCatalogApiClient")
-    @mock.patch("enterprise.admin.views.EnrollmentApiClient")
+    @mock.patch("enterprise.enrollment.EnrollmentApiClient")
     @mock.patch("enterprise.admin.forms.EnrollmentApiClient")
     def test_post_enrollment_error_bad_error_string(
             self,
@@ -604,8 +641,50 @@ class TestEnterpriseCustomerManageLearnersViewPostSingleUser(BaseTestEnterpriseC
             (messages.ERROR, "Enrollment of some users in {} failed: {}".format(course_id, user.email)),
         ]))
 
+    @override_settings(ENTERPRISE_ENROLLMENT_API_MAX_RETRIES=1, ENTERPRISE_ENROLLMENT_API_RETRY_BACKOFF=0)
+    @mock.patch('enterprise.enrollment.logging.error')
+    @mock.patch("enterprise.utils.reverse")
+    @mock.patch("enterprise.admin.views.CourseCatalogApiClient")
+    @mock.patch("enterprise.enrollment.EnrollmentApiClient")
+    @mock.patch("enterprise.admin.forms.EnrollmentApiClient")
+    def test_post_enrollment_server_error(
+            self,
+            forms_client,
+            views_client,
+            course_catalog_client,
+            reverse_mock,
+            logging_mock
+    ):
+        reverse_mock.return_value = '/courses/course-v1:HarvardX+CoolScience+2016'
+        catalog_instance = course_catalog_client.return_value
+        catalog_instance.get_course_run.return_value = {
+            "name": "Cool Science",
+            "start": "2017-01-01T12:00:00Z",
+        }
+        views_instance = views_client.return_value
+        views_instance.enroll_user_in_course.side_effect = HttpServerError(
+            "Server Error", content=json.dumps({"message": "Unavailable"}).encode()
+        )
+        forms_instance = forms_client.return_value
+        forms_instance.get_course_details.side_effect = fake_enrollment_api.get_course_details
+        user = UserFactory()
+        course_id = "course-v1:HarvardX+CoolScience+2016"
+        mode = "verified"
+        response = self._enroll_user_request(user, mode, course_id=course_id)
+
+        # The enrollment is retried once before being reported as failed.
+        assert views_instance.enroll_user_in_course.call_count == 2
+        logging_mock.assert_called_with(
+            'Error while enrolling user %(user)s: %(message)s',
+            {'user': user.username, 'message': 'Unavailable'}
+        )
+        self._assert_django_messages(response, set([
+            (messages.ERROR, "Enrollment of some users in {} failed: {}".format(course_id, user.email)),
+        ]))
+        assert not EnterpriseCourseEnrollment.objects.exists()
+
     @mock.patch("enterprise.admin.views.CourseCatalogApiClient")
-    @mock.patch("enterprise.admin.views.EnrollmentApiClient")
+    @mock.patch("enterprise.enrollment.EnrollmentApiClient")
     @mock.patch("enterprise.admin.forms.CourseCatalogApiClient")
     def test_post_enroll_user_into_program(self, catalog_client, views_client, views_catalog_client):
         views_catalog_instance = views_catalog_client.return_value
@@ -646,7 +725,7 @@ class TestEnterpriseCustomerManageLearnersViewPostSingleUser(BaseTestEnterpriseC
         assert PendingEnterpriseCustomerUser.objects.count() == 1
 
     @mock.patch("enterprise.admin.views.CourseCatalogApiClient")
-    @mock.patch("enterprise.admin.views.EnrollmentApiClient")
+    @mock.patch("enterprise.enrollment.EnrollmentApiClient")
     @mock.patch("enterprise.admin.forms.CourseCatalogApiClient")
     def test_post_enroll_user_into_program_error(self, catalog_client, views_client, views_catalog_client):
         views_catalog_instance = views_catalog_client.return_value
@@ -869,8 +948,33 @@ class TestEnterpriseCustomerManageLearnersViewPostBulkUpload(BaseTestEnterpriseC
             (messages.SUCCESS, "2 new users were linked to {}.".format(self.enterprise_customer.name)),
         ]))
 
+    def test_post_query_count_does_not_depend_on_row_count(self):
+        """
+        Test that emails are looked up and linked in bulk, rather than row by row.
+        """
+        self._login()
+        columns = [ManageLearnersForm.CsvColumns.EMAIL]
+        query_counts = []
+        for row_count in (2, 10):
+            users = [UserFactory() for __ in range(row_count)]
+            linked_user = UserFactory()
+            EnterpriseCustomerUserFactory(user_id=linked_user.id)
+            data = [(user.email,) for user in users] + [(FAKER.email(),) for __ in range(row_count)]
+            data.append((linked_user.email,))
+
+            with CaptureQueriesContext(connection) as queries:
+                response = self._perform_request(columns, data)
+            query_counts.append(len(queries))
+
+            assert response.status_code == 302
+            assert EnterpriseCustomerUser.objects.filter(
+                enterprise_customer=self.enterprise_customer, user_id__in=[user.id for user in users]
+            ).count() == row_count
+
+        assert query_counts[0] == query_counts[1]
+
     @mock.patch("enterprise.admin.views.CourseCatalogApiClient")
-    @mock.patch("enterprise.admin.views.EnrollmentApiClient")
+    @mock.patch("enterprise.enrollment.EnrollmentApiClient")
     @mock.patch("enterprise.admin.forms.EnrollmentApiClient")
     def test_post_link_and_enroll(self, forms_client, views_client, course_catalog_client):
         """
@@ -914,8 +1018,115 @@ class TestEnterpriseCustomerManageLearnersViewPostBulkUpload(BaseTestEnterpriseC
         assert PendingEnterpriseCustomerUser.objects.all()[0].pendingenrollment_set.all()[0].course_id == course_id
         assert len(mail.outbox) == 2
 
+    @override_settings(ENTERPRISE_ENROLLMENT_JOB_THRESHOLD=2, ENTERPRISE_ENROLLMENT_JOB_CHUNK_SIZE=2)
+    @mock.patch("enterprise.admin.views.start_enrollment_job")
+    @mock.patch("enterprise.admin.views.CourseCatalogApiClient")
+    @mock.patch("enterprise.enrollment.EnrollmentApiClient")
+    @mock.patch("enterprise.admin.forms.EnrollmentApiClient")
+    def test_post_link_and_enroll_in_background(
+            self, forms_client, views_client, course_catalog_client, start_enrollment_job
+    ):
+        """
+        Test bulk upload with linking, and enrolling in the background
+        """
+        course_catalog_instance = course_catalog_client.return_value
+        course_catalog_instance.get_course_run.return_value = {
+            "name": "Enterprise Training",
+            "start": "2017-01-01T12:00:00Z",
+            "marketing_url": "http://localhost/course-v1:EnterpriseX+Training+2017"
+        }
+        views_instance = views_client.return_value
+        views_instance.enroll_user_in_course.side_effect = fake_enrollment_api.enroll_user_in_course
+        forms_instance = forms_client.return_value
+        forms_instance.get_course_details.side_effect = fake_enrollment_api.get_course_details
+        self._login()
+        user = UserFactory.create()
+        unknown_emails = [FAKER.email(), FAKER.email()]
+        columns = [ManageLearnersForm.CsvColumns.EMAIL]
+        data = [(user.email,)] + [(email,) for email in unknown_emails]
+        course_id = "course-v1:EnterpriseX+Training+2017"
+        course_mode = "professional"
+
+        response = self._perform_request(columns, data, course=course_id, course_mode=course_mode)
+
+        # Learners are linked right away, but enrolled by a background job.
+        job = EnrollmentJob.objects.get(enterprise_customer=self.enterprise_customer)
+        job_url = reverse("admin:" + enterprise_admin.utils.UrlNames.ENROLLMENT_JOB_STATUS,
+                          args=(self.enterprise_customer.uuid, job.uuid))
+        assert response.status_code == 302
+        assert response.url.endswith(job_url)
+        start_enrollment_job.assert_called_once_with(job)
+        assert job.chunks.count() == 2
+        assert not views_instance.enroll_user_in_course.called
+        assert job.get_notification()["url"] == "http://localhost/course-v1:EnterpriseX+Training+2017"
+
+        response = self.client.get(job_url)
+        assert response.status_code == 200
+        assert response.context["progress"]["status"] == EnrollmentJob.STATUS_PENDING
+        assert not response.context["is_completed"]
+
+        for chunk in job.chunks.all():
+            run_enrollment_job_chunk(chunk.pk)
+
+        views_instance.enroll_user_in_course.assert_called_once_with(user.username, course_id, course_mode)
+        assert len(mail.outbox) == 3
+        response = self.client.get(job_url)
+        assert response.context["is_completed"]
+        assert response.context["progress"]["processed"] == 3
+        success_message, pending_message = response.context["job_messages"]
+        assert success_message == ("success", "1 user was enrolled to {}.".format(course_id))
+        # Learners are split into chunks in no particular order.
+        assert pending_message[0] == "warning"
+        assert pending_message[1].startswith("The following users do not have an account on Test platform.")
+        assert set(pending_message[1].split(": ")[1].split(", ")) == set(unknown_emails)
+
+    def test_enrollment_job_messages_notification_failed(self):
+        job = EnrollmentJob.objects.create(
+            enterprise_customer=self.enterprise_customer,
+            course_id="course-v1:EnterpriseX+Training+2017",
+            course_mode="audit",
+        )
+        progress = {
+            "succeeded": ["learner@example.com"],
+            "pending": [],
+            "failed": [],
+            "notification_failed": ["learner@example.com"],
+        }
+
+        assert EnterpriseCustomerManageLearnersView.get_enrollment_job_messages(job, progress) == [
+            ("success", "1 user was enrolled to course-v1:EnterpriseX+Training+2017."),
+            (
+                "warning",
+                "Enrollment notification emails could not be sent to some users enrolled in "
+                "course-v1:EnterpriseX+Training+2017: learner@example.com",
+            ),
+        ]
+
+    def test_enrollment_job_status_not_found(self):
+        self._login()
+        job_url = reverse("admin:" + enterprise_admin.utils.UrlNames.ENROLLMENT_JOB_STATUS,
+                          args=(self.enterprise_customer.uuid, "b5a6f4b5-7e5b-4bd8-9ab6-6c6a1f4f9b31"))
+        assert self.client.get(job_url).status_code == 404
+
+    @ddt.data(
+        (3600, EnrollmentJob.STATUS_COMPLETED),
+        (0, EnrollmentJob.STATUS_RUNNING),
+    )
+    @ddt.unpack
+    def test_enrollment_job_status_stale_chunk(self, chunk_timeout, expected_status):
+        job = EnrollmentJob.objects.create(enterprise_customer=self.enterprise_customer, course_mode="audit")
+        job.add_chunks(["learner@example.com"], 1)
+        job.chunks.update(status=EnrollmentJobChunk.STATUS_RUNNING, started=timezone.now() - timedelta(hours=2))
+
+        self._login()
+        job_url = reverse("admin:" + enterprise_admin.utils.UrlNames.ENROLLMENT_JOB_STATUS,
+                          args=(self.enterprise_customer.uuid, job.uuid))
+        with override_settings(ENTERPRISE_ENROLLMENT_JOB_CHUNK_TIMEOUT=chunk_timeout):
+            response = self.client.get(job_url)
+        assert response.context["progress"]["status"] == expected_status
+
     @mock.patch("enterprise.admin.views.CourseCatalogApiClient")
-    @mock.patch("enterprise.admin.views.EnrollmentApiClient")
+    @mock.patch("enterprise.enrollment.EnrollmentApiClient")
     @mock.patch("enterprise.admin.forms.EnrollmentApiClient")
     def test_post_link_and_enroll_no_course_details(self, forms_client, views_client, course_catalog_client):
         """
@@ -957,7 +1168,7 @@ class TestEnterpriseCustomerManageLearnersViewPostBulkUpload(BaseTestEnterpriseC
         assert len(mail.outbox) == 0
 
     @mock.patch("enterprise.admin.views.CourseCatalogApiClient")
-    @mock.patch("enterprise.admin.views.EnrollmentApiClient")
+    @mock.patch("enterprise.enrollment.EnrollmentApiClient")
     @mock.patch("enterprise.admin.forms.EnrollmentApiClient")
     @mock.patch("enterprise.admin.forms.CourseCatalogApiClient")
     def test_post_link_and_enroll_no_notification(
@@ -1008,7 +1219,7 @@ class TestEnterpriseCustomerManageLearnersViewPostBulkUpload(BaseTestEnterpriseC
         assert len(mail.outbox) == 0
 
     @mock.patch("enterprise.admin.views.CourseCatalogApiClient")
-    @mock.patch("enterprise.admin.views.EnrollmentApiClient")
+    @mock.patch("enterprise.enrollment.EnrollmentApiClient")
     @mock.patch("enterprise.admin.forms.CourseCatalogApiClient")
     def test_post_link_and_enroll_into_program(self, catalog_client, views_client, views_catalog_client):
         """
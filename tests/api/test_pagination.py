@@ -5,11 +5,14 @@ Tests for the `edx-enterprise` api pagination.
 from __future__ import absolute_import, unicode_literals
 
 import ddt
+import mock
+from rest_framework.request import Request
 from rest_framework.reverse import reverse
 from rest_framework.test import APIRequestFactory
 
-from enterprise.api.pagination import get_paginated_response
-from test_utils import APITest
+from enterprise.api.pagination import CreatedCursorPagination, get_paginated_response
+from enterprise.models import EnterpriseCourseEnrollment
+from test_utils import APITest, factories
 
 
 DISCOVERY_URI = 'http://testserver.catalogs/api/v1/catalogs'
@@ -124,3 +127,23 @@ class TestEnterpriseAPIPagination(APITest):
 
         assert response.data.get('next') == expected_next
         assert response.data.get('previous') == expected_previous
+
+    @mock.patch('enterprise.api.pagination.loader.get_template')
+    def test_cursor_pagination_to_html(self, get_template):
+        """
+        Verify the cursor paginator renders the links to the pages next to the current one.
+        """
+        factories.EnterpriseCourseEnrollmentFactory.create_batch(15)
+        paginator = CreatedCursorPagination()
+        request = Request(APIRequestFactory().get(reverse('enterprise-course-enrollment-list') + '?cursor'))
+
+        page = paginator.paginate_queryset(EnterpriseCourseEnrollment.objects.all(), request)
+
+        assert len(page) == 10
+        assert paginator.display_page_controls
+        assert paginator.to_html() == get_template.return_value.render.return_value
+        get_template.assert_called_once_with(CreatedCursorPagination.template)
+        get_template.return_value.render.assert_called_once_with({
+            'previous_url': None,
+            'next_url': paginator.get_paginated_response([]).data['next'],
+        })
@@ -318,18 +318,16 @@ class TestEnterpriseCatalogCoursesSerializer(APITest):
         Verify that update_course for EnterpriseCatalogCoursesReadOnlySerializer returns
         successfully without errors.
         """
-        # Populate database.
-        ec_identity_provider = factories.EnterpriseCustomerIdentityProviderFactory(
-            enterprise_customer__uuid=enterprise_customer_uuid,
-            provider_id=provider_id,
-        )
         course_run_url = 'course_modes/choose/course-v1:edX+DemoX+1T2017/'
 
         with mock.patch('enterprise.utils.reverse', return_value=course_run_url):
             updated_course_runs = self.serializer.update_course_runs(
                 course_runs=[course_run],
-                catalog_id=catalog_id,
-                enterprise_customer=ec_identity_provider.enterprise_customer,
+                query_parameters={
+                    'tpa_hint': provider_id,
+                    'enterprise_id': enterprise_customer_uuid,
+                    'catalog_id': catalog_id,
+                },
             )
 
             assert len(updated_course_runs) == 1
@@ -355,10 +353,12 @@ class TestEnterpriseCatalogCoursesSerializer(APITest):
         successfully without errors.
         """
         global_context = {
-            'tpa_hint': self.provider_id
+            'tpa_hint': self.provider_id,
+            'enterprise_id': self.ecu.enterprise_customer.uuid,
+            'catalog_id': 1,
         }
         course = self.data['results'][0]
-        updated_course = self.serializer.update_course(course, 1, self.ecu.enterprise_customer, global_context)
+        updated_course = self.serializer.update_course(course, global_context)
 
         # Make sure global context passed in to update_course is added to the course.
         assert 'tpa_hint' in updated_course
@@ -371,7 +371,7 @@ class TestEnterpriseCatalogCoursesSerializer(APITest):
         # Make sure missing `key` in course run raises an exception
         course['course_runs'] = [{}]
         with raises(KeyError):
-            self.serializer.update_course(course, 1, self.ecu.enterprise_customer, global_context)
+            self.serializer.update_course(course, global_context)
 
     @ddt.data(
         (
@@ -381,7 +381,6 @@ class TestEnterpriseCatalogCoursesSerializer(APITest):
                 'title': 'edX Demonstration Course',
                 'course_runs': [],
             },
-            'test-shib',
             {},
             {
                 'key': 'edx+DemoX',
@@ -397,7 +396,6 @@ class TestEnterpriseCatalogCoursesSerializer(APITest):
                 'title': 'edX Demonstration Course',
                 'course_runs': [],
             },
-            'test-shib',
             {
                 'tpa_hint': 'test-shib',
             },
@@ -412,25 +410,15 @@ class TestEnterpriseCatalogCoursesSerializer(APITest):
     )
     @ddt.unpack
     @override_settings(LMS_ROOT_URL='http://testserver/')
-    def test_update_course_ddt(self, course, provider_id, global_context, expected_course):
+    def test_update_course_ddt(self, course, global_context, expected_course):
         """
         Test update_course method of EnterpriseCatalogCoursesReadOnlySerializer.
 
         Verify that update_course for EnterpriseCatalogCoursesReadOnlySerializer returns
         successfully without errors.
         """
-        enterprise_customer_id = 'd2fb4cb0-b538-4934-1926-684d48ff5865'
-        ecu = factories.EnterpriseCustomerUserFactory(
-            enterprise_customer__uuid=enterprise_customer_id,
-            user_id=self.user.id,
-        )
-        factories.EnterpriseCustomerIdentityProviderFactory(
-            enterprise_customer=ecu.enterprise_customer,
-            provider_id=provider_id,
-        )
-
         with mock.patch('enterprise.utils.reverse', return_value='course_modes/choose/'):
-            updated_course = self.serializer.update_course(course, 1, ecu.enterprise_customer, global_context)
+            updated_course = self.serializer.update_course(course, global_context)
 
             # Make sure global context passed in to update_course is added to the course.
             for key, value in six.iteritems(global_context):
@@ -452,3 +440,31 @@ class TestEnterpriseCatalogCoursesSerializer(APITest):
         # Make sure global context passed in to update_course is added to the course.
         assert all('tpa_hint' in course for course in self.serializer.data['results'])
         assert all(course['tpa_hint'] == self.provider_id for course in self.serializer.data['results'])
+
+    @mock.patch('enterprise.utils.reverse', return_value='/course_modes/choose/')
+    def test_update_enterprise_courses_queries(self, _):
+        """
+        Verify that the enterprise context is looked up once, whatever the number of courses and course runs.
+        """
+        course = self.data['results'][0]
+        self.data['results'] = [
+            dict(course, course_runs=[dict(course_run) for course_run in course['course_runs'] * 3])
+            for __ in range(100)
+        ]
+        serializer = EnterpriseCatalogCoursesReadOnlySerializer(self.data)
+
+        with self.assertNumQueries(1):
+            serializer.update_enterprise_courses(self.request, 1)
+            serializer.update_enterprise_courses(self.request, 1)
+
+        assert all(course['tpa_hint'] == self.provider_id for course in serializer.data['results'])
+        assert all(
+            'tpa_hint={}'.format(self.provider_id) in course_run['track_selection_url']
+            for course in serializer.data['results'] for course_run in course['course_runs']
+        )
+
+        # The enterprise context is cached for the next requests of the user.
+        request = APIRequestFactory().get(reverse('catalogs-list'))
+        request.user = self.user
+        with self.assertNumQueries(0):
+            EnterpriseCatalogCoursesReadOnlySerializer(self.data).update_enterprise_courses(request, 1)
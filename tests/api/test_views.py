@@ -12,9 +12,13 @@ import mock
 from rest_framework.reverse import reverse
 
 from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import connection
 from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
 
-from enterprise.models import EnterpriseCustomer, UserDataSharingConsentAudit
+from enterprise.models import (LINK_QUERY_BATCH_SIZE, EnterpriseCourseEnrollment, EnterpriseCustomer,
+                               EnterpriseCustomerUser, UserDataSharingConsentAudit)
 from test_utils import TEST_USERNAME, APITest, factories
 
 
@@ -530,6 +534,102 @@ class TestEnterpriseAPIViews(APITest):
         if status_code == 200:
             self.assertDictEqual(request_data, response)
 
+    def _create_learners(self, count):
+        """
+        Create users named ``learner_<index>``, linked to an enterprise customer.
+        """
+        enterprise_customer = factories.EnterpriseCustomerFactory()
+        User.objects.bulk_create([
+            User(username='learner_{}'.format(index), email='learner_{}@example.com'.format(index))
+            for index in range(count)
+        ])
+        EnterpriseCustomerUser.objects.bulk_create([
+            EnterpriseCustomerUser(enterprise_customer=enterprise_customer, user_id=user_id)
+            for user_id in User.objects.filter(username__startswith='learner_').values_list('id', flat=True)
+        ])
+
+    @override_settings(ECOMMERCE_SERVICE_WORKER_USERNAME=TEST_USERNAME, ENTERPRISE_BULK_ENROLLMENT_BATCH_SIZE=20)
+    @ddt.data(10, 100)
+    def test_post_enterprise_course_enrollments_bulk(self, count):
+        """
+        Make sure service users can post many EnterpriseCourseEnrollments at once, with a few queries per batch.
+        """
+        self._create_learners(count)
+        existing_enrollment = factories.EnterpriseCourseEnrollmentFactory(
+            enterprise_customer_user=EnterpriseCustomerUser.objects.get(
+                user_id=User.objects.get(username='learner_0').pk
+            ),
+            course_id='course-v1:edX+DemoX+DemoCourse',
+            consent_granted=False,
+        )
+        data = [
+            {
+                'username': 'learner_{}'.format(index),
+                'course_id': 'course-v1:edX+DemoX+DemoCourse',
+                'consent_granted': True,
+            }
+            for index in range(count)
+        ]
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(
+                settings.TEST_SERVER + reverse('enterprise-course-enrollment-bulk'), data=data, format='json'
+            )
+
+        assert response.status_code == 201
+        response = self.load_json(response.content)
+        assert response == [dict(item, created=item['username'] != 'learner_0') for item in data]
+        enrollments = EnterpriseCourseEnrollment.objects.filter(course_id='course-v1:edX+DemoX+DemoCourse')
+        assert enrollments.count() == count
+        assert all(enrollment.consent_granted for enrollment in enrollments)
+        assert EnterpriseCourseEnrollment.history.filter(id=existing_enrollment.id, history_type='~').count() == 1
+        assert EnterpriseCourseEnrollment.history.filter(history_type='+').count() == count
+        # Authentication, the transaction and the update of the existing enrollment, then per batch of 20 items:
+        # the users, the links, the existing enrollments, and the new enrollments inserted, looked up and recorded
+        # in their history, within a savepoint.
+        assert len(queries) == 7 + 8 * -(-count // 20)
+
+    @override_settings(ECOMMERCE_SERVICE_WORKER_USERNAME=TEST_USERNAME)
+    def test_post_enterprise_course_enrollments_bulk_invalid(self):
+        """
+        Make sure no EnterpriseCourseEnrollments are written when some of the posted ones are invalid.
+        """
+        self._create_learners(2)
+        factories.UserFactory(username='unlinked')
+        data = [
+            {'username': 'learner_0', 'course_id': 'course-v1:edX+DemoX+DemoCourse', 'consent_granted': True},
+            {'username': 'does_not_exist', 'course_id': 'course-v1:edX+DemoX+DemoCourse', 'consent_granted': True},
+            {'username': 'unlinked', 'course_id': 'course-v1:edX+DemoX+DemoCourse', 'consent_granted': True},
+            {'username': 'learner_1', 'consent_granted': True},
+        ]
+
+        response = self.client.post(
+            settings.TEST_SERVER + reverse('enterprise-course-enrollment-bulk'), data=data, format='json'
+        )
+
+        assert response.status_code == 400
+        assert self.load_json(response.content) == [
+            {},
+            {'username': ['User does not exist']},
+            {'username': ['User has no EnterpriseCustomerUser']},
+            {'course_id': ['This field is required.']},
+        ]
+        assert not EnterpriseCourseEnrollment.objects.exists()
+
+    def test_post_enterprise_course_enrollments_bulk_not_service_user(self):
+        """
+        Make sure only service users can post many EnterpriseCourseEnrollments at once.
+        """
+        self._create_learners(1)
+        response = self.client.post(
+            settings.TEST_SERVER + reverse('enterprise-course-enrollment-bulk'),
+            data=[{'username': 'learner_0', 'course_id': 'course-v1:edX+DemoX+DemoCourse', 'consent_granted': True}],
+            format='json',
+        )
+
+        assert response.status_code == 403
+        assert not EnterpriseCourseEnrollment.objects.exists()
+
     @override_settings(ECOMMERCE_SERVICE_WORKER_USERNAME=TEST_USERNAME)
     @ddt.data(
         (TEST_USERNAME, 201),
@@ -561,6 +661,181 @@ class TestEnterpriseAPIViews(APITest):
         if status_code == 200:
             self.assertDictEqual(data, response)
 
+    @ddt.data(10, 100, 1000)
+    def test_enterprise_learner_list_query_budget(self, page_size):
+        """
+        Make sure listing enterprise learners takes the same number of queries whatever the page size.
+        """
+        enterprise_customers = [factories.EnterpriseCustomerFactory(), factories.EnterpriseCustomerFactory()]
+        for enterprise_customer in enterprise_customers:
+            factories.EnterpriseCustomerBrandingFactory(enterprise_customer=enterprise_customer)
+            factories.EnterpriseCustomerEntitlementFactory(enterprise_customer=enterprise_customer)
+        User.objects.bulk_create([
+            User(username='learner_{}'.format(index), email='learner_{}@example.com'.format(index))
+            for index in range(page_size)
+        ])
+        EnterpriseCustomerUser.objects.bulk_create([
+            EnterpriseCustomerUser(enterprise_customer=enterprise_customers[index % 2], user_id=user_id)
+            for index, user_id in enumerate(User.objects.filter(username__startswith='learner_').values_list(
+                'id', flat=True
+            ))
+        ])
+        UserDataSharingConsentAudit.objects.bulk_create([
+            UserDataSharingConsentAudit(user=enterprise_customer_user, state=UserDataSharingConsentAudit.ENABLED)
+            for enterprise_customer_user in EnterpriseCustomerUser.objects.all()[:page_size // 2]
+        ])
+
+        with mock.patch('rest_framework.pagination.PageNumberPagination.page_size', page_size):
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(settings.TEST_SERVER + reverse('enterprise-learner-list'))
+
+        response = self.load_json(response.content)
+        assert len(response['results']) == page_size
+        assert all(learner['user']['username'].startswith('learner_') for learner in response['results'])
+        # Authentication, the count, the learners (joined with their customers, sites and branding), 3 prefetches
+        # and one users query per batch of learners.
+        assert len(queries) == 6 + -(-page_size // LINK_QUERY_BATCH_SIZE)
+
+    @ddt.data(
+        (
+            '?fields=uuid,name',
+            {'uuid': 'd2098bfb-2c78-44f1-9eb2-b94475356a3f', 'name': 'Test Enterprise Customer'},
+            3,
+        ),
+        (
+            '?fields=uuid,site, unknown',
+            {'uuid': 'd2098bfb-2c78-44f1-9eb2-b94475356a3f', 'site': {'domain': 'example.com', 'name': 'example.com'}},
+            3,
+        ),
+        (
+            '?fields=uuid,site,branding_configuration&expand=branding_configuration',
+            {
+                'uuid': 'd2098bfb-2c78-44f1-9eb2-b94475356a3f', 'site': 1,
+                'branding_configuration': {
+                    'enterprise_customer': 'd2098bfb-2c78-44f1-9eb2-b94475356a3f', 'logo': None,
+                },
+            },
+            3,
+        ),
+        (
+            '?fields=uuid,enterprise_customer_entitlements,enterprise_customer_users&expand=',
+            {
+                'uuid': 'd2098bfb-2c78-44f1-9eb2-b94475356a3f', 'enterprise_customer_entitlements': [1],
+                'enterprise_customer_users': [1],
+            },
+            5,
+        ),
+    )
+    @ddt.unpack
+    def test_enterprise_customer_sparse_fieldsets(self, query_string, expected_json, expected_queries):
+        """
+        Make sure only the fields asked for are rendered, and only their related objects are looked up.
+        """
+        enterprise_customer = factories.EnterpriseCustomerFactory(
+            uuid='d2098bfb-2c78-44f1-9eb2-b94475356a3f', name='Test Enterprise Customer',
+            site__domain='example.com', site__name='example.com',
+        )
+        factories.EnterpriseCustomerBrandingFactory(enterprise_customer=enterprise_customer, logo=None)
+        factories.EnterpriseCustomerEntitlementFactory(enterprise_customer=enterprise_customer, id=1)
+        factories.EnterpriseCustomerUserFactory(enterprise_customer=enterprise_customer, id=1)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(settings.TEST_SERVER + reverse('enterprise-customer-list') + query_string)
+
+        response = self.load_json(response.content)
+        assert response['results'] == [expected_json]
+        assert len(queries) == expected_queries
+
+    def test_enterprise_learner_list_sparse_fieldsets(self):
+        """
+        Make sure listing enterprise learners doesn't look their users or customers up unless they are rendered.
+        """
+        enterprise_customer_user = factories.EnterpriseCustomerUserFactory()
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(
+                settings.TEST_SERVER + reverse('enterprise-learner-list') + '?fields=id,enterprise_customer&expand='
+            )
+
+        response = self.load_json(response.content)
+        assert response['results'] == [{
+            'id': enterprise_customer_user.id,
+            'enterprise_customer': str(enterprise_customer_user.enterprise_customer.uuid),
+        }]
+        # Authentication, the count and the learners.
+        assert len(queries) == 3
+
+    def _walk_cursor_pages(self, url, link):
+        """
+        Follow the given links of the pages of a cursor paginated endpoint, returning the pages and their queries.
+        """
+        pages, page_queries = [], []
+        while url:
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(url)
+            assert response.status_code == 200
+            response = self.load_json(response.content)
+            pages.append(response)
+            page_queries.append([query['sql'] for query in queries.captured_queries])
+            url = response[link]
+        return pages, page_queries
+
+    def test_enterprise_course_enrollment_cursor_pagination(self):
+        """
+        Make sure enrollments can be listed with cursors, in (created, id) order, at a constant cost per page.
+        """
+        enterprise_customer_user = factories.EnterpriseCustomerUserFactory()
+        EnterpriseCourseEnrollment.objects.bulk_create([
+            EnterpriseCourseEnrollment(
+                enterprise_customer_user=enterprise_customer_user,
+                course_id='course-v1:edX+Demo{}+DemoCourse'.format(index),
+                # Groups of enrollments created at the same time are ordered by their IDs.
+                created=self.now - datetime.timedelta(seconds=index // 4),
+            )
+            for index in range(45)
+        ])
+        expected_course_ids = list(
+            EnterpriseCourseEnrollment.objects.order_by('created', 'id').values_list('course_id', flat=True)
+        )
+        url = settings.TEST_SERVER + reverse('enterprise-course-enrollment-list')
+
+        pages, page_queries = self._walk_cursor_pages(url + '?cursor', 'next')
+        assert [len(page['results']) for page in pages] == [10, 10, 10, 10, 5]
+        assert all('count' not in page for page in pages)
+        assert pages[0]['previous'] is None
+        assert [enrollment['course_id'] for page in pages for enrollment in page['results']] == expected_course_ids
+        # Each page costs the same queries, the last page included, none of them counting or skipping results.
+        assert len({len(queries) for queries in page_queries}) == 1
+        assert not any('COUNT(' in sql or 'OFFSET' in sql for queries in page_queries for sql in queries)
+
+        # Going back from the last page lists the same enrollments.
+        backward_pages, _ = self._walk_cursor_pages(pages[-1]['previous'], 'previous')
+        course_ids = [enrollment['course_id'] for enrollment in pages[-1]['results']]
+        for page in backward_pages:
+            course_ids = [enrollment['course_id'] for enrollment in page['results']] + course_ids
+        assert course_ids == expected_course_ids
+        assert backward_pages[-1]['previous'] is None
+
+    @ddt.data('user-data-sharing-consent-list', 'enterprise-course-enrollment-list')
+    def test_cursor_pagination_opt_in(self, url_name):
+        """
+        Make sure the endpoints paginated by cursor keep their page numbers when no cursor is given.
+        """
+        response = self.load_json(self.client.get(settings.TEST_SERVER + reverse(url_name)).content)
+        assert response['count'] == 0
+        response = self.load_json(self.client.get(settings.TEST_SERVER + reverse(url_name) + '?cursor=').content)
+        assert response == {'next': None, 'previous': None, 'results': []}
+
+    @ddt.data('garbage', 'eyJwIjogMX0=', 'eyJwIjogWyJub3QgYSBkYXRlIiwgMV19')
+    def test_invalid_cursor(self, cursor):
+        """
+        Make sure invalid cursors are rejected.
+        """
+        response = self.client.get(
+            settings.TEST_SERVER + reverse('enterprise-course-enrollment-list') + '?cursor=' + cursor
+        )
+        assert response.status_code == 404
+
     def test_post_enterprise_customer_user_logged_out(self):
         """
         Make sure users can't post EnterpriseCustomerUsers when logged out.
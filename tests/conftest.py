@@ -0,0 +1,23 @@
+# -*- coding: utf-8 -*-
+"""
+Common pytest fixtures for the `edx-enterprise` tests.
+"""
+from __future__ import absolute_import, unicode_literals
+
+import pytest
+
+from django.core.cache import cache
+
+from enterprise.cache import reset_response_caches
+
+
+@pytest.fixture(autouse=True)
+def clear_response_caches():
+    """
+    Make sure no test sees API responses, or other values, cached by another test.
+    """
+    reset_response_caches()
+    cache.clear()
+    yield
+    reset_response_caches()
+    cache.clear()
@@ -0,0 +1,207 @@
+# -*- coding: utf-8 -*-
+"""
+Tests for the `edx-enterprise` API response caches.
+"""
+from __future__ import absolute_import, unicode_literals
+
+import unittest
+
+import ddt
+import mock
+from pytest import raises
+
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.test import override_settings
+
+from enterprise.cache import (DjangoResponseCache, LocalResponseCache, get_response_cache, make_cache_key,
+                              reset_response_caches)
+from enterprise.course_catalog_api import CourseCatalogApiClient
+
+
+@ddt.ddt
+class TestResponseCaches(unittest.TestCase):
+    """
+    Tests for the response cache backends.
+    """
+
+    def tearDown(self):
+        super(TestResponseCaches, self).tearDown()
+        reset_response_caches()
+
+    def test_make_cache_key(self):
+        key = make_cache_key('api', 'programs', querystring={'page': 1, 'size': 2})
+        assert key.startswith('api.')
+        assert key == make_cache_key('api', 'programs', querystring={'size': 2, 'page': 1})
+        assert key != make_cache_key('api', 'programs', querystring={'page': 2, 'size': 2})
+        assert key != make_cache_key('api', 'courses', querystring={'page': 1, 'size': 2})
+
+    @ddt.data(LocalResponseCache, DjangoResponseCache)
+    def test_hits_and_misses(self, cache_class):
+        cache = cache_class(timeout=60)
+        cache.clear()
+        assert cache.hit_ratio == 0.0
+        assert cache.get('key') is None
+        cache.set('key', {'value': 1})
+        assert cache.get('key') == {'value': 1}
+        assert cache.get('key') == {'value': 1}
+        assert cache.get('other-key') is None
+        assert (cache.hits, cache.misses) == (2, 2)
+        assert cache.hit_ratio == 0.5
+
+    @ddt.data(LocalResponseCache, DjangoResponseCache)
+    def test_delete(self, cache_class):
+        cache = cache_class(timeout=60)
+        cache.clear()
+        cache.set('key', {'value': 1})
+        cache.set('other-key', {'value': 2})
+        cache.delete('key')
+        cache.delete('missing-key')
+        assert cache.get('key') is None
+        assert cache.get('other-key') == {'value': 2}
+
+    @ddt.data(LocalResponseCache, DjangoResponseCache)
+    def test_disabled(self, cache_class):
+        cache = cache_class(timeout=0)
+        cache.set('key', {'value': 1})
+        assert cache.get('key') is None
+        assert (cache.hits, cache.misses) == (0, 0)
+
+    def test_get_or_load(self):
+        cache = LocalResponseCache()
+        load = mock.Mock(return_value=[{'title': 'program'}])
+        assert cache.get_or_load('key', load) == [{'title': 'program'}]
+        assert cache.get_or_load('key', load) == [{'title': 'program'}]
+        assert load.call_count == 1
+
+    def test_get_or_load_does_not_cache_empty_results(self):
+        cache = LocalResponseCache()
+        load = mock.Mock(return_value=[])
+        assert cache.get_or_load('key', load) == []
+        assert cache.get_or_load('key', load) == []
+        assert load.call_count == 2
+
+    def test_get_or_load_refresh(self):
+        cache = LocalResponseCache()
+        cache.set('key', [{'title': 'old program'}])
+        load = mock.Mock(return_value=[{'title': 'program'}])
+        assert cache.get_or_load('key', load, refresh=True) == [{'title': 'program'}]
+        assert cache.get('key') == [{'title': 'program'}]
+
+    def test_get_or_load_without_storing(self):
+        cache = LocalResponseCache()
+        load = mock.Mock(return_value=[{'title': 'program'}])
+        assert cache.get_or_load('key', load, store=False) == [{'title': 'program'}]
+        assert cache.get('key') is None
+
+    def test_django_cache_clear_keeps_other_keys(self):
+        django_cache = caches['default']
+        django_cache.set('unrelated-key', 'value')
+        cache = DjangoResponseCache(timeout=60, namespace='test-responses')
+        other_cache = DjangoResponseCache(timeout=60, namespace='other-responses')
+        cache.set('key', {'value': 1})
+        other_cache.set('key', {'value': 2})
+
+        cache.clear()
+
+        assert cache.get('key') is None
+        assert other_cache.get('key') == {'value': 2}
+        assert django_cache.get('unrelated-key') == 'value'
+        cache.set('key', {'value': 3})
+        assert cache.get('key') == {'value': 3}
+
+    def test_local_cache_expiry(self):
+        cache = LocalResponseCache(timeout=10)
+        with mock.patch('enterprise.cache.time.time', return_value=1000):
+            cache.set('key', 'value')
+        with mock.patch('enterprise.cache.time.time', return_value=1009):
+            assert cache.get('key') == 'value'
+        with mock.patch('enterprise.cache.time.time', return_value=1010):
+            assert cache.get('key') is None
+        assert len(cache) == 0
+
+    def test_local_cache_lru_eviction(self):
+        cache = LocalResponseCache(max_size=2)
+        cache.set('first', 1)
+        cache.set('second', 2)
+        # Reading "first" makes "second" the least recently used entry.
+        assert cache.get('first') == 1
+        cache.set('third', 3)
+        assert len(cache) == 2
+        assert cache.get('second') is None
+        assert cache.get('first') == 1
+        assert cache.get('third') == 3
+
+    def test_local_cache_returns_copies(self):
+        cache = LocalResponseCache()
+        value = {'results': [{'title': 'course'}]}
+        cache.set('key', value)
+        value['results'].append({'title': 'another course'})
+        cache.get('key')['results'][0]['title'] = 'modified'
+        assert cache.get('key') == {'results': [{'title': 'course'}]}
+
+    def test_get_response_cache_default(self):
+        cache = get_response_cache('api')
+        assert isinstance(cache, LocalResponseCache)
+        assert cache is get_response_cache('api')
+        assert cache is not get_response_cache('other-api')
+
+    @override_settings(ENTERPRISE_API_CACHE_BACKEND='django', ENTERPRISE_API_CACHE_TIMEOUT=30)
+    def test_get_response_cache_django(self):
+        cache = get_response_cache('api')
+        assert isinstance(cache, DjangoResponseCache)
+        assert cache.timeout == 30
+
+    @override_settings(ENTERPRISE_API_CACHE_BACKEND='local', ENTERPRISE_API_CACHE_MAX_SIZE=5)
+    def test_get_response_cache_local(self):
+        cache = get_response_cache('api')
+        assert isinstance(cache, LocalResponseCache)
+        assert cache.max_size == 5
+
+    @override_settings(ENTERPRISE_API_CACHE_BACKEND='redis')
+    def test_get_response_cache_invalid_backend(self):
+        with raises(ValueError):
+            get_response_cache('api')
+
+
+class TestCourseCatalogApiCaching(unittest.TestCase):
+    """
+    Tests for caching of Course Catalog API responses.
+    """
+
+    def setUp(self):
+        super(TestCourseCatalogApiCaching, self).setUp()
+        for name in ('CatalogIntegration', 'course_discovery_api_client'):
+            patcher = mock.patch('enterprise.course_catalog_api.' + name)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        patcher = mock.patch('enterprise.course_catalog_api.get_edx_api_data')
+        self.get_data_mock = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.user = mock.Mock(spec=User)
+
+    def tearDown(self):
+        super(TestCourseCatalogApiCaching, self).tearDown()
+        reset_response_caches()
+
+    def test_responses_are_cached(self):
+        self.get_data_mock.return_value = {'key': 'course-v1:edX+DemoX+Demo_Course'}
+
+        # Responses are shared by all the clients of the same user.
+        CourseCatalogApiClient(self.user).get_course_run('course-v1:edX+DemoX+Demo_Course')
+        response = CourseCatalogApiClient(self.user).get_course_run('course-v1:edX+DemoX+Demo_Course')
+
+        assert response == {'key': 'course-v1:edX+DemoX+Demo_Course'}
+        assert self.get_data_mock.call_count == 1
+        assert CourseCatalogApiClient(self.user).response_cache.hits == 1
+
+    def test_cache_key_includes_request_details(self):
+        self.get_data_mock.return_value = {'results': []}
+        client = CourseCatalogApiClient(self.user)
+
+        client.get_paginated_catalog_courses(1, page=1)
+        client.get_paginated_catalog_courses(1, page=2)
+        client.get_paginated_catalog_courses(2, page=1)
+        CourseCatalogApiClient(mock.Mock(spec=User)).get_paginated_catalog_courses(1, page=1)
+
+        assert self.get_data_mock.call_count == 4
@@ -5,6 +5,7 @@ Tests for the `edx-enterprise` course catalogs api module.
 
 from __future__ import absolute_import, unicode_literals, with_statement
 
+import threading
 import unittest
 
 import ddt
@@ -12,8 +13,10 @@ import mock
 from pytest import raises
 
 from django.contrib.auth.models import User
+from django.test import override_settings
 
-from enterprise.course_catalog_api import CourseCatalogApiClient
+from enterprise.cache import reset_response_caches
+from enterprise.course_catalog_api import CourseCatalogApiClient, ProgramIndex
 from enterprise.utils import CourseCatalogApiError, NotConnectedToOpenEdX
 
 
@@ -171,6 +174,55 @@ class TestCourseCatalogApi(unittest.TestCase):
 
         assert self.api.get_paginated_catalog_courses(catalog_id=catalog_id) == []
 
+    def test_iter_catalog_courses(self):
+        pages = {
+            1: {"next": "page-2", "results": [{"key": "course-1"}, {"key": "course-2"}]},
+            2: {"next": "page-3", "results": [{"key": "course-3"}]},
+            3: {"next": None, "results": [{"key": "course-4"}]},
+        }
+        self.get_data_mock.side_effect = lambda *args, **kwargs: pages[kwargs["querystring"]["page"]]
+
+        courses = [course["key"] for course in self.api.iter_catalog_courses(catalog_id=1)]
+
+        assert courses == ["course-1", "course-2", "course-3", "course-4"]
+        assert self.get_data_mock.call_count == 3
+        for __, kwargs in self.get_data_mock.call_args_list:
+            assert kwargs["traverse_pagination"] is False
+        # Pages are not cached.
+        assert not self.api.response_cache.hits
+        list(self.api.iter_catalog_courses(catalog_id=1))
+        assert self.get_data_mock.call_count == 6
+
+    def test_iter_catalog_courses_prefetches_next_page(self):
+        pages = {
+            1: {"next": "page-2", "results": [{"key": "course-1"}]},
+            2: {"next": None, "results": [{"key": "course-2"}]},
+        }
+        page_2_requested = threading.Event()
+
+        def get_page(*args, **kwargs):  # pylint: disable=unused-argument
+            """
+            Return the requested page, recording when the second one is requested.
+            """
+            page = kwargs["querystring"]["page"]
+            if page == 2:
+                page_2_requested.set()
+            return pages[page]
+
+        self.get_data_mock.side_effect = get_page
+        courses = self.api.iter_catalog_courses(catalog_id=1)
+
+        assert next(courses) == {"key": "course-1"}
+        # The second page is requested while the first one is still being consumed.
+        assert page_2_requested.wait(5)
+        assert list(courses) == [{"key": "course-2"}]
+
+    @ddt.data(*EMPTY_RESPONSES)
+    def test_iter_catalog_courses_empty_response(self, response):
+        self.get_data_mock.return_value = response
+
+        assert list(self.api.iter_catalog_courses(catalog_id=1)) == []
+
     @ddt.data(
         "course-v1:JediAcademy+AppliedTelekinesis+T1",
         "course-v1:TrantorAcademy+Psychohistory101+T1",
@@ -200,17 +252,28 @@ class TestCourseCatalogApi(unittest.TestCase):
     @ddt.data("Apollo", "Star Wars", "mk Ultra")
     def test_get_program_by_uuid(self, program_id):
         response_dict = {"very": "complex", "json": {"with": " nested object"}}
-        self.get_data_mock.return_value = response_dict
+        # The program is not in the programs listing, so it is requested on its own.
+        self.get_data_mock.side_effect = lambda *args, **kwargs: response_dict if "resource_id" in kwargs else []
 
         actual_result = self.api.get_program_by_uuid(program_id)
 
-        assert self.get_data_mock.call_count == 1
+        assert self.get_data_mock.call_count == 2
         resource, resource_id = self._get_important_parameters(self.get_data_mock)
 
         assert resource == "programs"
         assert resource_id is program_id
         assert actual_result == response_dict
 
+    def test_get_program_by_uuid_indexed(self):
+        self.get_data_mock.return_value = [{'title': "Apollo", "uuid": "Apollo11"}]
+
+        assert self.api.get_program_by_uuid("Apollo11") == {'title': "Apollo", "uuid": "Apollo11"}
+        assert self.api.get_program_by_uuid("Apollo11") == {'title': "Apollo", "uuid": "Apollo11"}
+
+        # Only the programs listing was requested, once.
+        assert self.get_data_mock.call_count == 1
+        assert self._get_important_parameters(self.get_data_mock) == ("programs", None)
+
     @ddt.data(*EMPTY_RESPONSES)
     def test_get_program_by_uuid_empty_response(self, response):
         self.get_data_mock.return_value = response
@@ -253,6 +316,69 @@ class TestCourseCatalogApi(unittest.TestCase):
         with raises(CourseCatalogApiError):
             self.api.get_program_by_title("Apollo")
 
+    def test_get_program_by_title_uses_program_index(self):
+        self.get_data_mock.return_value = [{'title': "Star Wars"}, {'title': "Apollo", "uuid": "Apollo11"}]
+
+        assert self.api.get_program_by_title("Apollo") == {'title': "Apollo", "uuid": "Apollo11"}
+        # Both lookups are served by the same index, shared with the other clients of the same user.
+        assert CourseCatalogApiClient(self.user_mock).get_program_by_title("Star Wars") == {'title': "Star Wars"}
+        assert self.get_data_mock.call_count == 1
+
+    def test_get_program_by_title_returns_copy(self):
+        self.get_data_mock.return_value = [{'title': "Apollo", "uuid": "Apollo11"}]
+
+        self.api.get_program_by_title("Apollo")['uuid'] = "Apollo13"
+
+        assert self.api.get_program_by_title("Apollo") == {'title': "Apollo", "uuid": "Apollo11"}
+
+    def test_empty_program_index_not_cached(self):
+        self.get_data_mock.return_value = []
+        assert self.api.get_program_by_title("Apollo") is None
+
+        # Once the programs listing is available again, the index is built from it.
+        self.get_data_mock.return_value = [{'title': "Apollo", "uuid": "Apollo11"}]
+        assert self.api.get_program_by_title("Apollo") == {'title': "Apollo", "uuid": "Apollo11"}
+
+    def test_refresh_program_index(self):
+        self.get_data_mock.return_value = [{'title': "Apollo", "uuid": "Apollo11"}]
+        self.api.get_program_by_title("Apollo")
+        self.get_data_mock.return_value = [{'title': "Apollo", "uuid": "Apollo12"}]
+
+        assert self.api.get_program_by_title("Apollo") == {'title': "Apollo", "uuid": "Apollo11"}
+        self.api.get_program_index(refresh=True)
+        assert self.api.get_program_by_title("Apollo") == {'title': "Apollo", "uuid": "Apollo12"}
+        assert self.get_data_mock.call_count == 2
+
+    def test_program_index_expiry(self):
+        self.get_data_mock.return_value = [{'title': "Apollo", "uuid": "Apollo11"}]
+        reset_response_caches()
+        with override_settings(ENTERPRISE_PROGRAM_INDEX_TIMEOUT=10):
+            with mock.patch('enterprise.cache.time.time', return_value=1000):
+                self.api.get_program_index()
+            with mock.patch('enterprise.cache.time.time', return_value=1009):
+                self.api.get_program_index()
+            assert self.get_data_mock.call_count == 1
+            with mock.patch('enterprise.cache.time.time', return_value=1010):
+                self.api.get_program_index()
+        # The programs listing response is still cached, so an expired index is rebuilt without an API call.
+        assert self.get_data_mock.call_count == 1
+
+    def test_program_index(self):
+        index = ProgramIndex([
+            {'title': "Apollo", "uuid": "Apollo11"},
+            {'title': "Apollo", "uuid": "Apollo12"},
+            {'title': "Star Wars"},
+        ])
+
+        assert len(index) == 3
+        assert index.get_by_title("Apollo") == [
+            {'title': "Apollo", "uuid": "Apollo11"},
+            {'title': "Apollo", "uuid": "Apollo12"},
+        ]
+        assert index.get_by_title("mk Ultra") == []
+        assert index.get_by_uuid("Apollo12") == {'title': "Apollo", "uuid": "Apollo12"}
+        assert index.get_by_uuid("Apollo13") is None
+
     @ddt.unpack
     @ddt.data(
         # single run
@@ -281,3 +407,61 @@ class TestCourseCatalogApi(unittest.TestCase):
 
         actual_result = self.api.get_common_course_modes(course_runs)
         assert actual_result == expected_result
+
+    @ddt.data(1, 4)
+    def test_iter_course_runs(self, max_workers):
+        self.get_data_mock.side_effect = lambda *args, **kwargs: self._make_course_run(kwargs["resource_id"], "prof")
+
+        with override_settings(ENTERPRISE_CATALOG_API_MAX_WORKERS=max_workers):
+            course_runs = dict(self.api.iter_course_runs(["c1", "c2", "c3"]))
+
+        assert course_runs == {key: self._make_course_run(key, "prof") for key in ("c1", "c2", "c3")}
+        assert self.get_data_mock.call_count == 3
+
+    def test_iter_course_runs_client_per_thread(self):
+        api_clients = {}
+
+        def get_course_run(*args, **kwargs):  # pylint: disable=unused-argument
+            """
+            Record the API client used by each thread.
+            """
+            api_clients.setdefault(threading.current_thread().ident, set()).add(kwargs["api"])
+            return self._make_course_run(kwargs.get("resource_id"), "prof")
+
+        self.get_data_mock.side_effect = get_course_run
+        self.api_factory_mock.side_effect = lambda user: mock.Mock()
+        self.api = CourseCatalogApiClient(self.user_mock)
+
+        with override_settings(ENTERPRISE_CATALOG_API_MAX_WORKERS=4):
+            assert len(dict(self.api.iter_course_runs(["c{}".format(index) for index in range(8)]))) == 8
+        self.api.get_all_catalogs()
+
+        # Each thread reuses its own client; the calling thread keeps the client built with the API object.
+        assert all(len(clients) == 1 for clients in api_clients.values())
+        all_clients = [client for clients in api_clients.values() for client in clients]
+        assert len(set(all_clients)) == len(all_clients)
+        assert api_clients[threading.current_thread().ident] == {self.api.client}
+
+    def test_get_common_course_modes_cancels_pending_requests(self):
+        release = threading.Event()
+
+        def get_course_run(*args, **kwargs):  # pylint: disable=unused-argument
+            """
+            Return an empty course run for "c1"; block fetching the others until the test releases them.
+            """
+            resource_id = kwargs.get("resource_id")
+            if resource_id != "c1":
+                release.wait(5)
+            return self._make_course_run(resource_id)
+
+        self.get_data_mock.side_effect = get_course_run
+
+        try:
+            with override_settings(ENTERPRISE_CATALOG_API_MAX_WORKERS=2):
+                assert self.api.get_common_course_modes(["c1", "c2", "c3", "c4"]) == set()
+        finally:
+            release.set()
+
+        # Both workers were busy with "c2" and "c3" (if started at all) when "c1" emptied the intersection.
+        requested = {kwargs.get("resource_id") for __, kwargs in self.get_data_mock.call_args_list}
+        assert "c4" not in requested
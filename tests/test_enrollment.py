@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+"""
+Tests for the `edx-enterprise` enrollment functions.
+"""
+from __future__ import absolute_import, unicode_literals
+
+import datetime
+import unittest
+
+from enterprise.enrollment import get_course_runs_from_program, get_earliest_start_date_from_program
+
+
+class TestGetCourseRunsFromProgram(unittest.TestCase):
+    """
+    Tests for :method:`get_course_runs_from_program`.
+    """
+    def test_get_course_runs_from_program_no_courses(self):
+        program = {}
+        result = get_course_runs_from_program(program)
+        assert result == set()
+
+    def test_get_course_runs_from_program_no_runs(self):
+        program = {"courses": [{}, {}, {}]}
+        result = get_course_runs_from_program(program)
+        assert result == set()
+
+    def test_get_course_runs_from_program_no_keys(self):
+        program = {
+            "courses": [
+                {"course_runs": []},
+                {"course_runs": []},
+            ]
+        }
+        result = get_course_runs_from_program(program)
+        assert result == set()
+
+    def test_get_course_runs_from_program_normal(self):
+        program = {
+            "courses": [
+                {"course_runs": [
+                    {"key": "1"},
+                    {"key": None}
+                ]},
+                {"course_runs": [
+                    {"key": "CourseRunKey"}
+                ]},
+            ]
+        }
+        result = get_course_runs_from_program(program)
+        assert result == {"1", "CourseRunKey"}
+
+
+class TestGetEarliestStartDateFromProgram(unittest.TestCase):
+    """
+    Tests for :method:`get_earliest_start_date_from_program`.
+    """
+    def test_earliest_start_date_no_courses(self):
+        program = {}
+        assert get_earliest_start_date_from_program(program) is None
+
+    def test_earliest_start_date_no_course_runs(self):
+        program = {"courses": [{"course_runs": []}]}
+        assert get_earliest_start_date_from_program(program) is None
+
+    def test_earliest_start_date(self):
+        program = {
+            "courses": [
+                {
+                    "course_runs": [
+                        {
+                            "start": "2016-01-01T00:00:00Z",
+                        },
+                        {
+                            "start": "2017-01-01T00:00:00Z",
+                        }
+                    ]
+                }
+            ]
+        }
+        assert get_earliest_start_date_from_program(program) == datetime.datetime.strptime('2016-01-01', '%Y-%m-%d')
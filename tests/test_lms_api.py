@@ -5,12 +5,17 @@ Tests for enterprise.lms_api.
 from __future__ import absolute_import, unicode_literals, with_statement
 
 import json
+import threading
 
+import mock
+import requests
 import responses
 from pytest import raises
 from requests.compat import urljoin
+from six.moves.urllib.parse import parse_qs, urlparse  # pylint: disable=import-error
 
 from django.conf import settings
+from django.test import override_settings
 
 from enterprise import lms_api
 from enterprise.utils import NotConnectedToEdX
@@ -184,3 +189,305 @@ def test_get_remote_id():
     client = lms_api.ThirdPartyAuthApiClient()
     actual_response = client.get_remote_id(provider_id, username)
     assert actual_response == "LukeIamYrFather"
+
+
+@responses.activate  # pylint: disable=no-member
+def test_get_remote_ids():
+    provider_id = "DeathStar"
+    usernames = ["DarthVadar", "Obi-Wan", "Hans", "Leia"]
+    users_by_page = {
+        "1": [
+            {"username": "DarthVadar", "remote_id": "LukeIamYrFather"},
+            {"username": "Obi-Wan", "remote_id": "Kenobi"},
+        ],
+        "2": [
+            {"username": "DarthVadar", "remote_id": "JamesEarlJones"},
+            {"username": "Chewbacca", "remote_id": "Wookiee"},
+        ],
+    }
+
+    def users_callback(request):
+        """
+        Return a page of the user mapping for the requested usernames.
+        """
+        query = parse_qs(urlparse(request.url).query)
+        page = query["page"][0]
+        results = [row for row in users_by_page.get(page, []) if row["username"] in query["username"]]
+        response = {"results": results, "next": "next-page-url" if page == "1" else None}
+        return 200, {}, json.dumps(response)
+
+    responses.add_callback(  # pylint: disable=no-member
+        responses.GET,  # pylint: disable=no-member
+        _url("third_party_auth", "providers/{provider}/users".format(provider=provider_id)),
+        callback=users_callback,
+        content_type="application/json",
+    )
+    client = lms_api.ThirdPartyAuthApiClient()
+    actual_response = client.get_remote_ids(provider_id, usernames, batch_size=2)
+    assert actual_response == {"DarthVadar": "LukeIamYrFather", "Obi-Wan": "Kenobi"}
+    # Two batches of usernames, with two pages each.
+    assert len(responses.calls) == 4  # pylint: disable=no-member
+
+
+@responses.activate  # pylint: disable=no-member
+def test_get_remote_ids_not_found():
+    provider_id = "DeathStar"
+    responses.add(  # pylint: disable=no-member
+        responses.GET,  # pylint: disable=no-member
+        _url("third_party_auth", "providers/{provider}/users".format(provider=provider_id)),
+        status=404
+    )
+    client = lms_api.ThirdPartyAuthApiClient()
+    actual_response = client.get_remote_ids(provider_id, ["DarthVadar"])
+    assert actual_response == {}
+
+
+def test_lms_api_clients_share_session():
+    lms_api.reset_session_registry()
+    session = lms_api.EnrollmentApiClient().client._store["session"]  # pylint: disable=protected-access
+    assert lms_api.CourseApiClient().client._store["session"] is session  # pylint: disable=protected-access
+    assert session.headers['X-Edx-Api-Key'] == settings.EDX_API_KEY
+
+    # Other threads get their own session, but share the same connection pool.
+    thread_sessions = []
+    thread = threading.Thread(target=lambda: thread_sessions.append(lms_api.get_session_registry().get_session()))
+    thread.start()
+    thread.join()
+    assert thread_sessions[0] is not session
+    assert thread_sessions[0].get_adapter(settings.LMS_ROOT_URL) is session.get_adapter(settings.LMS_ROOT_URL)
+
+
+@override_settings(
+    ENTERPRISE_LMS_API_POOL_CONNECTIONS=2,
+    ENTERPRISE_LMS_API_POOL_MAXSIZE=4,
+    ENTERPRISE_LMS_API_POOL_BLOCK=True,
+    ENTERPRISE_LMS_API_KEEP_ALIVE=False,
+)
+def test_session_registry_settings():
+    lms_api.reset_session_registry()
+    registry = lms_api.get_session_registry()
+    try:
+        assert registry is lms_api.get_session_registry()
+        assert registry.adapter._pool_connections == 2  # pylint: disable=protected-access
+        assert registry.adapter._pool_maxsize == 4  # pylint: disable=protected-access
+        assert registry.adapter._pool_block is True  # pylint: disable=protected-access
+        assert registry.get_session().headers['Connection'] == 'close'
+    finally:
+        lms_api.reset_session_registry()
+
+
+def test_session_registry_stats():
+    registry = lms_api.LmsSessionRegistry()
+    assert registry.get_stats() == {'requests': 0, 'connections': 0, 'reused': 0}
+
+    lms_pool = registry.adapter.poolmanager.connection_from_url(settings.LMS_ROOT_URL)
+    lms_pool.num_requests, lms_pool.num_connections = 10, 2
+    other_pool = registry.adapter.poolmanager.connection_from_url('https://other.example.com')
+    other_pool.num_requests, other_pool.num_connections = 3, 1
+
+    assert registry.get_stats() == {'requests': 13, 'connections': 3, 'reused': 10}
+    registry.close()
+
+
+@responses.activate  # pylint: disable=no-member
+def test_get_course_names():
+    course_ids = ["course-v1:edX+DemoX+Demo_Course", "course-v1:edX+Missing+Course", "course-v1:edX+Other+Course"]
+    responses.add(  # pylint: disable=no-member
+        responses.GET,  # pylint: disable=no-member
+        _url("courses", "courses/course-v1:edX+DemoX+Demo_Course/"),
+        json={"name": "edX Demo Course"},
+    )
+    responses.add(  # pylint: disable=no-member
+        responses.GET,  # pylint: disable=no-member
+        _url("courses", "courses/course-v1:edX+Missing+Course/"),
+        status=404,
+    )
+    responses.add(  # pylint: disable=no-member
+        responses.GET,  # pylint: disable=no-member
+        _url("courses", "courses/course-v1:edX+Other+Course/"),
+        json={"name": "Other Course"},
+    )
+
+    expected_names = {
+        "course-v1:edX+DemoX+Demo_Course": "edX Demo Course",
+        "course-v1:edX+Other+Course": "Other Course",
+    }
+    assert lms_api.get_course_names(course_ids + course_ids[:1]) == expected_names
+    assert len(responses.calls) == 3  # pylint: disable=no-member
+
+    # Fetched names are cached; only the missing one is requested again.
+    assert lms_api.get_course_names(course_ids) == expected_names
+    assert len(responses.calls) == 4  # pylint: disable=no-member
+
+
+def test_get_course_names_timeout():
+    release = threading.Event()
+
+    def fetch_course_name(course_id):
+        """
+        Return the name of the course immediately, except for the slow course.
+        """
+        if course_id == "course-v1:edX+Slow+Course":
+            release.wait(5)
+        return "Name of " + course_id
+
+    with mock.patch("enterprise.lms_api._fetch_course_name", side_effect=fetch_course_name):
+        try:
+            course_names = lms_api.get_course_names(
+                ["course-v1:edX+DemoX+Demo_Course", "course-v1:edX+Slow+Course"], timeout=0.1
+            )
+        finally:
+            release.set()
+
+    assert course_names == {"course-v1:edX+DemoX+Demo_Course": "Name of course-v1:edX+DemoX+Demo_Course"}
+
+
+@responses.activate  # pylint: disable=no-member
+def test_enrollment_executor():
+    def enrollment_callback(request):
+        """
+        Enroll every user but the unknown one.
+        """
+        body = json.loads(request.body)
+        if body["user"] == "unknown_user":
+            return 400, {}, json.dumps({"message": "Unknown user"})
+        return 200, {}, json.dumps(body)
+
+    responses.add_callback(  # pylint: disable=no-member
+        responses.POST,  # pylint: disable=no-member
+        _url("enrollment", "enrollment"),
+        callback=enrollment_callback,
+        content_type="application/json",
+    )
+    course_ids = ["course-v1:edX+DemoX+Demo_Course", "course-v1:edX+Other+Course"]
+    executor = lms_api.EnrollmentExecutor(max_workers=4, rate_limit=0)
+    succeeded, failed = executor.enroll(
+        (username, course_id, "audit") for username in ["some_user", "unknown_user"] for course_id in course_ids
+    )
+
+    assert succeeded == {("some_user", course_id) for course_id in course_ids}
+    assert failed == {("unknown_user", course_id): "Unknown user" for course_id in course_ids}
+    # Client errors are not retried.
+    assert len(responses.calls) == 4  # pylint: disable=no-member
+
+
+@responses.activate  # pylint: disable=no-member
+@mock.patch("enterprise.lms_api.time.sleep")
+def test_enrollment_executor_retries_server_errors(sleep_mock):
+    statuses = [503, 502, 200]
+    responses.add_callback(  # pylint: disable=no-member
+        responses.POST,  # pylint: disable=no-member
+        _url("enrollment", "enrollment"),
+        callback=lambda request: (statuses.pop(0), {}, "{}"),
+        content_type="application/json",
+    )
+
+    executor = lms_api.EnrollmentExecutor(max_workers=1, max_retries=3, retry_backoff=0.5, rate_limit=0)
+    succeeded, failed = executor.enroll([("some_user", "course-v1:edX+DemoX+Demo_Course", "audit")])
+
+    assert succeeded == {("some_user", "course-v1:edX+DemoX+Demo_Course")}
+    assert failed == {}
+    assert len(responses.calls) == 3  # pylint: disable=no-member
+    assert [call[0][0] for call in sleep_mock.call_args_list] == [0.5, 1.0]
+
+
+@responses.activate  # pylint: disable=no-member
+@mock.patch("enterprise.lms_api.time.sleep")
+def test_enrollment_executor_gives_up_on_server_errors(sleep_mock):
+    responses.add(responses.POST, _url("enrollment", "enrollment"), status=500)  # pylint: disable=no-member
+
+    executor = lms_api.EnrollmentExecutor(max_workers=1, max_retries=2, retry_backoff=1, rate_limit=0)
+    succeeded, failed = executor.enroll([("some_user", "course-v1:edX+DemoX+Demo_Course", "audit")])
+
+    assert succeeded == set()
+    assert failed == {("some_user", "course-v1:edX+DemoX+Demo_Course"): "No error message provided"}
+    assert len(responses.calls) == 3  # pylint: disable=no-member
+    assert sleep_mock.call_count == 2
+
+
+@mock.patch("enterprise.lms_api.time.sleep")
+@mock.patch("enterprise.lms_api.time.time", return_value=100.0)
+def test_host_rate_limiter(time_mock, sleep_mock):  # pylint: disable=unused-argument
+    rate_limiter = lms_api.HostRateLimiter(rate=4)
+    rate_limiter.wait("http://lms.example.com/api/enrollment/v1/enrollment")
+    rate_limiter.wait("http://lms.example.com/api/enrollment/v1/enrollment")
+    rate_limiter.wait("http://other.example.com/api/enrollment/v1/enrollment")
+    rate_limiter.wait("http://lms.example.com/api/enrollment/v1/enrollment")
+
+    # Only the requests to the same host are spaced out.
+    assert [call[0][0] for call in sleep_mock.call_args_list] == [0.25, 0.5]
+
+
+@mock.patch("enterprise.lms_api.time.sleep")
+def test_host_rate_limiter_unlimited(sleep_mock):
+    rate_limiter = lms_api.HostRateLimiter(rate=0)
+    for __ in range(3):
+        rate_limiter.wait("http://lms.example.com/api/enrollment/v1/enrollment")
+    assert not sleep_mock.called
+
+
+@responses.activate  # pylint: disable=no-member
+@mock.patch("enterprise.lms_api.time.sleep")
+def test_enrollment_executor_retries_connection_errors(sleep_mock):
+    outcomes = [requests.exceptions.ConnectionError("Connection refused"), requests.exceptions.Timeout("Timed out")]
+
+    def enrollment_callback(request):  # pylint: disable=unused-argument
+        """
+        Fail to connect twice, then enroll the user.
+        """
+        if outcomes:
+            raise outcomes.pop(0)
+        return 200, {}, "{}"
+
+    responses.add_callback(  # pylint: disable=no-member
+        responses.POST,  # pylint: disable=no-member
+        _url("enrollment", "enrollment"),
+        callback=enrollment_callback,
+        content_type="application/json",
+    )
+
+    executor = lms_api.EnrollmentExecutor(max_workers=1, max_retries=3, retry_backoff=0.5, rate_limit=0)
+    succeeded, failed = executor.enroll([("some_user", "course-v1:edX+DemoX+Demo_Course", "audit")])
+
+    assert succeeded == {("some_user", "course-v1:edX+DemoX+Demo_Course")}
+    assert failed == {}
+    assert [call[0][0] for call in sleep_mock.call_args_list] == [0.5, 1.0]
+
+
+@responses.activate  # pylint: disable=no-member
+@mock.patch("enterprise.lms_api.time.sleep")
+def test_enrollment_executor_gives_up_on_connection_errors(sleep_mock):
+    def enrollment_callback(request):
+        """
+        Fail to connect to the Enrollment API for one of the courses only.
+        """
+        if json.loads(request.body)["course_details"]["course_id"] == "course-v1:edX+Other+Course":
+            raise requests.exceptions.ConnectionError("Connection refused")
+        return 200, {}, "{}"
+
+    responses.add_callback(  # pylint: disable=no-member
+        responses.POST,  # pylint: disable=no-member
+        _url("enrollment", "enrollment"),
+        callback=enrollment_callback,
+        content_type="application/json",
+    )
+
+    course_ids = ["course-v1:edX+DemoX+Demo_Course", "course-v1:edX+Other+Course"]
+    executor = lms_api.EnrollmentExecutor(max_workers=2, max_retries=2, retry_backoff=1, rate_limit=0)
+    succeeded, failed = executor.enroll(("some_user", course_id, "audit") for course_id in course_ids)
+
+    assert succeeded == {("some_user", "course-v1:edX+DemoX+Demo_Course")}
+    assert failed == {
+        ("some_user", "course-v1:edX+Other+Course"): "Unable to reach the Enrollment API: Connection refused",
+    }
+    assert sleep_mock.call_count == 2
+
+
+def test_enrollment_executors_share_rate_limiter():
+    first_executor = lms_api.EnrollmentExecutor(max_workers=1, rate_limit=5)
+    second_executor = lms_api.EnrollmentExecutor(max_workers=1, rate_limit=5)
+    other_executor = lms_api.EnrollmentExecutor(max_workers=1, rate_limit=10)
+
+    assert first_executor.rate_limiter is second_executor.rate_limiter
+    assert first_executor.rate_limiter is lms_api.get_host_rate_limiter(5)
+    assert other_executor.rate_limiter is not first_executor.rate_limiter
@@ -122,20 +122,21 @@ def test_transmit_learner_data(caplog, command_args):
         command_args['enterprise_customer'] = testcase.enterprise_customer.uuid
 
     with mock.patch('enterprise.models.ThirdPartyAuthApiClient') as mock_third_party_api:
-        mock_third_party_api.return_value.get_remote_id.return_value = 'remote-r2d2'
+        mock_third_party_api.return_value.get_remote_ids.return_value = {testcase.user.username: 'remote-r2d2'}
 
         with mock.patch('integrated_channels.integrated_channel.models.CourseKey') as mock_course_key:
             mock_course_key.from_string.return_value = None
 
             with mock.patch('integrated_channels.integrated_channel.models.GeneratedCertificate') as mock_certificate:
                 # Mark course completion with a mock certificate.
-                mock_certificate.eligible_certificates.get.return_value = mock.MagicMock(
+                mock_certificate.eligible_certificates.filter.return_value = [mock.MagicMock(
                     user=testcase.user,
-                    course_id=testcase.course_id,
+                    user_id=testcase.user.id,
+                    course_id=mock_course_key.from_string.return_value,
                     grade="A-",
                     created_date=datetime(2017, 1, 2, 3, 4, 5, tzinfo=timezone.utc),
                     status="downloadable",
-                )
+                )]
 
                 # Call the management command
                 call_command('transmit_learner_data', **command_args)
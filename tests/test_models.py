@@ -6,7 +6,7 @@ Tests for the `edx-enterprise` models module.
 from __future__ import absolute_import, unicode_literals, with_statement
 
 import unittest
-from datetime import datetime
+from datetime import datetime, timedelta
 from operator import itemgetter
 
 import ddt
@@ -19,17 +19,22 @@ from integrated_channels.sap_success_factors.models import (CatalogTransmissionA
                                                             SAPSuccessFactorsGlobalConfiguration)
 from pytest import mark, raises
 
+from django.contrib.auth.models import User
 from django.contrib.sites.models import Site
 from django.core.exceptions import ValidationError
 from django.core.files import File
 from django.core.files.storage import Storage
+from django.db import connection
+from django.db.models import Q
+from django.template import Template
+from django.test.utils import CaptureQueriesContext
 from django.utils import timezone
 
-from enterprise.models import (EnrollmentNotificationEmailTemplate, EnterpriseCourseEnrollment, EnterpriseCustomer,
-                               EnterpriseCustomerBrandingConfiguration, EnterpriseCustomerEntitlement,
-                               EnterpriseCustomerUser, PendingEnterpriseCustomerUser, UserDataSharingConsentAudit,
-                               logo_path)
-from enterprise.utils import NotConnectedToOpenEdX
+from enterprise.models import (EnrollmentJob, EnrollmentJobChunk, EnrollmentNotificationEmailTemplate,
+                               EnterpriseCourseEnrollment, EnterpriseCustomer, EnterpriseCustomerBrandingConfiguration,
+                               EnterpriseCustomerEntitlement, EnterpriseCustomerUser, PendingEnrollment,
+                               PendingEnterpriseCustomerUser, UserDataSharingConsentAudit, logo_path)
+from enterprise.utils import NotConnectedToOpenEdX, get_enterprise_context_for_user
 from test_utils.factories import (EnterpriseCourseEnrollmentFactory, EnterpriseCustomerEntitlementFactory,
                                   EnterpriseCustomerFactory, EnterpriseCustomerIdentityProviderFactory,
                                   EnterpriseCustomerUserFactory, PendingEnrollmentFactory,
@@ -69,6 +74,114 @@ class TestPendingEnrollment(unittest.TestCase):
         mock_course_enrollment.enroll.assert_called_once_with(self.user, None, mode='audit', check_access=True)
         mock_course_key.from_string.assert_called_once_with(self.enrollment.course_id)
 
+    def test_bulk_upsert(self):
+        other_pending_link = PendingEnterpriseCustomerUserFactory()
+        other_course_id = 'course-v1:edX+Other+Course'
+        enrollments = [
+            (self.enrollment.user_id, self.enrollment.course_id, 'verified'),
+            (self.enrollment.user_id, other_course_id, 'verified'),
+            (other_pending_link.id, other_course_id, 'verified'),
+        ]
+
+        with CaptureQueriesContext(connection) as queries:
+            PendingEnrollment.objects.bulk_upsert(enrollments)
+
+        # One lookup, one update of the changed course mode and one insert; the rest are savepoint queries.
+        assert len([query for query in queries if 'SAVEPOINT' not in query['sql']]) == 3
+        assert sorted(PendingEnrollment.objects.values_list('user_id', 'course_id', 'course_mode')) == sorted(
+            enrollments
+        )
+
+
+@mark.django_db
+@ddt.ddt
+class TestEnrollmentJob(unittest.TestCase):
+    """
+    Tests for EnrollmentJob.
+    """
+    def setUp(self):
+        self.enterprise_customer = EnterpriseCustomerFactory(name='Veridian Dynamics')
+        super(TestEnrollmentJob, self).setUp()
+
+    @ddt.data(
+        ('course-v1:edX+DemoX+DemoCourse', '', 'course-v1:edX+DemoX+DemoCourse'),
+        ('', '{"title": "Demo Program", "uuid": "demo-program"}', 'Demo Program'),
+        ('', '{"uuid": "demo-program"}', 'demo-program'),
+    )
+    @ddt.unpack
+    def test_enrollment_identifier(self, course_id, program_details, expected_identifier):
+        job = EnrollmentJob.objects.create(
+            enterprise_customer=self.enterprise_customer,
+            course_id=course_id,
+            program_details=program_details,
+            course_mode='audit',
+        )
+        assert job.enrollment_identifier == expected_identifier
+        assert str(job) == '<EnrollmentJob {}>: Veridian Dynamics - {}'.format(job.uuid, expected_identifier)
+
+    def test_notification(self):
+        job = EnrollmentJob(enterprise_customer=self.enterprise_customer, course_mode='audit')
+        enrolled_in = {
+            'name': 'Demo Course',
+            'url': 'http://localhost/course',
+            'type': 'course',
+            'start': datetime(2017, 1, 1, 12),
+        }
+
+        job.set_notification(enrolled_in)
+        assert job.get_notification() == enrolled_in
+        job.set_notification(None)
+        assert job.get_notification() is None
+
+    def test_get_progress(self):
+        job = EnrollmentJob.objects.create(enterprise_customer=self.enterprise_customer, course_mode='audit')
+        job.add_chunks(['learner{}@example.com'.format(index) for index in range(5)], 2)
+        assert job.get_progress() == {
+            'status': EnrollmentJob.STATUS_PENDING,
+            'total': 5,
+            'processed': 0,
+            'succeeded': [],
+            'pending': [],
+            'failed': [],
+            'notification_failed': [],
+        }
+
+        for index, chunk in enumerate(job.chunks.all()):
+            chunk.status = chunk.STATUS_COMPLETED
+            chunk.results = '{"succeeded": %s}' % chunk.emails
+            chunk.save()
+            if index == 0:
+                progress = job.get_progress()
+                assert (progress['status'], progress['processed']) == (EnrollmentJob.STATUS_RUNNING, 2)
+
+        progress = job.get_progress()
+        assert (progress['status'], progress['processed']) == (EnrollmentJob.STATUS_COMPLETED, 5)
+        assert progress['succeeded'] == ['learner{}@example.com'.format(index) for index in range(5)]
+
+    def test_fail_stale_chunks(self):
+        job = EnrollmentJob.objects.create(enterprise_customer=self.enterprise_customer, course_mode='audit')
+        job.add_chunks(['learner{}@example.com'.format(index) for index in range(3)], 1)
+        lost_chunk, running_chunk, pending_chunk = job.chunks.all()
+        lost_chunk.status = running_chunk.status = EnrollmentJobChunk.STATUS_RUNNING
+        lost_chunk.started = timezone.now() - timedelta(hours=2)
+        running_chunk.started = timezone.now()
+        lost_chunk.save()
+        running_chunk.save()
+
+        assert job.fail_stale_chunks(3600) == 1
+        lost_chunk.refresh_from_db()
+        assert lost_chunk.status == EnrollmentJobChunk.STATUS_FAILED
+        assert lost_chunk.get_results() == {'failed': ['learner0@example.com']}
+        assert job.get_progress()['status'] == EnrollmentJob.STATUS_RUNNING
+
+        # Chunks still pending long after the job was created were lost too.
+        EnrollmentJob.objects.filter(pk=job.pk).update(created=timezone.now() - timedelta(hours=2))
+        assert job.fail_stale_chunks(3600) == 1
+        pending_chunk.refresh_from_db()
+        assert pending_chunk.status == EnrollmentJobChunk.STATUS_FAILED
+        running_chunk.refresh_from_db()
+        assert running_chunk.status == EnrollmentJobChunk.STATUS_RUNNING
+
 
 @mark.django_db
 @ddt.ddt
@@ -125,6 +238,88 @@ class TestEnterpriseCourseEnrollment(unittest.TestCase):
     def test_consent_not_stored_no_audit_available(self):
         assert self.enrollment.consent_available() is False
 
+    def test_with_consent_resolves_consent_without_per_row_queries(self):
+        """
+        Consent of a whole set of enrollments is resolved with a constant number of queries.
+        """
+        for state in ('enabled', 'disabled', 'enabled', 'disabled'):
+            enterprise_customer_user = EnterpriseCustomerUserFactory(user_id=UserFactory().id)
+            UserDataSharingConsentAuditFactory(user=enterprise_customer_user, state=state)
+            EnterpriseCourseEnrollmentFactory(
+                enterprise_customer_user=enterprise_customer_user,
+                course_id=self.course_id,
+                consent_granted=None,
+            )
+        expected_consent = {
+            enrollment.pk: enrollment.consent_available() for enrollment in EnterpriseCourseEnrollment.objects.all()
+        }
+        expected_needed = {
+            enrollment.pk: enrollment.consent_needed for enrollment in EnterpriseCourseEnrollment.objects.all()
+        }
+
+        with CaptureQueriesContext(connection) as captured_queries:
+            enrollments = list(EnterpriseCourseEnrollment.objects.with_consent())
+            consent = {enrollment.pk: enrollment.consent_available() for enrollment in enrollments}
+            needed = {enrollment.pk: enrollment.consent_needed for enrollment in enrollments}
+
+        assert len(captured_queries) == 2
+        assert consent == expected_consent
+        assert sorted(consent.values()) == [False, False, False, True, True]
+        assert needed == expected_needed
+
+    @mock.patch('enterprise.models.LINK_QUERY_BATCH_SIZE', 2)
+    def test_bulk_upsert(self):
+        enterprise_customer_users = [EnterpriseCustomerUserFactory(user_id=UserFactory().id) for __ in range(2)]
+        course_ids = [self.course_id, 'course-v1:edX+Other+Course']
+        enrollments = [(self.enterprise_customer_user.id, self.course_id)] + [
+            (enterprise_customer_user.id, course_id)
+            for enterprise_customer_user in enterprise_customer_users for course_id in course_ids
+        ]
+
+        with CaptureQueriesContext(connection) as queries:
+            created_count = EnterpriseCourseEnrollment.objects.bulk_upsert(enrollments)
+
+        assert created_count == 4
+        # A lookup, an insert, a lookup of the inserted rows and an insert of their history for each batch of 2.
+        assert len([query for query in queries if 'SAVEPOINT' not in query['sql']]) <= 4 * 3
+        assert sorted(
+            EnterpriseCourseEnrollment.objects.values_list('enterprise_customer_user_id', 'course_id')
+        ) == sorted(enrollments)
+        assert EnterpriseCourseEnrollment.history.filter(history_type='+').count() == 5  # pylint: disable=no-member
+
+    @mock.patch('enterprise.models.EnterpriseCourseEnrollmentQuerySet._filter_keys', return_value=[])
+    def test_bulk_upsert_concurrent_creation(self, filter_keys_mock):  # pylint: disable=unused-argument
+        """
+        Enrollments created after the lookup are not created again.
+        """
+        enrollments = [(self.enterprise_customer_user.id, self.course_id), (self.enterprise_customer_user.id, 'other')]
+
+        assert EnterpriseCourseEnrollment.objects.bulk_upsert(enrollments) == 1
+        assert EnterpriseCourseEnrollment.objects.count() == 2
+
+    def test_bulk_upsert_consent(self):
+        other_enterprise_customer_user = EnterpriseCustomerUserFactory(user_id=UserFactory().id)
+        existing = EnterpriseCourseEnrollmentFactory(
+            enterprise_customer_user=other_enterprise_customer_user, course_id=self.course_id, consent_granted=True,
+        )
+        enrollments = {
+            (self.enterprise_customer_user.id, self.course_id): False,
+            (self.enterprise_customer_user.id, 'course-v1:edX+Other+Course'): None,
+            (other_enterprise_customer_user.id, self.course_id): False,
+        }
+
+        created = EnterpriseCourseEnrollment.objects.bulk_upsert_consent(enrollments, batch_size=2)
+
+        assert created == {
+            (self.enterprise_customer_user.id, 'course-v1:edX+Other+Course'),
+        }
+        assert {
+            (enrollment.enterprise_customer_user_id, enrollment.course_id): enrollment.consent_granted
+            for enrollment in EnterpriseCourseEnrollment.objects.all()
+        } == enrollments
+        # pylint: disable=no-member
+        assert EnterpriseCourseEnrollment.history.filter(id=existing.id, history_type='~').count() == 1
+
 
 @mark.django_db
 class TestEnterpriseCustomerManager(unittest.TestCase):
@@ -280,6 +475,150 @@ class TestEnterpriseCustomerUserManager(unittest.TestCase):
         assert len(PendingEnterpriseCustomerUser.objects.all()) == 0
         assert EnterpriseCustomerUser.objects.get_link_by_email(email) is None
 
+    def test_get_links_by_emails(self):
+        linked_user, unlinked_user = UserFactory(), UserFactory()
+        existing_link = EnterpriseCustomerUserFactory(user_id=linked_user.id)
+        pending_link = PendingEnterpriseCustomerUserFactory(user_email="pending@example.com")
+        emails = [linked_user.email, unlinked_user.email, "pending@example.com", "unknown@example.com"]
+
+        with CaptureQueriesContext(connection) as queries:
+            links = EnterpriseCustomerUser.objects.get_links_by_emails(emails)
+            assert links[linked_user.email].enterprise_customer == existing_link.enterprise_customer
+
+        assert links == {linked_user.email: existing_link, "pending@example.com": pending_link}
+        assert len(queries) == 3
+        for email, link in links.items():
+            assert EnterpriseCustomerUser.objects.get_link_by_email(email) == link
+
+    def test_get_links_by_usernames(self):
+        linked_user, unlinked_user = UserFactory(), UserFactory()
+        existing_link = EnterpriseCustomerUserFactory(user_id=linked_user.id)
+        usernames = [linked_user.username, unlinked_user.username, 'unknown']
+
+        with CaptureQueriesContext(connection) as queries:
+            links = EnterpriseCustomerUser.objects.get_links_by_usernames(usernames)
+            assert links[linked_user.username].user == linked_user
+
+        assert links == {linked_user.username: existing_link, unlinked_user.username: None}
+        assert len(queries) == 2
+
+    def test_link_users(self):
+        enterprise_customer = EnterpriseCustomerFactory()
+        users = [UserFactory(), UserFactory()]
+        pending_emails = ["pending1@example.com", "pending2@example.com"]
+
+        emails = [user.email for user in users] + pending_emails
+
+        with CaptureQueriesContext(connection) as queries:
+            EnterpriseCustomerUser.objects.link_users(enterprise_customer, emails)
+
+        # One User query, and one insert for each model; the rest are the transaction's savepoint queries.
+        assert len([query for query in queries if 'SAVEPOINT' not in query['sql']]) == 3
+        assert set(
+            EnterpriseCustomerUser.objects.filter(
+                enterprise_customer=enterprise_customer
+            ).values_list('user_id', flat=True)
+        ) == {user.id for user in users}
+        assert set(
+            PendingEnterpriseCustomerUser.objects.filter(
+                enterprise_customer=enterprise_customer
+            ).values_list('user_email', flat=True)
+        ) == set(pending_emails)
+
+    def test_link_users_mixed_case_emails(self):
+        enterprise_customer = EnterpriseCustomerFactory()
+        user = UserFactory(email='jane@example.com')
+        pending_link = PendingEnterpriseCustomerUserFactory(user_email='john@example.com')
+
+        def case_insensitive_filter(manager, field_name):
+            """
+            Patch the manager to match emails whatever their case, like databases with a case-insensitive collation.
+            """
+            filter_objects = manager.filter
+
+            def filter_case_insensitively(**kwargs):
+                """
+                Replace the IN lookup of emails with case-insensitive comparisons.
+                """
+                query = Q()
+                for email in kwargs.pop(field_name + '__in'):
+                    query |= Q(**{field_name + '__iexact': email})
+                return filter_objects(query, **kwargs)
+
+            return mock.patch.object(manager, 'filter', side_effect=filter_case_insensitively)
+
+        with case_insensitive_filter(User.objects, 'email'):
+            with case_insensitive_filter(PendingEnterpriseCustomerUser.objects, 'user_email'):
+                EnterpriseCustomerUser.objects.link_users(
+                    enterprise_customer, ['Jane@Example.com', 'Joe@Example.com']
+                )
+                links = EnterpriseCustomerUser.objects.get_links_by_emails(['JANE@example.com', 'John@Example.com'])
+
+        link = EnterpriseCustomerUser.objects.get(enterprise_customer=enterprise_customer, user_id=user.id)
+        assert not PendingEnterpriseCustomerUser.objects.filter(user_email__iexact='jane@example.com').exists()
+        assert links == {'JANE@example.com': link, 'John@Example.com': pending_link}
+
+    def test_link_users_forgets_enterprise_context(self):
+        enterprise_customer = EnterpriseCustomerFactory()
+        user = UserFactory()
+        assert get_enterprise_context_for_user(user) == {'enterprise_id': None, 'tpa_hint': None}
+
+        EnterpriseCustomerUser.objects.link_users(enterprise_customer, [user.email])
+
+        assert get_enterprise_context_for_user(user) == {'enterprise_id': enterprise_customer.uuid, 'tpa_hint': None}
+
+    def test_get_or_create_links_forgets_enterprise_context(self):
+        enterprise_customer = EnterpriseCustomerFactory()
+        user = UserFactory()
+        assert get_enterprise_context_for_user(user) == {'enterprise_id': None, 'tpa_hint': None}
+
+        EnterpriseCustomerUser.objects.get_or_create_links(enterprise_customer, [user.id])
+
+        assert get_enterprise_context_for_user(user) == {'enterprise_id': enterprise_customer.uuid, 'tpa_hint': None}
+
+    def test_attach_users(self):
+        users = [UserFactory(), UserFactory()]
+        for user in users:
+            EnterpriseCustomerUserFactory(user_id=user.id)
+        EnterpriseCustomerUserFactory(user_id=1138)
+
+        with CaptureQueriesContext(connection) as queries:
+            links = EnterpriseCustomerUser.objects.attach_users(EnterpriseCustomerUser.objects.order_by('pk'))
+            link_users = [link.user for link in links]
+            link_emails = [link.user_email for link in links]
+
+        # One query for the links, and one for their users.
+        assert len(queries) == 2
+        assert link_users == users + [None]
+        assert link_emails == [user.email for user in users] + [None]
+
+    def test_get_or_create_links(self):
+        enterprise_customer = EnterpriseCustomerFactory()
+        linked_user, unlinked_user = UserFactory(), UserFactory()
+        existing_link = EnterpriseCustomerUserFactory(enterprise_customer=enterprise_customer, user_id=linked_user.id)
+
+        link_ids = EnterpriseCustomerUser.objects.get_or_create_links(
+            enterprise_customer, [linked_user.id, unlinked_user.id]
+        )
+
+        new_link = EnterpriseCustomerUser.objects.get(enterprise_customer=enterprise_customer, user_id=unlinked_user.id)
+        assert link_ids == {linked_user.id: existing_link.id, unlinked_user.id: new_link.id}
+
+    def test_get_or_create_pending_links(self):
+        enterprise_customer = EnterpriseCustomerFactory()
+        existing_link = PendingEnterpriseCustomerUserFactory(
+            enterprise_customer=enterprise_customer, user_email="pending@example.com"
+        )
+
+        pending_links = EnterpriseCustomerUser.objects.get_or_create_pending_links(
+            enterprise_customer, ["pending@example.com", "new@example.com"]
+        )
+
+        assert pending_links == {
+            "pending@example.com": existing_link,
+            "new@example.com": PendingEnterpriseCustomerUser.objects.get(user_email="new@example.com"),
+        }
+
     @ddt.data("email1@example.com", "email2@example.com")
     def test_unlink_user_existing_user(self, email):
         other_email = "other_email@example.com"
@@ -337,6 +676,33 @@ class TestEnterpriseCustomerUserManager(unittest.TestCase):
         with raises(PendingEnterpriseCustomerUser.DoesNotExist):
             EnterpriseCustomerUser.objects.unlink_user(enterprise_customer, email)
 
+    @mock.patch('enterprise.models.ThirdPartyAuthApiClient')
+    def test_get_remote_ids(self, mock_third_party_api):
+        enterprise_customer = EnterpriseCustomerFactory()
+        EnterpriseCustomerIdentityProviderFactory(provider_id='the-idp', enterprise_customer=enterprise_customer)
+        user1, user2 = UserFactory(username='luke'), UserFactory(username='leia')
+        EnterpriseCustomerUserFactory(enterprise_customer=enterprise_customer, user_id=user1.id)
+        EnterpriseCustomerUserFactory(enterprise_customer=enterprise_customer, user_id=user2.id)
+        EnterpriseCustomerUserFactory(user_id=UserFactory(username='han').id)
+        mock_third_party_api.return_value.get_remote_ids.return_value = {'luke': 'remote-luke'}
+
+        with CaptureQueriesContext(connection) as queries:
+            assert EnterpriseCustomerUser.objects.get_remote_ids(enterprise_customer) == {user1.id: 'remote-luke'}
+        # The users are selected with a subquery of their links.
+        assert len(queries) == 1
+        assert 'SELECT' in queries[0]['sql'].split('WHERE', 1)[1]
+        identity_provider, usernames = mock_third_party_api.return_value.get_remote_ids.call_args[0]
+        assert identity_provider == 'the-idp'
+        assert sorted(usernames) == ['leia', 'luke']
+
+    @mock.patch('enterprise.models.ThirdPartyAuthApiClient')
+    def test_get_remote_ids_no_identity_provider(self, mock_third_party_api):
+        enterprise_customer = EnterpriseCustomerFactory()
+        EnterpriseCustomerUserFactory(enterprise_customer=enterprise_customer, user_id=UserFactory().id)
+
+        assert EnterpriseCustomerUser.objects.get_remote_ids(enterprise_customer) == {}
+        assert not mock_third_party_api.called
+
 
 @mark.django_db
 @ddt.ddt
@@ -374,6 +740,29 @@ class TestEnterpriseCustomerUser(unittest.TestCase):
         enterprise_customer_user = EnterpriseCustomerUserFactory(user_id=user_id)
         assert enterprise_customer_user.user is None  # pylint: disable=no-member
 
+    def test_user_property_is_memoized(self):
+        user, other_user = UserFactory(), UserFactory()
+        enterprise_customer_user = EnterpriseCustomerUser.objects.get(
+            pk=EnterpriseCustomerUserFactory(user_id=user.id).pk
+        )
+
+        with CaptureQueriesContext(connection) as queries:
+            assert enterprise_customer_user.user == user
+            assert enterprise_customer_user.user_email == user.email
+            assert enterprise_customer_user.user.username == user.username
+        assert len(queries) == 1
+
+        # The memoized user is dropped when the link points to another user.
+        enterprise_customer_user.user_id = other_user.id
+        assert enterprise_customer_user.user == other_user
+
+    def test_user_property_missing_user_is_memoized(self):
+        enterprise_customer_user = EnterpriseCustomerUserFactory(user_id=1138)
+        with CaptureQueriesContext(connection) as queries:
+            assert enterprise_customer_user.user is None
+            assert enterprise_customer_user.user_email is None
+        assert len(queries) == 1
+
     @ddt.data(
         "albert.einstein@princeton.edu", "richard.feynman@caltech.edu", "leo.susskind@stanford.edu"
     )
@@ -850,6 +1239,35 @@ class TestEnrollmentNotificationEmailTemplate(unittest.TestCase):
         assert plain == 'This is a template - testing real course, filled in'
         assert html == '<b>This is an HTML template! real course!!!</b>'
 
+    @mock.patch('enterprise.models.Template', wraps=Template)
+    def test_compiled_templates_are_cached(self, template_mock):
+        context = {"course_name": "real course", "other_value": "filled in"}
+        for __ in range(3):
+            self.template.render_all_templates(context)
+        # Other instances of the same stored templates share the compiled templates.
+        EnrollmentNotificationEmailTemplate.objects.get(pk=self.template.pk).render_all_templates(context)
+
+        assert template_mock.call_count == 2
+
+    def test_compiled_templates_are_invalidated_on_save(self):
+        context = {"course_name": "real course", "other_value": "filled in"}
+        self.template.render_all_templates(context)
+
+        self.template.html_template = '<i>{{ course_name }}</i>'
+        self.template.save()
+
+        assert self.template.render_html_template(context) == '<i>real course</i>'
+        assert EnrollmentNotificationEmailTemplate.objects.get(pk=self.template.pk).render_html_template(
+            context
+        ) == '<i>real course</i>'
+
+    @mock.patch('enterprise.models.Template', wraps=Template)
+    def test_unsaved_templates_are_not_cached(self, template_mock):
+        template = EnrollmentNotificationEmailTemplate(plaintext_template='{{ course_name }}', html_template='')
+        assert template.render_plaintext_template({"course_name": "real course"}) == 'real course'
+        assert template.render_plaintext_template({"course_name": "other course"}) == 'other course'
+        assert template_mock.call_count == 2
+
     @ddt.data(
         str, repr
     )
@@ -950,10 +1368,9 @@ class TestEnterpriseCustomerPluginConfiguration(unittest.TestCase):
             course_id=self.course_id,
             consent_granted=True,
         )
-        # Raise GeneratedCertificate.DoesNotExist
+        # No certificate found for the user+course
         mock_course_key.from_string.return_value = None
-        mock_certificate.DoesNotExist = Exception
-        mock_certificate.eligible_certificates.get.side_effect = mock_certificate.DoesNotExist
+        mock_certificate.eligible_certificates.filter.return_value = []
 
         learner_data = list(self.active_config.collect_learner_data())
         assert len(learner_data) == 1
@@ -974,8 +1391,8 @@ class TestEnterpriseCustomerPluginConfiguration(unittest.TestCase):
 
         # Return a mock certificate
         mock_course_key.from_string.return_value = None
-        certificate = mock.MagicMock()
-        mock_certificate.eligible_certificates.get.return_value = certificate
+        certificate = mock.MagicMock(user_id=self.user.id, course_id=None)
+        mock_certificate.eligible_certificates.filter.return_value = [certificate]
 
         learner_data = list(self.active_config.collect_learner_data())
         assert len(learner_data) == 1
@@ -986,6 +1403,32 @@ class TestEnterpriseCustomerPluginConfiguration(unittest.TestCase):
         assert mock_configuration.get_learner_data.called_with(enterprise_enrollment=enrollment,
                                                                certificate=certificate)
 
+    @mock.patch('enterprise.models.ThirdPartyAuthApiClient', mock.Mock())
+    @mock.patch('integrated_channels.integrated_channel.models.GeneratedCertificate')
+    @mock.patch('integrated_channels.integrated_channel.models.CourseKey')
+    def test_collect_learner_data_batches_certificates(self, mock_course_key, mock_certificate):
+        """
+        Certificates are fetched with one query per chunk of enrollments, and matched to the right enrollment.
+        """
+        mock_course_key.from_string.side_effect = lambda course_id: course_id
+        course_ids = ['course-v1:edX+DemoX+Demo{}'.format(index) for index in range(5)]
+        for course_id in course_ids:
+            EnterpriseCourseEnrollmentFactory(
+                enterprise_customer_user=self.enterprise_customer_user,
+                course_id=course_id,
+                consent_granted=True,
+            )
+        certificate = mock.MagicMock(user_id=self.user.id, course_id=course_ids[3], grade="A-")
+        mock_certificate.eligible_certificates.filter.return_value = [certificate]
+
+        learner_data = list(self.active_config.collect_learner_data(batch_size=2))
+
+        assert len(learner_data) == 5
+        assert mock_certificate.eligible_certificates.filter.call_count == 3
+        assert mock_certificate.eligible_certificates.get.call_count == 0
+        completed = [data.course_id for data in learner_data if data.grade == "A-"]
+        assert completed == [course_ids[3]]
+
     def test_transmit_learner_data_raises(self):
         abstract_base = EnterpriseCustomerPluginConfiguration()
         with raises(NotImplementedError):
@@ -1006,11 +1449,12 @@ class TestEnterpriseCustomerPluginConfiguration(unittest.TestCase):
         mock_course_key.from_string.return_value = None
         certificate = mock.MagicMock(
             user=self.user,
-            course_id=self.course_id,
+            user_id=self.user.id,
+            course_id=None,
             grade="A-",
             created_date=datetime(2017, 1, 2, 3, 4, 5, tzinfo=timezone.utc)
         )
-        mock_certificate.eligible_certificates.get.return_value = certificate
+        mock_certificate.eligible_certificates.filter.return_value = [certificate]
 
         # Test that the transmitter gets called with the expected data record
         self.active_config.transmit_learner_data()
@@ -1221,6 +1665,38 @@ class TestSAPSuccessFactorsEnterpriseCustomerConfiguration(unittest.TestCase):
         )
         assert config.channel_code() == 'SAP'
 
+    @mock.patch('enterprise.models.ThirdPartyAuthApiClient')
+    def test_get_learner_data_resolves_remote_ids_once(self, mock_third_party_api):
+        enterprise_customer = EnterpriseCustomerFactory()
+        EnterpriseCustomerIdentityProviderFactory(enterprise_customer=enterprise_customer)
+        users = [UserFactory(username='learner{}'.format(index)) for index in range(3)]
+        enrollments = [
+            EnterpriseCourseEnrollmentFactory(
+                enterprise_customer_user=EnterpriseCustomerUserFactory(
+                    enterprise_customer=enterprise_customer,
+                    user_id=user.id,
+                ),
+            )
+            for user in users
+        ]
+        mock_third_party_api.return_value.get_remote_ids.return_value = {
+            user.username: 'remote-{}'.format(user.username) for user in users
+        }
+        config = SAPSuccessFactorsEnterpriseCustomerConfiguration(
+            enterprise_customer=enterprise_customer,
+            sapsf_base_url='enterprise.successfactors.com',
+            key='key',
+            secret='secret'
+        )
+
+        learner_data = [config.get_learner_data(enrollment, certificate=None) for enrollment in enrollments]
+
+        assert [data.sapsf_user_id for data in learner_data] == [
+            'remote-learner0', 'remote-learner1', 'remote-learner2'
+        ]
+        assert mock_third_party_api.return_value.get_remote_ids.call_count == 1
+        assert not mock_third_party_api.return_value.get_remote_id.called
+
 
 @mark.django_db
 @ddt.ddt
@@ -11,7 +11,12 @@ import ddt
 import mock
 from pytest import mark
 
-from enterprise.models import (EnterpriseCourseEnrollment, EnterpriseCustomerUser,
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+
+from enterprise import tasks
+from enterprise.models import (EnterpriseCourseEnrollment, EnterpriseCustomerUser, PendingEmailIndex,
                                PendingEnrollment, PendingEnterpriseCustomerUser)
 from enterprise.signals import handle_user_post_save
 from test_utils.factories import (EnterpriseCustomerFactory, EnterpriseCustomerUserFactory, PendingEnrollmentFactory,
@@ -98,7 +103,14 @@ class TestUserPostSaveSignalHandler(unittest.TestCase):
         assert len(PendingEnrollment.objects.filter(user=pending_link)) == 1, 'Check that only one enrollment exists.'
 
         parameters = {'instance': user, "created": False}
-        handle_user_post_save(mock.Mock(), **parameters)
+        executor = mock.Mock()
+        executor.submit.side_effect = lambda function, *args: tasks.complete_pending_enrollments(*args)
+        with override_settings(ENTERPRISE_ENROLLMENT_JOB_BACKEND='local'):
+            with mock.patch('enterprise.tasks._get_pending_enrollments_executor', return_value=executor):
+                with mock.patch('django.db.transaction.on_commit') as on_commit:
+                    handle_user_post_save(mock.Mock(), **parameters)
+                    mock_course_enrollment.enroll.assert_not_called()
+                    on_commit.call_args[0][0]()
         assert len(PendingEnterpriseCustomerUser.objects.all()) == 0
         assert len(EnterpriseCustomerUser.objects.filter(
             enterprise_customer=pending_link.enterprise_customer, user_id=user.id
@@ -108,6 +120,29 @@ class TestUserPostSaveSignalHandler(unittest.TestCase):
         mock_course_enrollment.enroll.assert_called_once_with(user, None, mode='audit', check_access=True)
         mock_course_key.from_string.assert_called_once_with(pending_enrollment.course_id)
 
+    @mock.patch('enterprise.models.PendingEmailIndex.is_cache_shared', mock.Mock(return_value=True))
+    @mock.patch('enterprise.signals.start_pending_enrollments')
+    def test_handle_user_post_save_with_many_pending_course_enrollments(self, start_pending_enrollments):
+        email = "fake_email@edx.org"
+        user = UserFactory(email=email)
+        pending_link = PendingEnterpriseCustomerUserFactory(user_email=email)
+        course_ids = ['course-v1:edX+DemoX+Demo_Course_{}'.format(index) for index in range(20)]
+        for course_id in course_ids:
+            PendingEnrollmentFactory(user=pending_link, course_id=course_id, course_mode='verified')
+
+        with CaptureQueriesContext(connection) as queries:
+            handle_user_post_save(mock.Mock(), instance=user, created=False)
+
+        # The pending email index, the pending link, the existing link, the new link and its customer, the pending
+        # enrollments, the existing enterprise enrollments, their insertion and history records, and the deletion
+        # of the pending link and enrollments, whatever the number of courses.
+        assert len(queries) == 14
+        assert PendingEnrollment.objects.count() == 0
+        assert sorted(EnterpriseCourseEnrollment.objects.values_list('course_id', flat=True)) == sorted(course_ids)
+        start_pending_enrollments.assert_called_once_with(
+            user.id, [(course_id, 'verified') for course_id in course_ids]
+        )
+
     def test_handle_user_post_save_modified_user_already_linked(self):
         email = "jackie.chan@hollywood.com"
         user = UserFactory(id=1, email=email)
@@ -144,3 +179,85 @@ class TestUserPostSaveSignalHandler(unittest.TestCase):
         assert len(EnterpriseCustomerUser.objects.filter(user_id=user.id)) == 0, "Link have been created"
         assert len(PendingEnterpriseCustomerUser.objects.filter(user_email=email)) == 1, \
             "Pending link should be kept"
+
+    def test_handle_user_post_save_email_not_updated(self):
+        email = "jackie.chan@hollywood.com"
+        user = UserFactory(id=1, email=email)
+        PendingEnterpriseCustomerUserFactory(user_email=email)
+
+        parameters = {"instance": user, "created": False, "update_fields": frozenset(["last_login"])}
+        with CaptureQueriesContext(connection) as queries:
+            handle_user_post_save(mock.Mock(), **parameters)
+
+        assert len(queries) == 0
+        assert len(PendingEnterpriseCustomerUser.objects.filter(user_email=email)) == 1, \
+            "Pending link should be kept"
+
+    @mock.patch('enterprise.models.PendingEmailIndex.is_cache_shared', mock.Mock(return_value=True))
+    def test_handle_user_post_save_no_pending_link_no_queries(self):
+        PendingEnterpriseCustomerUserFactory(user_email="jackie.chan@hollywood.com")
+        user = UserFactory(email="bruce.lee@hollywood.com")
+        # The index of pending emails is built by the first check.
+        handle_user_post_save(mock.Mock(), instance=user, created=False)
+
+        with CaptureQueriesContext(connection) as queries:
+            handle_user_post_save(mock.Mock(), instance=user, created=False)
+
+        assert len(queries) == 0
+
+    def test_handle_user_post_save_pending_links_created_in_bulk(self):
+        enterprise_customer = EnterpriseCustomerFactory()
+        handle_user_post_save(mock.Mock(), instance=UserFactory(), created=False)
+
+        EnterpriseCustomerUser.objects.link_users(enterprise_customer, ["jackie.chan@hollywood.com"])
+        user = UserFactory(email="jackie.chan@hollywood.com")
+        handle_user_post_save(mock.Mock(), instance=user, created=True)
+
+        assert EnterpriseCustomerUser.objects.filter(enterprise_customer=enterprise_customer, user_id=user.id).exists()
+
+
+@mark.django_db
+@ddt.ddt
+class TestPendingEmailIndex(unittest.TestCase):
+    """
+    Test the index of pending emails.
+    """
+
+    @mock.patch('enterprise.models.PendingEmailIndex.is_cache_shared', mock.Mock(return_value=True))
+    def test_may_contain(self):
+        index = PendingEmailIndex()
+        PendingEnterpriseCustomerUserFactory(user_email="jackie.chan@hollywood.com")
+
+        assert index.may_contain("Jackie.Chan@hollywood.com")
+        assert not index.may_contain("bruce.lee@hollywood.com")
+        assert not index.may_contain("")
+
+        PendingEnterpriseCustomerUserFactory(user_email="bruce.lee@hollywood.com")
+        assert index.may_contain("bruce.lee@hollywood.com")
+
+    @mock.patch('enterprise.models.PendingEmailIndex.is_cache_shared', mock.Mock(return_value=True))
+    @mock.patch('enterprise.models.cache')
+    def test_may_contain_without_cache(self, cache_mock):
+        cache_mock.get.return_value = None
+        PendingEnterpriseCustomerUserFactory(user_email="jackie.chan@hollywood.com")
+
+        assert PendingEmailIndex().may_contain("bruce.lee@hollywood.com")
+
+    def test_may_contain_with_process_local_cache(self):
+        # The test settings use the local memory cache.
+        assert not PendingEmailIndex.is_cache_shared()
+        with mock.patch('enterprise.models.PendingEnterpriseCustomerUser.objects') as pending_links_manager:
+            assert PendingEmailIndex().may_contain("bruce.lee@hollywood.com")
+        pending_links_manager.values_list.assert_not_called()
+
+    @ddt.data(
+        ('django.core.cache.backends.memcached.MemcachedCache', True),
+        ('django_redis.cache.RedisCache', True),
+        ('django.core.cache.backends.locmem.LocMemCache', False),
+        ('django.core.cache.backends.dummy.DummyCache', False),
+    )
+    @ddt.unpack
+    def test_is_cache_shared(self, backend, is_shared):
+        with mock.patch('enterprise.models.settings') as settings_mock:
+            settings_mock.CACHES = {'default': {'BACKEND': backend}}
+            assert PendingEmailIndex.is_cache_shared() == is_shared
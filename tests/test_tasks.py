@@ -0,0 +1,179 @@
+# -*- coding: utf-8 -*-
+"""
+Tests for the `edx-enterprise` background tasks.
+"""
+from __future__ import absolute_import, unicode_literals
+
+import unittest
+
+import mock
+from pytest import mark, raises
+
+from django.test import override_settings
+
+from enterprise import tasks
+from enterprise.models import EnrollmentJob, EnrollmentJobChunk
+from test_utils.factories import EnterpriseCustomerFactory, UserFactory
+
+
+@mark.django_db
+class TestEnrollmentJobTasks(unittest.TestCase):
+    """
+    Tests for processing enrollment jobs.
+    """
+
+    def setUp(self):
+        super(TestEnrollmentJobTasks, self).setUp()
+        self.job = EnrollmentJob.objects.create(
+            enterprise_customer=EnterpriseCustomerFactory(),
+            course_id='course-v1:edX+DemoX+Demo_Course',
+            course_mode='audit',
+        )
+        self.job.add_chunks(['learner1@example.com', 'learner2@example.com', 'learner3@example.com'], 2)
+        self.chunk = self.job.chunks.first()
+
+    @mock.patch('enterprise.tasks.process_enrollment_job_chunk')
+    def test_run_enrollment_job_chunk(self, process_chunk):
+        results = {'succeeded': ['learner1@example.com'], 'pending': [], 'failed': ['learner2@example.com']}
+        process_chunk.return_value = results
+
+        tasks.run_enrollment_job_chunk(self.chunk.pk)
+
+        process_chunk.assert_called_once_with(self.job, ['learner1@example.com', 'learner2@example.com'])
+        self.chunk.refresh_from_db()
+        assert self.chunk.status == EnrollmentJobChunk.STATUS_COMPLETED
+        assert self.chunk.get_results() == results
+        assert self.chunk.started is not None
+
+        # Chunks are only processed once.
+        tasks.run_enrollment_job_chunk(self.chunk.pk)
+        assert process_chunk.call_count == 1
+
+        progress = self.job.get_progress()
+        assert progress['status'] == EnrollmentJob.STATUS_RUNNING
+        assert (progress['processed'], progress['total']) == (2, 3)
+
+    @mock.patch('enterprise.tasks.process_enrollment_job_chunk')
+    def test_run_enrollment_job_chunk_error(self, process_chunk):
+        process_chunk.side_effect = ValueError
+
+        tasks.run_enrollment_job_chunk(self.chunk.pk)
+
+        self.chunk.refresh_from_db()
+        assert self.chunk.status == EnrollmentJobChunk.STATUS_FAILED
+        assert self.chunk.get_results() == {'failed': ['learner1@example.com', 'learner2@example.com']}
+
+    @override_settings(ENTERPRISE_ENROLLMENT_JOB_BACKEND='local')
+    @mock.patch('enterprise.tasks._get_local_executor')
+    def test_start_enrollment_job_local(self, get_local_executor):
+        with mock.patch('django.db.transaction.on_commit', side_effect=lambda callback: callback()) as on_commit:
+            tasks.start_enrollment_job(self.job)
+
+        assert on_commit.call_count == 1
+        submitted_chunk_ids = [call[0][1] for call in get_local_executor.return_value.submit.call_args_list]
+        assert submitted_chunk_ids == list(self.job.chunks.values_list('pk', flat=True))
+
+    @override_settings(ENTERPRISE_ENROLLMENT_JOB_BACKEND='celery')
+    def test_start_enrollment_job_celery(self):
+        task = mock.Mock()
+        with mock.patch('enterprise.tasks.run_enrollment_job_chunk_task', task):
+            with mock.patch('django.db.transaction.on_commit', side_effect=lambda callback: callback()):
+                tasks.start_enrollment_job(self.job)
+
+        assert [call[0][0] for call in task.delay.call_args_list] == list(
+            self.job.chunks.values_list('pk', flat=True)
+        )
+
+    @mock.patch('enterprise.tasks.run_enrollment_job_chunk_task', None)
+    def test_get_enrollment_job_backend(self):
+        assert tasks.get_enrollment_job_backend() == 'local'
+        with override_settings(ENTERPRISE_ENROLLMENT_JOB_BACKEND='celery'):
+            with raises(ValueError):
+                tasks.get_enrollment_job_backend()
+        with override_settings(ENTERPRISE_ENROLLMENT_JOB_BACKEND='rabbit'):
+            with raises(ValueError):
+                tasks.get_enrollment_job_backend()
+
+
+@mark.django_db
+class TestPendingEnrollmentTasks(unittest.TestCase):
+    """
+    Tests for completing the pending enrollments of newly registered learners.
+    """
+
+    def setUp(self):
+        super(TestPendingEnrollmentTasks, self).setUp()
+        self.user = UserFactory()
+        self.enrollments = [
+            ('course-v1:edX+DemoX+Demo_Course', 'audit'),
+            ('course-v1:edX+TestX+Test_Course', 'verified'),
+        ]
+
+    @mock.patch('enterprise.tasks.enroll_user_in_course_locally')
+    def test_complete_pending_enrollments(self, enroll_user_in_course_locally):
+        enroll_user_in_course_locally.side_effect = [Exception('Enrollment closed'), None]
+
+        tasks.complete_pending_enrollments(self.user.id, self.enrollments)
+
+        assert enroll_user_in_course_locally.call_args_list == [
+            mock.call(self.user, course_id, course_mode) for course_id, course_mode in self.enrollments
+        ]
+
+    @override_settings(ENTERPRISE_ENROLLMENT_JOB_BACKEND='local')
+    @mock.patch('enterprise.tasks._get_local_executor')
+    @mock.patch('enterprise.tasks._get_pending_enrollments_executor')
+    def test_start_pending_enrollments_local(self, get_pending_executor, get_local_executor):
+        with mock.patch('django.db.transaction.on_commit') as on_commit:
+            tasks.start_pending_enrollments(self.user.id, self.enrollments)
+            get_pending_executor.return_value.submit.assert_not_called()
+            on_commit.call_args[0][0]()
+
+        get_pending_executor.return_value.submit.assert_called_once_with(
+            tasks._complete_pending_locally,  # pylint: disable=protected-access
+            self.user.id,
+            self.enrollments,
+        )
+        # Enrollment job chunks don't hold up pending enrollments.
+        get_local_executor.assert_not_called()
+
+    @override_settings(ENTERPRISE_ENROLLMENT_JOB_LOCAL_WORKERS=3, ENTERPRISE_PENDING_ENROLLMENTS_LOCAL_WORKERS=1)
+    @mock.patch('enterprise.tasks._LOCAL_EXECUTORS', {})
+    def test_local_executors(self):
+        # pylint: disable=protected-access
+        executor = tasks._get_local_executor()
+        pending_enrollments_executor = tasks._get_pending_enrollments_executor()
+
+        assert executor is tasks._get_local_executor()
+        assert pending_enrollments_executor is tasks._get_pending_enrollments_executor()
+        assert executor is not pending_enrollments_executor
+        assert executor._max_workers == 3
+        assert pending_enrollments_executor._max_workers == 1
+
+    @override_settings(ENTERPRISE_ENROLLMENT_JOB_BACKEND='celery')
+    @mock.patch('enterprise.tasks.run_enrollment_job_chunk_task', mock.Mock())
+    def test_start_pending_enrollments_celery(self):
+        task = mock.Mock()
+        with mock.patch('enterprise.tasks.complete_pending_enrollments_task', task):
+            with mock.patch('django.db.transaction.on_commit', side_effect=lambda callback: callback()):
+                tasks.start_pending_enrollments(self.user.id, self.enrollments)
+
+        task.delay.assert_called_once_with(self.user.id, self.enrollments)
+
+    @override_settings(ENTERPRISE_ENROLLMENT_JOB_BACKEND='rabbit')
+    @mock.patch('enterprise.tasks._get_pending_enrollments_executor')
+    def test_start_pending_enrollments_unknown_backend(self, get_pending_executor):
+        with mock.patch('django.db.transaction.on_commit', side_effect=lambda callback: callback()):
+            tasks.start_pending_enrollments(self.user.id, self.enrollments)
+
+        get_pending_executor.return_value.submit.assert_called_once_with(
+            tasks._complete_pending_locally,  # pylint: disable=protected-access
+            self.user.id,
+            self.enrollments,
+        )
+
+    @mock.patch('enterprise.tasks.complete_pending_enrollments')
+    def test_start_pending_enrollments_without_on_commit(self, complete_pending_enrollments):
+        with mock.patch('enterprise.tasks.transaction', mock.Mock(spec=[])):
+            tasks.start_pending_enrollments(self.user.id, self.enrollments)
+
+        complete_pending_enrollments.assert_called_once_with(self.user.id, self.enrollments)
@@ -9,13 +9,15 @@ import unittest
 import mock
 from pytest import mark, raises
 
+from django.db import connection
 from django.http import HttpResponseRedirect
+from django.test.utils import CaptureQueriesContext
 
 from enterprise.models import EnterpriseCustomer, EnterpriseCustomerUser, UserDataSharingConsentAudit
 from enterprise.tpa_pipeline import (active_provider_enforces_data_sharing, active_provider_requests_data_sharing,
-                                     get_consent_status_for_pipeline, get_ec_for_running_pipeline,
-                                     get_enterprise_customer_for_request, get_enterprise_customer_for_sso,
-                                     handle_enterprise_logistration)
+                                     clear_sso_customer_cache, get_consent_status_for_pipeline,
+                                     get_ec_for_running_pipeline, get_enterprise_customer_for_request,
+                                     get_enterprise_customer_for_sso, handle_enterprise_logistration)
 from enterprise.utils import NotConnectedToEdX
 from test_utils.factories import EnterpriseCustomerFactory, EnterpriseCustomerIdentityProviderFactory, UserFactory
 
@@ -54,10 +56,55 @@ class TestTpaPipeline(unittest.TestCase):
         provider = mock.MagicMock(provider_id='provider_slug')
         assert get_enterprise_customer_for_sso(provider) == self.customer
         assert get_enterprise_customer_for_sso(None) is None
+        clear_sso_customer_cache()
         with mock.patch('enterprise.tpa_pipeline.EnterpriseCustomer.objects.get') as get_mock:
             get_mock.side_effect = EnterpriseCustomer.DoesNotExist
             assert get_enterprise_customer_for_sso(provider) is None
 
+    def test_get_ec_for_sso_cached(self):
+        """
+        Test that customers are cached by provider, until a customer or an identity provider changes.
+        """
+        provider = mock.MagicMock(provider_id='provider_slug')
+        unknown_provider = mock.MagicMock(provider_id='unknown_slug')
+        customer = get_enterprise_customer_for_sso(provider)
+        assert customer == self.customer
+        assert get_enterprise_customer_for_sso(unknown_provider) is None
+
+        with CaptureQueriesContext(connection) as queries:
+            # Cached customers are shared, not copied.
+            assert get_enterprise_customer_for_sso(provider) is customer
+        assert len(queries) == 0
+
+        # Providers which aren't tied to any customer are looked up every time.
+        with CaptureQueriesContext(connection) as queries:
+            assert get_enterprise_customer_for_sso(unknown_provider) is None
+        assert len(queries) == 1
+
+        self.customer.name = 'Renamed Enterprise Customer'
+        self.customer.save()
+        assert get_enterprise_customer_for_sso(provider).name == 'Renamed Enterprise Customer'
+
+        EnterpriseCustomerIdentityProviderFactory(provider_id='unknown_slug')
+        assert get_enterprise_customer_for_sso(unknown_provider) is not None
+
+    def test_get_ec_for_request_memoized(self):
+        """
+        Test that the customer is looked up once per request.
+        """
+        request = mock.MagicMock(session={'partial_pipeline': 'pipeline_key'})
+        other_request = mock.MagicMock(session={'partial_pipeline': 'pipeline_key'})
+        with mock.patch('enterprise.tpa_pipeline.Registry') as fake_registry:
+            fake_registry.get_from_pipeline.return_value = mock.MagicMock(provider_id='provider_slug')
+            with mock.patch('enterprise.tpa_pipeline.get_sso_customer_cache') as cache_getter:
+                cache_getter.return_value.get.return_value = self.customer
+                assert get_enterprise_customer_for_request(request) == self.customer
+                assert active_provider_requests_data_sharing(request)
+                assert active_provider_enforces_data_sharing(request, EnterpriseCustomer.AT_LOGIN)
+                assert cache_getter.return_value.get.call_count == 1
+                assert get_enterprise_customer_for_request(other_request) == self.customer
+                assert cache_getter.return_value.get.call_count == 2
+
     def test_get_ec_for_pipeline(self):
         """
         Test that we get the correct enterprise custoemr for a given running pipeline.
@@ -212,3 +259,55 @@ class TestTpaPipeline(unittest.TestCase):
                 state='enabled',
             )
             assert handle_enterprise_logistration(backend, self.user) is None
+
+    def test_handle_enterprise_logistration_queries(self):
+        """
+        Test that the link and the consent are looked up with one query, then cached until they change.
+        """
+        backend = mock.MagicMock(name=None)
+        ec_user = EnterpriseCustomerUser.objects.create(user_id=self.user.id, enterprise_customer=self.customer)
+        consent = UserDataSharingConsentAudit.objects.create(  # pylint: disable=no-member
+            user=ec_user,
+            state='enabled',
+        )
+        with mock.patch('enterprise.tpa_pipeline.get_ec_for_running_pipeline') as fake_get_ec:
+            fake_get_ec.return_value = self.customer
+            with CaptureQueriesContext(connection) as queries:
+                assert handle_enterprise_logistration(backend, self.user) is None
+            assert len(queries) == 1
+            with CaptureQueriesContext(connection) as queries:
+                assert handle_enterprise_logistration(backend, self.user) is None
+            assert len(queries) == 0
+
+            consent.state = 'disabled'
+            consent.save()
+            assert isinstance(handle_enterprise_logistration(backend, self.user), HttpResponseRedirect)
+
+            # Declined consent is not cached, so granting it in another process is seen on the next login.
+            UserDataSharingConsentAudit.objects.filter(pk=consent.pk).update(state='enabled')
+            assert handle_enterprise_logistration(backend, self.user) is None
+            consent.state = 'disabled'
+            consent.save()
+
+            ec_user.delete()
+            assert isinstance(handle_enterprise_logistration(backend, self.user), HttpResponseRedirect)
+            assert EnterpriseCustomerUser.objects.count() == 0
+
+    def test_handle_enterprise_logistration_consent_not_required_linked(self):
+        """
+        Test that when consent isn't required, users already linked to the EnterpriseCustomer aren't linked again.
+        """
+        backend = mock.MagicMock(name=None)
+        with mock.patch('enterprise.tpa_pipeline.get_ec_for_running_pipeline') as fake_get_ec:
+            enterprise_customer = EnterpriseCustomerFactory(enable_data_sharing_consent=False)
+            fake_get_ec.return_value = enterprise_customer
+            assert handle_enterprise_logistration(backend, self.user) is None
+            # Without a consent record, the link created by the first login is looked up again on each login.
+            for __ in range(2):
+                with CaptureQueriesContext(connection) as queries:
+                    assert handle_enterprise_logistration(backend, self.user) is None
+                assert len(queries) == 1
+            assert EnterpriseCustomerUser.objects.filter(
+                enterprise_customer=enterprise_customer,
+                user_id=self.user.id
+            ).count() == 1
@@ -15,7 +15,9 @@ from faker import Factory as FakerFactory
 from pytest import mark, raises
 
 from django.core import mail
+from django.db import connection
 from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
 
 from enterprise import utils
 from enterprise.models import (EnterpriseCourseEnrollment, EnterpriseCustomer, EnterpriseCustomerBrandingConfiguration,
@@ -117,6 +119,7 @@ class TestUtils(unittest.TestCase):
             [
                 "enterprise_customer_users",
                 "pendingenterprisecustomeruser",
+                "enrollment_jobs",
                 "branding_configuration",
                 "enterprise_customer_identity_provider",
                 "enterprise_customer_entitlements",
@@ -169,6 +172,16 @@ class TestUtils(unittest.TestCase):
         actual_field_names = get_all_field_names(model)
         assert actual_field_names == expected_fields
 
+    @ddt.data(
+        ([], 2, []),
+        ([1, 2, 3], 5, [[1, 2, 3]]),
+        ([1, 2, 3, 4], 2, [[1, 2], [3, 4]]),
+        ([1, 2, 3, 4, 5], 2, [[1, 2], [3, 4], [5]]),
+    )
+    @ddt.unpack
+    def test_chunks(self, items, chunk_size, expected_chunks):
+        assert list(utils.chunks(iter(items), chunk_size)) == expected_chunks
+
     @ddt.data(True, False)
     def test_disable_for_loaddata(self, raw):
         signal_handler_mock = mock.MagicMock()
@@ -776,6 +789,70 @@ class TestUtils(unittest.TestCase):
                 assert getattr(mail.outbox[0], field) == val
             assert mail.outbox[0].connection is conn
 
+    @mock.patch('enterprise.utils.get_notification_subject_line', wraps=utils.get_notification_subject_line)
+    def test_send_email_notification_messages(self, subject_line_mock):
+        """
+        Test that the template configuration and subject line are resolved once for a whole batch of messages.
+        """
+        enrolled_in = {'name': 'coursename', 'url': 'localhost:8000/courses', 'type': 'course'}
+        site = mock.MagicMock(
+            spec=['enterprise_enrollment_template'],
+            enterprise_enrollment_template=mock.MagicMock(
+                render_all_templates=mock.MagicMock(return_value=('plaintext_value', '<b>HTML value</b>')),
+                subject_line='New course! {course_name}!',
+            ),
+        )
+        enterprise_customer = mock.MagicMock(site=site)
+        enterprise_customer.name = 'EdX'
+        users = [UserFactory(email='john@smith.com'), PendingEnterpriseCustomerUserFactory(user_email='bob@smith.com')]
+        conn = mail.get_connection()
+
+        notified, failed = utils.send_email_notification_messages(
+            users, enrolled_in, enterprise_customer, email_connection=conn, chunk_size=1
+        )
+
+        assert notified == users
+        assert failed == []
+        assert subject_line_mock.call_count == 1
+        assert [message.to for message in mail.outbox] == [['john@smith.com'], ['bob@smith.com']]
+        for message in mail.outbox:
+            assert message.subject == 'New course! coursename!'
+            assert message.body == 'plaintext_value'
+            assert message.alternatives == [('<b>HTML value</b>', 'text/html')]
+            assert message.connection is conn
+
+    def test_send_email_notification_messages_failures(self):
+        """
+        Test that messages which can't be built or sent don't prevent the other messages from being sent.
+        """
+        enrolled_in = {'name': 'coursename'}
+        enterprise_customer = mock.MagicMock(site=mock.MagicMock(spec=[]))
+        enterprise_customer.name = 'EdX'
+        users = [
+            PendingEnterpriseCustomerUserFactory(user_email='bounce@smith.com'),
+            object(),
+            PendingEnterpriseCustomerUserFactory(user_email='bob@smith.com'),
+        ]
+        conn = mail.get_connection()
+        send_messages = conn.send_messages
+
+        def send_or_bounce(messages):
+            """
+            Fail to send messages to the bouncing address.
+            """
+            if messages[0].to == ['bounce@smith.com']:
+                raise IOError('Bounced')
+            return send_messages(messages)
+
+        with mock.patch.object(conn, 'send_messages', side_effect=send_or_bounce):
+            notified, failed = utils.send_email_notification_messages(
+                users, enrolled_in, enterprise_customer, email_connection=conn
+            )
+
+        assert notified == [users[2]]
+        assert failed == [users[1], users[0]]
+        assert [message.to for message in mail.outbox] == [['bob@smith.com']]
+
     def test_enterprise_branding_info_by_provider_id(self):
         """
         Test `get_enterprise_branding_info_by_provider_id` helper method.
@@ -847,6 +924,51 @@ class TestUtils(unittest.TestCase):
             None,
         )
 
+    def test_get_enterprise_context_for_user(self):
+        """
+        Test `get_enterprise_context_for_user` helper method, and the invalidation of the cached contexts.
+        """
+        user = UserFactory()
+        ecu = EnterpriseCustomerUserFactory(user_id=user.id)
+        identity_provider = EnterpriseCustomerIdentityProviderFactory(
+            enterprise_customer=ecu.enterprise_customer,
+            provider_id='test-shib',
+        )
+        expected_context = {'enterprise_id': ecu.enterprise_customer.uuid, 'tpa_hint': 'test-shib'}
+
+        with CaptureQueriesContext(connection) as queries:
+            assert utils.get_enterprise_context_for_user(user) == expected_context
+            assert utils.get_enterprise_context_for_user(user) == expected_context
+        assert len(queries) == 1
+
+        # Contexts are memoized on the request.
+        request = mock.Mock(spec=[])
+        utils.get_enterprise_context_for_user(user, request=request)
+        with mock.patch('enterprise.utils.get_enterprise_context_cache') as get_enterprise_context_cache:
+            assert utils.get_enterprise_context_for_user(user, request=request) == expected_context
+        assert not get_enterprise_context_cache.called
+
+        # Identity provider changes are picked up.
+        identity_provider.provider_id = 'test-saml'
+        identity_provider.save()
+        assert utils.get_enterprise_context_for_user(user)['tpa_hint'] == 'test-saml'
+
+        identity_provider.delete()
+        assert utils.get_enterprise_context_for_user(user)['tpa_hint'] is None
+
+        # Link changes are picked up.
+        ecu.delete()
+        assert utils.get_enterprise_context_for_user(user) == {'enterprise_id': None, 'tpa_hint': None}
+        with CaptureQueriesContext(connection) as queries:
+            assert utils.get_enterprise_context_for_user(user) == {'enterprise_id': None, 'tpa_hint': None}
+        assert not queries.captured_queries
+
+        ecu = EnterpriseCustomerUserFactory(user_id=user.id)
+        assert utils.get_enterprise_context_for_user(user) == {
+            'enterprise_id': ecu.enterprise_customer.uuid,
+            'tpa_hint': None,
+        }
+
     @ddt.data(
         (
             'localhost:8000/courses/course-v1:edx+test-course+T22017/',